@@ -0,0 +1,62 @@
+'''
+Cost of the generated assembler constructors.
+
+Times the asm_ and fast_ constructors of an add (register and immediate
+forms) of the riscv and mips assemblers per call, and compiling the
+generated source of each asm module against loading its cached code (see
+examples/asmgen.py).
+
+    python -m benchmarks.bench_asm [--number N]
+'''
+import argparse
+import linecache
+import marshal
+import timeit
+
+from examples.mips import asm as mips_asm
+from examples.riscv import asm as riscv_asm
+
+
+CALLS = {
+    'riscv': (riscv_asm, 'ADD', dict(rs1=1, rs2=2, rd=3), dict(rs1=1, imm=5, rd=3)),
+    'mips': (mips_asm, 'ADDU', dict(rd=3, rs=1, rt=2), dict(rd=3, rs=1, im=5)),
+}
+
+
+def bench_call(f, kwargs, number):
+    return min(timeit.repeat(lambda: f(**kwargs), number=number, repeat=5)) / number
+
+
+def bench_code(module, number):
+    '''
+    Returns the time to (compile, load the cached code of) the generated
+    source of module.
+    '''
+    # generate keeps the source for tracebacks
+    filename = f'<generated {module.__name__}>'
+    source = ''.join(linecache.cache[filename][2])
+    data = marshal.dumps(compile(source, filename, 'exec'))
+    compile_t = min(timeit.repeat(
+        lambda: compile(source, filename, 'exec'), number=number, repeat=5)) / number
+    load_t = min(timeit.repeat(
+        lambda: marshal.loads(data), number=number, repeat=5)) / number
+    return compile_t, load_t
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--number', type=int, default=10000,
+                        help='calls per timing of the constructors')
+    args = parser.parse_args(argv)
+
+    for name, (module, inst, reg, imm) in CALLS.items():
+        for form, kwargs in (('reg', reg), ('imm', imm)):
+            asm_t = bench_call(getattr(module, f'asm_{inst}'), kwargs, args.number)
+            fast_t = bench_call(getattr(module, f'fast_{inst}'), kwargs, args.number)
+            print(f'{name:6} {inst:5} {form:4} asm {1e6*asm_t:7.2f}us  fast {1e6*fast_t:7.2f}us')
+        compile_t, load_t = bench_code(module, max(1, args.number // 1000))
+        print(f'{name:6} code       compile {1e3*compile_t:7.2f}ms  cached {1e3*load_t:7.2f}ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+'''
+Log depth vs unrolled SMT BitCounter of the riscv_ext.
+
+Reports the term stats of both BitCounters and the time to check each
+riscv_ext bit counting instruction against a specification through an
+ArchSession, with R32I built on either counter.
+
+    python -m benchmarks.bench_bitcounter
+'''
+import functools
+import time
+from types import SimpleNamespace
+
+from examples.mapping import ArchSession, smt_stats
+from examples.riscv_ext import asm, family, sim
+
+
+UNROLLED = SimpleNamespace(SMTFamily=functools.partial(family.SMTFamily, bit_counter_tree=False))
+
+COUNTERS = {
+    'tree': (sim.BitCounterTree_fc, family),
+    'unrolled': (sim.BitCounter_fc, UNROLLED),
+}
+
+
+def _count(bits, Word):
+    cnt = Word(0)
+    for bit in bits:
+        cnt = cnt + bit.ite(Word(1), Word(0))
+    return cnt
+
+
+def _first_one(bits, Word):
+    # index of the first one in bits, len(bits) if there is none
+    cnt = Word(len(bits))
+    for i, bit in reversed(list(enumerate(bits))):
+        cnt = bit.ite(Word(i), cnt)
+    return cnt
+
+
+# independent of both counters
+SPEC = {
+    'POPCNT': lambda val: _count([val[i] for i in range(val.size)], type(val)),
+    'CNTLZ': lambda val: _first_one([val[i] for i in reversed(range(val.size))], type(val)),
+    'CNTTZ': lambda val: _first_one([val[i] for i in range(val.size)], type(val)),
+}
+
+
+def main():
+    print(f'{"counter":10} {"nodes":>7} {"depth":>7} {"build":>9}')
+    for name, (fc, fam) in COUNTERS.items():
+        stats = smt_stats(fc, fam)
+        total = stats['total']
+        print(f'{name:10} {total["nodes"]:7d} {total["depth"]:7d} {stats["build_time"]:8.3f}s')
+
+    print()
+    print(f'{"counter":10} {"inst":8} {"check":>9}')
+    for name, (_, fam) in COUNTERS.items():
+        with ArchSession(sim.R32I_mappable_fc, fam) as session:
+            rs1 = session.inputs['rs1']
+            for inst_name, spec in SPEC.items():
+                inst = getattr(asm, f'asm_{inst_name}')(rs1=1, rd=3)
+                start = time.perf_counter()
+                cex = session.check({'rd': spec(rs1)}, inst=inst)
+                t = time.perf_counter() - start
+                assert cex is None, (name, inst_name, cex)
+                print(f'{name:10} {inst_name:8} {t:8.3f}s')
+
+
+if __name__ == '__main__':
+    main()
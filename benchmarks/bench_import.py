@@ -0,0 +1,76 @@
+'''
+Import time of the example packages.
+
+Imports each module in a fresh interpreter with -X importtime and reports
+the total time, the time spent in the modules of this repo (examples.*)
+and in dependencies, and the slowest modules of this repo.
+
+    python -m benchmarks.bench_import [--top N] [module ...]
+'''
+import argparse
+import subprocess
+import sys
+
+
+MODULES = (
+    'examples',
+    'examples.riscv',
+    'examples.riscv.sim',
+    'examples.riscv.asm',
+    'examples.riscv.encoding',
+    'examples.riscv_ext.sim',
+    'examples.riscv_m.sim',
+    'examples.riscv_f.sim',
+    'examples.mips.sim',
+    'examples.mapping',
+)
+
+
+def import_times(module):
+    '''
+    Imports module in a fresh interpreter, returns {module name: (self,
+    cumulative)} import times in seconds of every module it imported.
+    '''
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        stderr=subprocess.PIPE, universal_newlines=True, check=True)
+    times = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        try:
+            self_us, cumulative_us = int(fields[0]), int(fields[1])
+        except ValueError:
+            # header
+            continue
+        times[fields[2].strip()] = (self_us * 1e-6, cumulative_us * 1e-6)
+    return times
+
+
+def _own(name):
+    return name == 'examples' or name.startswith('examples.')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--top', type=int, default=0,
+                        help='also list the N slowest modules of this repo')
+    parser.add_argument('modules', nargs='*', default=MODULES)
+    args = parser.parse_args(argv)
+
+    print(f'{"module":28} {"total":>9} {"own":>9} {"deps":>9}')
+    for module in args.modules:
+        times = import_times(module)
+        total = times[module][1]
+        own = sum(s for name, (s, _) in times.items() if _own(name))
+        deps = sum(s for name, (s, _) in times.items() if not _own(name))
+        print(f'{module:28} {1e3*total:7.1f}ms {1e3*own:7.1f}ms {1e3*deps:7.1f}ms')
+        if args.top:
+            slowest = sorted(((s, name) for name, (s, _) in times.items() if _own(name)), reverse=True)
+            for s, name in slowest[:args.top]:
+                print(f'    {name:32} {1e3*s:7.1f}ms')
+
+
+if __name__ == '__main__':
+    main()
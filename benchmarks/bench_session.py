@@ -0,0 +1,77 @@
+'''
+Incremental solver session vs a fresh solver per query.
+
+Checks every R type ALU instruction of the riscv against its gold
+function, once through a single ArchSession and once with check_fresh.
+
+    python -m benchmarks.bench_session [--repeat N]
+'''
+import argparse
+import operator
+import time
+
+from examples.mapping import ArchSession, check_fresh
+from examples.riscv import family, sim
+
+
+ARCH_FC = sim.R32I_mappable_fc
+
+GOLD = {
+    'ADD': operator.add,
+    'SUB': operator.sub,
+    'SLT': lambda a, b: type(a)(a.bvslt(b)),
+    'SLTU': lambda a, b: type(a)(a.bvult(b)),
+    'AND': operator.and_,
+    'OR': operator.or_,
+    'XOR': operator.xor,
+    'SLL': lambda a, b: a.bvshl(b),
+    'SRL': lambda a, b: a.bvlshr(b),
+    'SRA': lambda a, b: a.bvashr(b),
+}
+
+
+def queries():
+    isa = sim.ISA_fc.Py
+    data = isa.R(rd=isa.Idx(3), rs1=isa.Idx(1), rs2=isa.Idx(2))
+    for name, f in GOLD.items():
+        if name in isa.ArithInst.field_dict:
+            tag = isa.AluInst(arith=getattr(isa.ArithInst, name))
+        else:
+            tag = isa.AluInst(shift=getattr(isa.ShiftInst, name))
+        yield name, isa.Inst(isa.OP(data=data, tag=tag)), f
+
+
+def expected(f):
+    return lambda inputs: {'rd': f(inputs['rs1'], inputs['rs2'])}
+
+
+def bench_session(repeat):
+    start = time.perf_counter()
+    with ArchSession(ARCH_FC, family) as session:
+        for _ in range(repeat):
+            for name, inst, f in queries():
+                assert session.check(expected(f)(session.inputs), inst=inst) is None, name
+    return time.perf_counter() - start
+
+
+def bench_fresh(repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for name, inst, f in queries():
+            assert check_fresh(ARCH_FC, family, expected(f), inst=inst) is None, name
+    return time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    n = args.repeat * len(GOLD)
+    for name, bench in (('session', bench_session), ('fresh', bench_fresh)):
+        t = bench(args.repeat)
+        print(f'{name:8} {n:4d} queries {t:8.3f}s {1e3*t/n:8.2f}ms/query')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,311 @@
+'''
+Throughput of the python simulators on standard instruction mixes.
+
+Every simulator (the .Py peak of each example CPU) retires a fixed, seeded
+sequence of instructions drawn from each mix it supports:
+
+    alu       register / immediate arithmetic, logic and shifts
+    branch    half conditional branches (or jumps), half alu
+    fp        half floating point, half alu
+    muldiv    half multiplies / divides, half alu
+
+and reports retired instructions per second (best of --repeat runs).
+Results can be written as json and compared against a saved baseline:
+
+    python -m benchmarks.bench_sims --json base.json
+    python -m benchmarks.bench_sims --baseline base.json [--threshold 0.1]
+
+exits with status 1 if any simulator got slower than the threshold.
+'''
+import argparse
+import json
+import platform
+import random
+import struct
+import sys
+import time
+
+from examples.condition_flags import sim as cf_sim
+from examples.fp import sim as fp_sim
+from examples.mips import sim as mips_sim, asm as mips_asm
+from examples.reg_overlap import sim as ro_sim
+from examples.riscv import sim as riscv_sim, asm as riscv_asm
+from examples.riscv_ext import sim as ext_sim, asm as ext_asm
+from examples.riscv_f import sim as f_sim, asm as f_asm
+from examples.riscv_m import sim as m_sim, asm as m_asm
+
+
+MIXES = {
+    'alu': {'alu': 1},
+    'branch': {'alu': 1, 'branch': 1},
+    'fp': {'alu': 1, 'fp': 1},
+    'muldiv': {'alu': 1, 'muldiv': 1},
+}
+
+
+def _float_bits(rng):
+    return struct.unpack('<I', struct.pack('<f', rng.uniform(-1e6, 1e6)))[0]
+
+
+class Target:
+    '''
+    A simulator under benchmark.  make(rng) returns a fresh simulator (or
+    its state), gens maps the instruction classes it supports to functions
+    drawing one instruction from rng and step(cpu, inst) executes one.
+    '''
+    def __init__(self, name, make, step, gens):
+        self.name = name
+        self.make = make
+        self.step = step
+        self.gens = gens
+
+    def supports(self, mix):
+        return MIXES[mix].keys() <= self.gens.keys()
+
+    def program(self, mix, n, rng):
+        classes = [c for c, w in MIXES[mix].items() for _ in range(w)]
+        return [self.gens[rng.choice(classes)](rng) for _ in range(n)]
+
+
+def _riscv(name, sim_mod, asm):
+    isa = sim_mod.ISA_fc.Py
+    ops = ('ADD', 'SUB', 'SLT', 'SLTU', 'AND', 'OR', 'XOR', 'SLL', 'SRL', 'SRA')
+
+    def reg(rng):
+        return rng.randrange(1, 1 << isa.Idx.size)
+
+    def alu(rng):
+        f = getattr(asm, f'asm_{rng.choice(ops)}')
+        if rng.random() < 0.5:
+            return f(rs1=reg(rng), rs2=reg(rng), rd=reg(rng))
+        return f(rs1=reg(rng), imm=rng.randrange(0, 1 << 5), rd=reg(rng))
+
+    def branch(rng):
+        data = isa.B(rs1=isa.Idx(reg(rng)), rs2=isa.Idx(reg(rng)), imm=isa.B.imm(rng.randrange(-64, 64)))
+        return isa.Inst(isa.Branch(data, rng.choice(tuple(isa.BranchInst.enumerate()))))
+
+    def muldiv(rng):
+        data = isa.R(rd=isa.Idx(reg(rng)), rs1=isa.Idx(reg(rng)), rs2=isa.Idx(reg(rng)))
+        tag = isa.AluInst(muldiv=rng.choice(tuple(isa.MulDivInst.enumerate())))
+        return isa.Inst(isa.OP(data, tag))
+
+    def fp(rng):
+        data = isa.R(rd=isa.Idx(reg(rng)), rs1=isa.Idx(reg(rng)), rs2=isa.Idx(reg(rng)))
+        tag = rng.choice(tuple(isa.FPComputeInst.enumerate()))
+        return isa.Inst(isa.OP_FP(compute=isa.FComputation(data=data, rm=isa.RM.RNE, tag=tag)))
+
+    def make(rng):
+        cpu = sim_mod.R32I_fc.Py()
+        for i in range(1, 1 << isa.Idx.size):
+            cpu.register_file.store(isa.Idx(i), isa.Word(rng.randrange(0, 1 << 32)))
+            if hasattr(cpu, 'f_register_file'):
+                cpu.f_register_file.store(isa.Idx(i), isa.Word(_float_bits(rng)))
+        return cpu
+
+    pc = isa.Word(0x1000)
+    gens = {'alu': alu, 'branch': branch}
+    if hasattr(isa, 'MulDivInst'):
+        gens['muldiv'] = muldiv
+    if hasattr(isa, 'OP_FP'):
+        gens['fp'] = fp
+    return Target(name, make, lambda cpu, inst: cpu(inst, pc), gens)
+
+
+def _mips():
+    isa = mips_sim.ISA_fc.Py
+    ri = ('ADDU', 'AND', 'OR', 'XOR', 'SLT', 'SLTU')
+    r = ('SUBU', 'NOR', 'SLLV', 'SRLV', 'SRAV', 'ROTRV')
+
+    def reg(rng):
+        return rng.randrange(1, 1 << isa.Idx.size)
+
+    def alu(rng):
+        if rng.random() < 0.5:
+            return getattr(mips_asm, f'asm_{rng.choice(r)}')(rd=reg(rng), rs=reg(rng), rt=reg(rng))
+        f = getattr(mips_asm, f'asm_{rng.choice(ri)}')
+        if rng.random() < 0.5:
+            return f(rd=reg(rng), rs=reg(rng), rt=reg(rng))
+        return f(rd=reg(rng), rs=reg(rng), im=rng.randrange(0, 1 << isa.Imm.size))
+
+    def muldiv(rng):
+        if rng.random() < 0.25:
+            return mips_asm.asm_MUL(rd=reg(rng), rs=reg(rng), rt=reg(rng))
+        op = rng.choice(('MULT', 'MULTU', 'DIV', 'DIVU', 'MADD', 'MSUBU'))
+        return isa.Inst(isa.R2(isa.Idx(reg(rng)), isa.Idx(reg(rng)), getattr(isa.R2Inst, op)))
+
+    def make(rng):
+        cpu = mips_sim.MIPS32_fc.Py()
+        for i in range(1, 1 << isa.Idx.size):
+            cpu.register_file.store(isa.Idx(i), isa.Word(rng.randrange(0, 1 << 32)))
+        # the accumulator is threaded through calls
+        return [cpu, isa.BitVector[64](0)]
+
+    def step(state, inst):
+        state[1] = state[0](inst, state[1])
+
+    return Target('mips', make, step, {'alu': alu, 'muldiv': muldiv})
+
+
+def _reg_overlap():
+    isa = ro_sim.ISA_fc.Py
+    layouts = (
+        (isa.I16, isa.Reg16, True), (isa.R16, isa.Reg16, False),
+        (isa.I32, isa.Reg32, True), (isa.R32, isa.Reg32, False),
+    )
+
+    def alu(rng):
+        T, Reg, imm = rng.choice(layouts)
+        reg = lambda: Reg(isa.Idx(rng.randrange(0, 1 << isa.Idx.size)))
+        if imm:
+            data = T(rd=reg(), rs1=reg(), imm=isa.Word(rng.randrange(0, 1 << isa.Word.size)))
+        else:
+            data = T(rd=reg(), rs1=reg(), rs2=reg())
+        return isa.Inst(data=isa.Layout(data), tag=rng.choice(tuple(isa.Opcode.enumerate())))
+
+    def make(rng):
+        cpu = ro_sim.CPU_fc.Py()
+        for i in range(1 << isa.Idx.size):
+            cpu.register_file.store(isa.Idx(i), isa.DWord(rng.randrange(0, 1 << isa.DWord.size)))
+        return cpu
+
+    pc = isa.DWord(0)
+    return Target('reg_overlap', make, lambda cpu, inst: cpu(inst, pc), {'alu': alu})
+
+
+def _operands(isa, rng):
+    return isa.Word(rng.randrange(0, 1 << isa.Word.size)), isa.Word(rng.randrange(0, 1 << isa.Word.size))
+
+
+def _condition_flags():
+    isa = cf_sim.ISA_fc.Py
+    pc = isa.Word(0)
+    return Target(
+        'condition_flags',
+        lambda rng: cf_sim.CPU_fc.Py(),
+        lambda cpu, inst: cpu(inst[0], *inst[1], pc),
+        {
+            'alu': lambda rng: (isa.NOR, _operands(isa, rng)),
+            'branch': lambda rng: (isa.JMP, _operands(isa, rng)),
+        })
+
+
+def _fp():
+    isa = fp_sim.ISA_fc.Py
+
+    def float_operands(rng):
+        # bfloat16 is the top half of a float
+        return tuple(isa.Word(_float_bits(rng) >> 16) for _ in range(2))
+
+    return Target(
+        'fp',
+        lambda rng: fp_sim.CPU_fc.Py(),
+        lambda cpu, inst: cpu(inst[0], *inst[1]),
+        {
+            'alu': lambda rng: (rng.choice((isa.AND, isa.INV)), _operands(isa, rng)),
+            'fp': lambda rng: (isa.FP_ADD, float_operands(rng)),
+        })
+
+
+def targets():
+    return [
+        _riscv('riscv', riscv_sim, riscv_asm),
+        _riscv('riscv_ext', ext_sim, ext_asm),
+        _riscv('riscv_m', m_sim, m_asm),
+        _riscv('riscv_f', f_sim, f_asm),
+        _mips(),
+        _reg_overlap(),
+        _condition_flags(),
+        _fp(),
+    ]
+
+
+def bench(target, mix, n, repeat, seed):
+    '''
+    Best time of repeat runs of n instructions of mix on a fresh simulator,
+    returns {'retired', 'time', 'ips'}.
+    '''
+    rng = random.Random(f'{seed}:{target.name}:{mix}')
+    program = target.program(mix, n, rng)
+    step = target.step
+    best = float('inf')
+    for _ in range(repeat):
+        cpu = target.make(random.Random(seed))
+        start = time.perf_counter()
+        for inst in program:
+            step(cpu, inst)
+        best = min(best, time.perf_counter() - start)
+    return {'retired': n, 'time': best, 'ips': n / best}
+
+
+def compare(results, baseline, threshold):
+    '''
+    Prints the speedup of results over baseline, returns the keys which
+    got slower by more than threshold (a fraction).
+    '''
+    regressions = []
+    for key, result in results.items():
+        try:
+            base = baseline[key]
+        except KeyError:
+            print(f'{key:24} {"":>12} (not in baseline)')
+            continue
+        speedup = result['ips'] / base['ips']
+        flag = ''
+        if speedup < 1 - threshold:
+            regressions.append(key)
+            flag = ' REGRESSION'
+        print(f'{key:24} {base["ips"]:12.0f} -> {result["ips"]:12.0f} inst/s {speedup:6.2f}x{flag}')
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('-n', type=int, default=2000, help='instructions per run')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--only', help='comma separated simulators to run')
+    parser.add_argument('--mix', help='comma separated mixes to run')
+    parser.add_argument('--json', help='write results to this file')
+    parser.add_argument('--baseline', help='compare against results saved with --json')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='slowdown (fraction) reported as a regression')
+    args = parser.parse_args(argv)
+
+    only = args.only.split(',') if args.only else None
+    mixes = args.mix.split(',') if args.mix else list(MIXES)
+    unknown = set(mixes) - MIXES.keys()
+    if unknown:
+        parser.error(f'unknown mixes {sorted(unknown)}')
+
+    results = {}
+    for target in targets():
+        if only is not None and target.name not in only:
+            continue
+        for mix in mixes:
+            if not target.supports(mix):
+                continue
+            key = f'{target.name}/{mix}'
+            result = results[key] = bench(target, mix, args.n, args.repeat, args.seed)
+            print(f'{key:24} {result["retired"]:8d} inst {result["time"]:8.3f}s {result["ips"]:12.0f} inst/s')
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'n': args.n,
+                'repeat': args.repeat,
+                'seed': args.seed,
+                'results': results,
+            }, f, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        print()
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
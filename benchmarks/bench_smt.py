@@ -0,0 +1,217 @@
+'''
+Build and solve time of the SMT models of the mappable archs.
+
+For every mappable arch runs, each in a fresh process:
+
+    build     family closure, instantiation and symbolic evaluation on free
+              inputs (see examples.mapping.smt_stats), with term sizes
+    mapper    ArchMapper construction
+    queries   a fixed set of equivalence checks through an ArchSession
+              (an R type SUB, the same SUB writing r0 i.e. a nop, and an
+              immediate ADD against their gold functions)
+
+and reports wall time and peak RSS (in MiB, also as growth over the RSS of
+the process before the stage).  Results can be written as json and
+compared against a saved baseline, e.g. across peak / hwtypes / pysmt
+upgrades:
+
+    python -m benchmarks.bench_smt --json base.json
+    python -m benchmarks.bench_smt --baseline base.json [--threshold 0.1]
+
+exits with status 1 if any time or RSS grew by more than the threshold.
+'''
+import argparse
+from importlib import metadata
+import json
+import multiprocessing
+import platform
+import resource
+import sys
+import time
+
+from peak.mapper import ArchMapper
+
+from examples.mapping import ArchSession, smt_stats
+from examples.mips import sim as mips_sim, family as mips_family, asm as mips_asm
+from examples.riscv import sim as riscv_sim, family as riscv_family, asm as riscv_asm
+from examples.riscv_ext import sim as ext_sim, family as ext_family, asm as ext_asm
+from examples.riscv_f import sim as f_sim, family as f_family, asm as f_asm
+from examples.riscv_m import sim as m_sim, family as m_family, asm as m_asm
+
+
+def _riscv_queries(asm):
+    next_pc = lambda i: i['pc'] + 4
+    return {
+        'SUB': (asm.asm_SUB(rs1=1, rs2=2, rd=3),
+                lambda i: {'rd': i['rs1'] - i['rs2'], 'pc_next': next_pc(i)}),
+        'nop': (asm.asm_SUB(rs1=1, rs2=2, rd=0),
+                lambda i: {'rd': i['rd'], 'pc_next': next_pc(i)}),
+        'ADDI': (asm.asm_ADD(rs1=1, imm=5, rd=3),
+                 lambda i: {'rd': i['rs1'] + 5, 'pc_next': next_pc(i)}),
+    }
+
+
+def _mips_queries():
+    return {
+        'SUB': (mips_asm.asm_SUBU(rd=3, rs=1, rt=2),
+                lambda i: {'rd': i['rs1'] - i['rs2'], 'acc_out': i['acc']}),
+        'nop': (mips_asm.asm_SUBU(rd=0, rs=1, rt=2),
+                lambda i: {'rd': i['rd'], 'acc_out': i['acc']}),
+        'ADDI': (mips_asm.asm_ADDU(rd=3, rs=1, im=5),
+                 lambda i: {'rd': i['rs1'] + 5, 'acc_out': i['acc']}),
+    }
+
+
+# name -> (arch_fc, family, queries)
+ARCHS = {
+    'riscv': (riscv_sim.R32I_mappable_fc, riscv_family, lambda: _riscv_queries(riscv_asm)),
+    'riscv_ext': (ext_sim.R32I_mappable_fc, ext_family, lambda: _riscv_queries(ext_asm)),
+    'riscv_m': (m_sim.R32I_mappable_fc, m_family, lambda: _riscv_queries(m_asm)),
+    'riscv_f': (f_sim.R32I_mappable_fc, f_family, lambda: _riscv_queries(f_asm)),
+    'mips': (mips_sim.MIPS32_mappable_fc, mips_family, _mips_queries),
+}
+
+
+def build(arch):
+    arch_fc, family, _ = ARCHS[arch]
+    stats = smt_stats(arch_fc, family)
+    return {
+        'build_time': stats['build_time'],
+        'eval_time': stats['eval_time'],
+        'nodes': stats['total']['nodes'],
+        'depth': stats['total']['depth'],
+    }
+
+
+def mapper(arch):
+    arch_fc, family, _ = ARCHS[arch]
+    ArchMapper(arch_fc, family=family)
+    return {}
+
+
+def queries(arch):
+    arch_fc, family, make_queries = ARCHS[arch]
+    times = {}
+    with ArchSession(arch_fc, family) as session:
+        for name, (inst, expected) in make_queries().items():
+            start = time.perf_counter()
+            cex = session.check(expected(session.inputs), inst=inst)
+            times[f'{name}_time'] = time.perf_counter() - start
+            if cex is not None:
+                raise AssertionError(f'{arch} {name}: {cex}')
+    return times
+
+
+STAGES = {'build': build, 'mapper': mapper, 'queries': queries}
+
+
+def _rss():
+    # peak RSS of this process in MiB, ru_maxrss is in KiB on linux and
+    # bytes on macos
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1 << 20) if sys.platform == 'darwin' else rss / (1 << 10)
+
+
+def _measure(stage, arch):
+    rss_start = _rss()
+    start = time.perf_counter()
+    result = STAGES[stage](arch)
+    result['time'] = time.perf_counter() - start
+    result['rss'] = _rss()
+    result['rss_growth'] = result['rss'] - rss_start
+    return result
+
+
+def measure(stage, arch):
+    '''
+    Runs stage on arch in a fresh process, returns its time, RSS and the
+    extra measurements of the stage.
+    '''
+    ctx = multiprocessing.get_context('spawn')
+    with ctx.Pool(1) as pool:
+        return pool.apply(_measure, (stage, arch))
+
+
+def _versions():
+    versions = {}
+    for dist in ('peak', 'hwtypes', 'pysmt', 'z3-solver'):
+        try:
+            versions[dist] = metadata.version(dist)
+        except metadata.PackageNotFoundError:
+            versions[dist] = None
+    return versions
+
+
+# lower is better for all of them
+_COMPARED = ('time', 'rss')
+
+
+def compare(results, baseline, threshold):
+    '''
+    Prints results relative to baseline, returns the (key, measure) pairs
+    which grew by more than threshold (a fraction).
+    '''
+    regressions = []
+    for key, result in results.items():
+        if key not in baseline:
+            print(f'{key:20} (not in baseline)')
+            continue
+        for m in _COMPARED:
+            old, new = baseline[key][m], result[m]
+            ratio = new / old if old else float('inf')
+            flag = ''
+            if ratio > 1 + threshold:
+                regressions.append((key, m))
+                flag = ' REGRESSION'
+            print(f'{key:20} {m:5} {old:10.3f} -> {new:10.3f} {ratio:6.2f}x{flag}')
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--only', help='comma separated archs to run')
+    parser.add_argument('--stage', help='comma separated stages to run')
+    parser.add_argument('--json', help='write results to this file')
+    parser.add_argument('--baseline', help='compare against results saved with --json')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='growth (fraction) reported as a regression')
+    args = parser.parse_args(argv)
+
+    archs = args.only.split(',') if args.only else list(ARCHS)
+    stages = args.stage.split(',') if args.stage else list(STAGES)
+    for given, known, what in ((archs, ARCHS, 'archs'), (stages, STAGES, 'stages')):
+        unknown = set(given) - known.keys()
+        if unknown:
+            parser.error(f'unknown {what} {sorted(unknown)}')
+
+    results = {}
+    for arch in archs:
+        for stage in stages:
+            key = f'{arch}/{stage}'
+            result = results[key] = measure(stage, arch)
+            extra = ' '.join(
+                f'{k}={v:.3f}' if isinstance(v, float) else f'{k}={v}'
+                for k, v in sorted(result.items())
+                if k not in ('time', 'rss', 'rss_growth'))
+            print(f'{key:20} {result["time"]:8.3f}s {result["rss"]:8.1f}MiB '
+                  f'(+{result["rss_growth"]:.1f}) {extra}')
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'versions': _versions(),
+                'results': results,
+            }, f, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        print()
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
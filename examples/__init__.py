@@ -1,3 +1,3 @@
-from . import condition_flags
-from . import fp
-from . import reg_overlap
+from .lazy import lazy_submodules
+
+__getattr__, __dir__ = lazy_submodules(__name__, ('condition_flags', 'fp', 'reg_overlap'))
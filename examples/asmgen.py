@@ -0,0 +1,117 @@
+'''
+Generated assembler constructors.
+
+The asm modules of the examples define one constructor per instruction
+(asm_ADD, ...) by rendering source templates against their ISA.  generate
+executes the rendered source in the asm module, compiling it only once:
+the code is cached under the __pycache__ directory of the module keyed by
+a hash of the source, so it is compiled again only when the templates or
+the ISA (field order, tags) change.  The rendered source binds the tags and
+types the constructors use as module constants instead of rebuilding them
+on every call.
+
+Besides the checked asm_* constructors, the templates define fast_*
+constructors taking plain ints.  They look registers up in a table of
+prebuilt indices and build the ADTs with product / variant / tagged, which
+skip the type checks of the ADT constructors.  Their arguments are not
+validated.  product / variant / tagged set the private _value_ and _tag_
+fields of hwtypes ADTs, so setup.py pins hwtypes and test_fast_asm checks
+that the fast_* instructions compare and hash equal to the asm_* ones.
+'''
+import hashlib
+import importlib.util
+import linecache
+import marshal
+import os
+import tempfile
+import typing as tp
+
+
+def product(T, *values):
+    '''
+    Builds the Product T from the values of its fields, in declaration order.
+    '''
+    obj = object.__new__(T)
+    obj._value_ = values
+    return obj
+
+
+def variant(T, value):
+    '''
+    Builds the Sum T holding value.
+    '''
+    obj = object.__new__(T)
+    obj._value_ = value
+    return obj
+
+
+def tagged(T, field: str) -> tp.Callable:
+    '''
+    Returns a function building the TaggedUnion T with field set to its
+    argument.
+    '''
+    tag = list(T.field_dict).index(field)
+
+    def build(value):
+        obj = object.__new__(T)
+        obj._tag_ = tag
+        obj._value_ = value
+        return obj
+
+    return build
+
+
+def fields(T, **values: str) -> str:
+    '''
+    Renders the values (source expressions) of the fields of the Product T
+    as positional arguments, in declaration order.
+    '''
+    return ', '.join(values[name] for name in T._field_table_)
+
+
+def _load(path: str):
+    try:
+        with open(path, 'rb') as f:
+            return marshal.load(f)
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+
+
+def _dump(path: str, code):
+    directory = os.path.dirname(path)
+    prefix = os.path.basename(path).rpartition('-')[0] + '-'
+    try:
+        os.makedirs(directory, exist_ok=True)
+        # write and rename so concurrent imports never see a partial file
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            marshal.dump(code, f)
+        os.replace(tmp, path)
+        # drop the code of earlier versions of the source
+        for name in os.listdir(directory):
+            if name.startswith(prefix) and name != os.path.basename(path):
+                os.remove(os.path.join(directory, name))
+    except OSError:
+        # read only installs compile on every import
+        pass
+
+
+def generate(namespace: tp.MutableMapping[str, tp.Any], source: str):
+    '''
+    Executes source in namespace, the globals of a module, with the compiled
+    code cached next to the bytecode of the module.
+    '''
+    module = namespace['__name__']
+    key = hashlib.sha256(importlib.util.MAGIC_NUMBER + source.encode()).hexdigest()
+    path = os.path.join(
+        os.path.dirname(namespace['__file__']), '__pycache__',
+        f'{module}.asmgen-{key[:16]}.bin')
+    filename = f'<generated {module}>'
+
+    code = _load(path)
+    if code is None:
+        code = compile(source, filename, 'exec')
+        _dump(path, code)
+    # so tracebacks show the generated source
+    linecache.cache[filename] = (len(source), None, source.splitlines(True), filename)
+    exec(code, namespace)
@@ -1,2 +1,3 @@
-from . import isa
-from . import sim
+from ..lazy import lazy_submodules
+
+__getattr__, __dir__ = lazy_submodules(__name__, ('isa', 'sim'))
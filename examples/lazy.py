@@ -0,0 +1,30 @@
+'''
+Lazy submodules for the example packages.
+
+Importing a package only runs its __init__, submodules listed here are
+imported on first attribute access (PEP 562).  e.g. importing
+examples.riscv.sim does not build the assembler tables of examples.riscv.asm
+or import the other examples.
+'''
+import importlib
+import sys
+import typing as tp
+
+
+def lazy_submodules(name: str, submodules: tp.Iterable[str]):
+    '''
+    Returns module level __getattr__ and __dir__ for the package name
+    importing submodules on first use.
+    '''
+    submodules = tuple(submodules)
+
+    def __getattr__(attr):
+        if attr in submodules:
+            # import_module also binds the submodule in the package
+            return importlib.import_module(f'{name}.{attr}')
+        raise AttributeError(f'module {name!r} has no attribute {attr!r}')
+
+    def __dir__():
+        return sorted(set(vars(sys.modules[name])) | set(submodules))
+
+    return __getattr__, __dir__
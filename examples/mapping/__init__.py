@@ -0,0 +1,5 @@
+from .cache import MappingCache, source_hash
+from .corpus import Corpus, edge_vectors, isa_key
+from .parallel import MappingResult, synthesize, variants
+from .session import ArchSession, check_fresh
+from .stats import dump_stats, smt_stats, term_stats
@@ -0,0 +1,238 @@
+'''
+Bulk evaluation of SMT outputs over concrete inputs.
+
+A BatchEvaluator compiles the output terms of the SMT peak of a mappable
+arch, with some inputs (typically the instruction) fixed and folded away,
+to a sequence of numpy operations.  Calling it with arrays for the
+remaining inputs evaluates every output on all of them at once, e.g.
+
+    batch = BatchEvaluator(R32I_mappable_fc, family, inst=inst)
+    out = batch(rs1=a, rs2=b, rd=c, pc=pc)   # out['rd'] is a uint32 array
+
+Bit vectors of up to 64 bits are supported, values are held in uint64
+arrays and outputs are returned in the smallest unsigned dtype that fits
+them (bool for bits).
+'''
+import typing as tp
+
+import numpy as np
+from pysmt import operators as op
+from pysmt.fnode import FNode
+
+from .session import constant, symbolic_outputs
+
+
+_U64 = np.uint64
+
+
+def _mask(width):
+    return _U64((1 << width) - 1)
+
+
+def _dtype(width):
+    for dtype in (np.uint8, np.uint16, np.uint32, np.uint64):
+        if width <= np.iinfo(dtype).bits:
+            return dtype
+    raise TypeError(f'bit vectors wider than 64 bits are not supported')
+
+
+def _neg(a, width):
+    return (~a + _U64(1)) & _mask(width)
+
+
+def _sign(a, width):
+    return (a >> _U64(width - 1)) & _U64(1) == _U64(1)
+
+
+def _shift(b, width):
+    # shift amount clamped to something numpy can shift by
+    return np.minimum(b, _U64(width - 1))
+
+
+def _udiv(a, b, width):
+    # x / 0 is all ones
+    q = a // np.where(b == 0, _U64(1), b)
+    return np.where(b == 0, _mask(width), q)
+
+
+def _urem(a, b, width):
+    # x % 0 is x
+    return np.where(b == 0, a, a % np.where(b == 0, _U64(1), b))
+
+
+def _sdiv(a, b, width):
+    sa, sb = _sign(a, width), _sign(b, width)
+    q = _udiv(np.where(sa, _neg(a, width), a), np.where(sb, _neg(b, width), b), width)
+    return np.where(sa ^ sb, _neg(q, width), q)
+
+
+def _srem(a, b, width):
+    sa, sb = _sign(a, width), _sign(b, width)
+    r = _urem(np.where(sa, _neg(a, width), a), np.where(sb, _neg(b, width), b), width)
+    return np.where(sa, _neg(r, width), r)
+
+
+def _ashr(a, b, width):
+    sa = _sign(a, width)
+    shift = _shift(b, width)
+    fill = np.where(sa, _mask(width) ^ (_mask(width) >> shift), _U64(0))
+    return fill | (a >> shift)
+
+
+def _rotate(a, n, width):
+    n %= width
+    if n == 0:
+        return a
+    return ((a << _U64(n)) | (a >> _U64(width - n))) & _mask(width)
+
+
+# node type -> f(node, width, *args), width is the width of the (first)
+# argument of the node
+_OPS = {
+    op.AND: lambda n, w, *args: np.logical_and.reduce(np.broadcast_arrays(*args)),
+    op.OR: lambda n, w, *args: np.logical_or.reduce(np.broadcast_arrays(*args)),
+    op.NOT: lambda n, w, a: ~a,
+    op.IMPLIES: lambda n, w, a, b: ~a | b,
+    op.IFF: lambda n, w, a, b: a == b,
+    op.EQUALS: lambda n, w, a, b: a == b,
+    op.ITE: lambda n, w, c, a, b: np.where(c, a, b),
+    op.BV_NOT: lambda n, w, a: ~a & _mask(w),
+    op.BV_AND: lambda n, w, a, b: a & b,
+    op.BV_OR: lambda n, w, a, b: a | b,
+    op.BV_XOR: lambda n, w, a, b: a ^ b,
+    op.BV_NEG: lambda n, w, a: _neg(a, w),
+    op.BV_ADD: lambda n, w, a, b: (a + b) & _mask(w),
+    op.BV_SUB: lambda n, w, a, b: (a - b) & _mask(w),
+    op.BV_MUL: lambda n, w, a, b: (a * b) & _mask(w),
+    op.BV_UDIV: lambda n, w, a, b: _udiv(a, b, w),
+    op.BV_UREM: lambda n, w, a, b: _urem(a, b, w),
+    op.BV_SDIV: lambda n, w, a, b: _sdiv(a, b, w),
+    op.BV_SREM: lambda n, w, a, b: _srem(a, b, w),
+    op.BV_ULT: lambda n, w, a, b: a < b,
+    op.BV_ULE: lambda n, w, a, b: a <= b,
+    op.BV_SLT: lambda n, w, a, b: (a ^ _U64(1 << (w - 1))) < (b ^ _U64(1 << (w - 1))),
+    op.BV_SLE: lambda n, w, a, b: (a ^ _U64(1 << (w - 1))) <= (b ^ _U64(1 << (w - 1))),
+    op.BV_LSHL: lambda n, w, a, b: np.where(b < w, (a << _shift(b, w)) & _mask(w), _U64(0)),
+    op.BV_LSHR: lambda n, w, a, b: np.where(b < w, a >> _shift(b, w), _U64(0)),
+    op.BV_ASHR: lambda n, w, a, b: _ashr(a, b, w),
+    op.BV_ROL: lambda n, w, a: _rotate(a, n.bv_rotation_step(), w),
+    op.BV_ROR: lambda n, w, a: _rotate(a, -n.bv_rotation_step(), w),
+    op.BV_COMP: lambda n, w, a, b: (a == b).astype(_U64),
+    op.BV_EXTRACT: lambda n, w, a: (a >> _U64(n.bv_extract_start())) & _mask(n.bv_width()),
+    op.BV_CONCAT: lambda n, w, a, b: (a << _U64(n.args()[1].bv_width())) | b,
+    op.BV_ZEXT: lambda n, w, a: a,
+    op.BV_SEXT: lambda n, w, a: np.where(_sign(a, w), a | (_mask(n.bv_width()) ^ _mask(w)), a),
+}
+
+
+def _width(node: FNode) -> int:
+    T = node.get_type()
+    if T.is_bool_type():
+        return 1
+    elif T.is_bv_type():
+        return T.width
+    raise TypeError(f'unsupported type {T} of {node}')
+
+
+def _compile(terms, symbols):
+    # Returns the nodes of the dag of terms in topological order as
+    # (node, f, args), f is None for leaves.  Leaves are symbols (looked up
+    # in the inputs) and constants.
+    steps = []
+    seen = set()
+    stack = list(terms)
+    while stack:
+        node = stack[-1]
+        if node in seen:
+            stack.pop()
+            continue
+        todo = [arg for arg in node.args() if arg not in seen]
+        if todo:
+            stack.extend(todo)
+            continue
+        stack.pop()
+        seen.add(node)
+        if _width(node) > 64 or any(_width(arg) > 64 for arg in node.args()):
+            raise TypeError(f'bit vectors wider than 64 bits are not supported')
+        if node.is_symbol():
+            if node not in symbols:
+                raise ValueError(f'{node} is not an input')
+            steps.append((node, None, ()))
+        elif node.is_constant():
+            steps.append((node, None, ()))
+        else:
+            try:
+                f = _OPS[node.node_type()]
+            except KeyError:
+                raise NotImplementedError(f'unsupported operator in {node}') from None
+            args = node.args()
+            steps.append((node, f, (_width(args[0]), *args)))
+    return steps
+
+
+class BatchEvaluator:
+    '''
+    Evaluates the outputs of the SMT peak of arch_fc over batches of
+    concrete inputs.  The inputs in fixed (by name, python values) are held
+    constant, the others are passed as arrays (or scalars) of ints to
+    __call__, adts as their assembled value.
+
+    inputs maps the names of the free inputs to their widths.
+    '''
+    def __init__(self, arch_fc, family, **fixed):
+        fam = family.SMTFamily()
+        inputs, outputs = symbolic_outputs(arch_fc, fam)
+        unknown = fixed.keys() - inputs.keys()
+        if unknown:
+            raise ValueError(f'unknown inputs {sorted(unknown)}')
+
+        substitution = {}
+        self._symbols = {}
+        self.inputs = {}
+        for name, (value, var, assembler) in inputs.items():
+            if name in fixed:
+                substitution[var.value] = constant(var, assembler, fixed[name]).value
+            else:
+                self._symbols[var.value] = name
+                self.inputs[name] = _width(var.value)
+
+        self._outputs = {}
+        for name, value in outputs.items():
+            if not isinstance(getattr(value, 'value', None), FNode):
+                raise TypeError(f'output {name} is not a bit or bit vector')
+            self._outputs[name] = value.value.substitute(substitution).simplify()
+        self._steps = _compile(self._outputs.values(), self._symbols)
+
+    def __call__(self, **inputs) -> tp.Mapping[str, np.ndarray]:
+        '''
+        Returns {output name: array of its values}, with inputs broadcast
+        against each other.
+        '''
+        if inputs.keys() != self.inputs.keys():
+            raise ValueError(f'expected inputs {sorted(self.inputs)}, got {sorted(inputs)}')
+        arrays = {
+            name: np.asarray(array, dtype=_U64) & _mask(self.inputs[name])
+            for name, array in inputs.items()
+        }
+        shape = np.broadcast_shapes(*(a.shape for a in arrays.values()))
+
+        values = {}
+        for node, f, args in self._steps:
+            if f is not None:
+                width, *args = args
+                values[node] = f(node, width, *(values[arg] for arg in args))
+            elif node.is_symbol():
+                values[node] = arrays[self._symbols[node]]
+            elif node.is_bool_constant():
+                values[node] = np.bool_(node.constant_value())
+            else:
+                values[node] = _U64(node.constant_value())
+
+        out = {}
+        for name, term in self._outputs.items():
+            if term.get_type().is_bool_type():
+                dtype = np.bool_
+            else:
+                dtype = _dtype(term.bv_width())
+            out[name] = np.broadcast_to(values[term], shape).astype(dtype)
+        return out
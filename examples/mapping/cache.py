@@ -0,0 +1,230 @@
+'''
+Persistent cache of mapping results.
+
+Building an ArchMapper symbolically executes the whole architecture and every
+solve is a fresh synthesis query.  MappingCache stores the rewrite rules found
+(and ir instructions found to be unmappable) on disk keyed by a hash of the
+sources of the arch and ir peaks and the peak / hwtypes / pysmt versions.  A
+repeated mapping job only builds the ArchMapper when it sees a new or changed
+ir instruction.
+
+pysmt terms belong to the formula manager that created them so the symbolic
+artifacts of an ArchMapper (path constraints, varmaps, ...) are not written to
+disk, ArchMappers are memoized in process instead.
+'''
+import ast
+import hashlib
+import importlib.util
+from importlib import metadata
+import json
+import os
+import sys
+import tempfile
+
+from peak.mapper import ArchMapper, read_serialized_bindings
+
+
+_VERSIONED = ('peak', 'hwtypes', 'pysmt')
+
+
+def _versions():
+    versions = {}
+    for dist in _VERSIONED:
+        try:
+            versions[dist] = metadata.version(dist)
+        except metadata.PackageNotFoundError:
+            versions[dist] = None
+    return versions
+
+
+def _imports(path: str, package: str):
+    with open(path) as f:
+        tree = ast.parse(f.read(), path)
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                yield alias.name
+        elif isinstance(node, ast.ImportFrom):
+            base = '.' * node.level + (node.module or '')
+            if node.level:
+                base = importlib.util.resolve_name(base, package)
+            yield base
+            if node.module is None:
+                # from .. import pkg
+                for alias in node.names:
+                    yield f'{base}.{alias.name}'
+
+
+def _source_files(module_name: str):
+    # (module name, path) of all files of the package defining module_name and
+    # of the packages in the same namespace that it (transitively) imports from
+    module = sys.modules[module_name]
+    if not hasattr(module, '__path__') and '.' not in module_name:
+        # top level module
+        return [(module_name, module.__file__)]
+
+    root = module_name.partition('.')[0]
+    todo = [module_name if hasattr(module, '__path__') else module_name.rpartition('.')[0]]
+    seen = set()
+    files = []
+    while todo:
+        pkg = todo.pop()
+        if pkg in seen:
+            continue
+        seen.add(pkg)
+        spec = importlib.util.find_spec(pkg)
+        for directory in spec.submodule_search_locations:
+            for name in sorted(os.listdir(directory)):
+                if not name.endswith('.py'):
+                    continue
+                path = os.path.join(directory, name)
+                if name == '__init__.py':
+                    files.append((pkg, path))
+                else:
+                    files.append((f'{pkg}.{name[:-3]}', path))
+                for dep in _imports(path, pkg):
+                    if dep.partition('.')[0] != root:
+                        continue
+                    try:
+                        dep_spec = importlib.util.find_spec(dep)
+                    except ModuleNotFoundError:
+                        dep_spec = None
+                    if dep_spec is None or dep_spec.submodule_search_locations is None:
+                        dep = dep.rpartition('.')[0]
+                    todo.append(dep)
+    return sorted(files)
+
+
+def dump_json(path: str, obj):
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    # write and rename so concurrent jobs never see a partial file
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(obj, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def source_hash(fc) -> str:
+    '''
+    Hash of the sources a family closure depends on.  Files are named by
+    their module, the hash does not depend on where the package is installed.
+    '''
+    h = hashlib.sha256()
+    # The python peak is defined in the closure's module
+    for name, path in _source_files(fc.Py.__module__):
+        h.update(name.encode())
+        with open(path, 'rb') as f:
+            h.update(hashlib.sha256(f.read()).digest())
+    return h.hexdigest()
+
+
+class MappingCache:
+    '''
+    On disk cache of rewrite rules under directory.
+
+    Use map to find a rewrite rule for an ir instruction, the result of the
+    solver (including None) is reused for as long as neither the arch nor the
+    ir sources change.
+
+    If corpus (a Corpus) is given, rules found by the solver are verified
+    before they are stored.  Counterexamples are added to the corpus and
+    the rule is dropped (map returns None without storing it).
+    '''
+    def __init__(self, directory, corpus=None):
+        self.directory = directory
+        self.corpus = corpus
+        self.hits = 0
+        self.misses = 0
+        self._mappers = {}
+        self._hashes = {}
+
+    def _hash(self, fc) -> str:
+        try:
+            return self._hashes[fc]
+        except KeyError:
+            h = self._hashes[fc] = source_hash(fc)
+            return h
+
+    def _file(self, arch_fc, arch_key) -> str:
+        return os.path.join(self.directory, f'{arch_fc.Py.__name__}-{arch_key[:16]}.json')
+
+    def _load(self, path) -> dict:
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _dump(self, path, entries):
+        dump_json(path, entries)
+
+    def arch_key(self, arch_fc, path_constraints=None) -> str:
+        h = hashlib.sha256()
+        h.update(self._hash(arch_fc).encode())
+        h.update(json.dumps(_versions(), sort_keys=True).encode())
+        h.update(repr(sorted((path_constraints or {}).items())).encode())
+        return h.hexdigest()
+
+    def arch_mapper(self, arch_fc, family, path_constraints=None) -> ArchMapper:
+        '''
+        ArchMapper for arch_fc, built once per process.
+        '''
+        key = arch_fc, family, repr(sorted((path_constraints or {}).items()))
+        try:
+            return self._mappers[key]
+        except KeyError:
+            kwargs = {'family': family}
+            if path_constraints is not None:
+                kwargs['path_constraints'] = path_constraints
+            mapper = self._mappers[key] = ArchMapper(arch_fc, **kwargs)
+            return mapper
+
+    def map(self, arch_fc, ir_fc, family, path_constraints=None, **solve_kwargs):
+        '''
+        Returns the RewriteRule mapping ir_fc on to arch_fc or None if the
+        solver found none.  solve_kwargs are passed to IRMapper.solve.
+        '''
+        arch_key = self.arch_key(arch_fc, path_constraints)
+        ir_key = self._hash(ir_fc) + ':' + ir_fc.Py.__qualname__
+        path = self._file(arch_fc, arch_key)
+        entries = self._load(path)
+
+        try:
+            bindings = entries[ir_key]
+        except KeyError:
+            pass
+        else:
+            self.hits += 1
+            if bindings is None:
+                return None
+            return read_serialized_bindings(bindings, ir_fc, arch_fc)
+
+        self.misses += 1
+        arch_mapper = self.arch_mapper(arch_fc, family, path_constraints)
+        ir_mapper = arch_mapper.process_ir_instruction(ir_fc)
+        rule = ir_mapper.solve(**solve_kwargs)
+        if rule is not None and self.corpus is not None:
+            # corpus imports cache
+            from .corpus import isa_key, rule_counterexample
+            cex = rule_counterexample(rule)
+            if cex is not None:
+                self.corpus.add(isa_key(arch_fc), cex)
+                return None
+        # reload, another job may have written in the mean time
+        entries = self._load(path)
+        entries[ir_key] = None if rule is None else rule.serialize_bindings()
+        self._dump(path, entries)
+        return rule
+
+    def clear(self):
+        '''
+        Remove all cache files.
+        '''
+        self._mappers.clear()
+        self._hashes.clear()
+        if not os.path.isdir(self.directory):
+            return
+        for name in os.listdir(self.directory):
+            if name.endswith('.json'):
+                os.remove(os.path.join(self.directory, name))
@@ -0,0 +1,145 @@
+'''
+Persistent corpus of test vectors.
+
+Random tests draw new vectors on every run and forget the interesting
+ones.  A Corpus keeps, per ISA (riscv, riscv_m, riscv_f, mips, reg_overlap,
+...), the input vectors of its mappable arch worth trying again:
+counterexamples found by ArchSession.check (pass corpus= to the session),
+counterexamples to the rewrite rules found by MappingCache and synthesize
+(pass corpus= to them, see rule_counterexample), boundary cases found by
+the solver (edge_vectors) and whatever failing vectors tests add.  Tests
+and bulk checks replay the corpus before drawing random vectors (see the
+corpus and replay fixtures in tests/conftest.py).
+
+Vectors map input names of the mappable arch to ints, adts (i.e. the
+instruction) as their assembled value.  Counterexamples to rewrite rules
+map the names of the solver variables to ints instead, consumers skip
+vectors which do not set the inputs they need.  Vectors of an ISA are kept
+in the order they were added, without duplicates.
+'''
+import json
+import os
+import typing as tp
+
+from hwtypes import AbstractBitVector
+
+from .cache import dump_json
+
+
+Vector = tp.Mapping[str, int]
+
+
+def isa_key(arch_fc) -> str:
+    '''
+    Name of the ISA of arch_fc, the package its python peak is defined in
+    (e.g. 'riscv_m' for examples.riscv_m.sim).
+    '''
+    return arch_fc.Py.__module__.rpartition('.')[0].rpartition('.')[2]
+
+
+def _canonical(vector: Vector) -> str:
+    return json.dumps(vector, sort_keys=True)
+
+
+class Corpus:
+    '''
+    On disk corpus of test vectors under directory, one file per ISA.
+    '''
+    def __init__(self, directory):
+        self.directory = directory
+
+    def _file(self, isa: str) -> str:
+        return os.path.join(self.directory, f'{isa}.json')
+
+    def vectors(self, isa: str) -> tp.List[Vector]:
+        try:
+            with open(self._file(isa)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return []
+
+    def add(self, isa: str, *vectors: Vector) -> int:
+        '''
+        Adds vectors to the corpus of isa, returns the number of new ones.
+        '''
+        stored = self.vectors(isa)
+        seen = {_canonical(v) for v in stored}
+        new = 0
+        for vector in vectors:
+            vector = {name: int(value) for name, value in vector.items()}
+            key = _canonical(vector)
+            if key not in seen:
+                seen.add(key)
+                stored.append(vector)
+                new += 1
+        if new:
+            dump_json(self._file(isa), stored)
+        return new
+
+    def replay(self, isa: str, draw: tp.Callable[[], Vector], n: int) -> tp.Iterator[Vector]:
+        '''
+        Yields the vectors of isa then n vectors from draw.
+        '''
+        yield from self.vectors(isa)
+        for _ in range(n):
+            yield draw()
+
+    def columns(self, isa: str, names: tp.Iterable[str]) -> tp.Mapping[str, tp.List[int]]:
+        '''
+        The vectors of isa which set all of names as {name: [values]},
+        e.g. to pass to a BatchEvaluator.
+        '''
+        names = tuple(names)
+        vectors = [v for v in self.vectors(isa) if all(name in v for name in names)]
+        return {name: [v[name] for v in vectors] for name in names}
+
+    def clear(self, isa: tp.Optional[str] = None):
+        '''
+        Removes the corpus of isa or of all ISAs.
+        '''
+        if isa is not None:
+            paths = [self._file(isa)]
+        elif os.path.isdir(self.directory):
+            paths = [os.path.join(self.directory, name)
+                     for name in os.listdir(self.directory) if name.endswith('.json')]
+        else:
+            paths = []
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def _boundaries(size: int):
+    # 0, 1, -1, smin, smax
+    return sorted({0, 1, (1 << size) - 1, 1 << (size - 1), (1 << (size - 1)) - 1})
+
+
+def edge_vectors(session, **fixed) -> tp.List[Vector]:
+    '''
+    Asks the solver of an ArchSession for inputs driving each bit vector
+    output to its boundary values (0, 1, all ones and the signed extremes)
+    with the inputs in fixed held constant.  Returns the vectors found.
+    '''
+    vectors = []
+    for var in session.outputs.values():
+        if not isinstance(var, AbstractBitVector):
+            continue
+        T = type(var)
+        for value in _boundaries(T.size):
+            vector = session.find(var == T(value), **fixed)
+            if vector is not None:
+                vectors.append(vector)
+    return vectors
+
+
+def rule_counterexample(rule, solver_name='z3') -> tp.Optional[Vector]:
+    '''
+    Verifies a rewrite rule, returns None if it holds or the counterexample
+    of the solver mapping variable names to ints.
+    '''
+    model = rule.verify(solver_name=solver_name)
+    if model is None:
+        return None
+    return {var.symbol_name(): int(value.constant_value()) for var, value in model}
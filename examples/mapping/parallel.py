@@ -0,0 +1,258 @@
+'''
+Parallel rewrite rule synthesis.
+
+The instruction input of a mappable arch is a Sum (of Products of
+TaggedUnions ...).  variants enumerates the paths to its leaf instruction
+classes (OP.tag.arith, OP.tag.shift, LUI, Branch, ...) and synthesize runs
+one synthesis query per (ir op, variant) in a process pool, each against an
+ArchMapper restricted to the variant through path constraints (built once
+per variant in each worker).  The first rule found for an ir op wins, its
+queries not started yet are skipped and the ones still running are no longer
+waited on.
+
+Peaks, families and hwtypes types do not pickle so workers are handed
+references of the form 'package.module:name' and a variant as a tuple of
+names, and send back serialized bindings.
+'''
+from collections import deque, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+import functools
+import importlib
+import os
+import time
+
+from hwtypes.adt import Product, Sum, TaggedUnion
+
+from peak.mapper import ArchMapper, read_serialized_bindings
+
+from .corpus import isa_key, rule_counterexample
+
+
+MappingResult = namedtuple('MappingResult', ['rule', 'variant', 'elapsed', 'status', 'error'],
+                           defaults=(None,))
+# status is one of
+FOUND = 'found'
+UNMAPPABLE = 'unmappable'
+TIMEOUT = 'timeout'
+ERROR = 'error'
+
+
+def _import(ref: str):
+    module_name, _, name = ref.partition(':')
+    module = importlib.import_module(module_name)
+    if not name:
+        return module
+    return getattr(module, name)
+
+
+def _key_name(key) -> str:
+    # Sum fields are keyed by type, TaggedUnion and Product fields by name
+    return key if isinstance(key, str) else key.__name__
+
+
+def _choices(adt_t):
+    if issubclass(adt_t, TaggedUnion):
+        # definition order
+        return list(adt_t.field_dict.items())
+    # field_dict of a Sum is unordered
+    return sorted(adt_t.field_dict.items(), key=lambda kv: _key_name(kv[0]))
+
+
+def _sum_field(adt_t):
+    # Name of the (only) Sum field of a Product, None if it has none
+    fields = [name for name, field in adt_t.field_dict.items()
+              if isinstance(field, type) and issubclass(field, Sum)]
+    if len(fields) == 1:
+        return fields[0]
+    return None
+
+
+def _paths(adt_t, path):
+    if issubclass(adt_t, Sum):
+        for key, field in _choices(adt_t):
+            yield from _paths(field, path + (key,))
+    elif issubclass(adt_t, Product) and _sum_field(adt_t) is not None:
+        name = _sum_field(adt_t)
+        yield from _paths(adt_t.field_dict[name], path + (name,))
+    else:
+        yield path
+
+
+def variants(inst_t):
+    '''
+    Paths (as tuples of names) to the leaf instruction classes of inst_t.
+    '''
+    return [tuple(map(_key_name, path)) for path in _paths(inst_t, ())]
+
+
+def path_constraints(inst_t, variant, inst_name='inst'):
+    '''
+    Path constraints selecting variant, maps the path (from inst_name) of
+    every Sum along variant to the choice made.
+    '''
+    constraints = {}
+    path = (inst_name,)
+    adt_t = inst_t
+    for name in variant:
+        for key, field in adt_t.field_dict.items():
+            if _key_name(key) == name:
+                break
+        else:
+            raise ValueError(f'{name} is not a field of {adt_t}')
+        if issubclass(adt_t, Sum):
+            constraints[path] = key
+        path += (key,)
+        adt_t = field
+    return constraints
+
+
+def arch_variants(arch_ref: str):
+    '''
+    Variants of the instruction set of the arch at arch_ref, the module of a
+    mappable arch defines the ISA_fc it is built from.
+    '''
+    return variants(_import(arch_ref.partition(':')[0]).ISA_fc.Py.Inst)
+
+
+@functools.lru_cache(maxsize=None)
+def _arch_mapper(arch_ref, variant):
+    # Runs in a worker, which builds (i.e. symbolically executes the arch)
+    # once per variant and reuses it for every ir op
+    module = _import(arch_ref.partition(':')[0])
+    constraints = path_constraints(module.ISA_fc.Py.Inst, variant)
+    return ArchMapper(_import(arch_ref), path_constraints=constraints, family=module.family)
+
+
+def _solve(arch_ref, ir_ref, variant, solve_kwargs, verify):
+    # Runs in a worker, returns (bindings, counterexample)
+    ir_mapper = _arch_mapper(arch_ref, variant).process_ir_instruction(_import(ir_ref))
+    rule = ir_mapper.solve(**solve_kwargs)
+    if rule is None:
+        return None, None
+    if verify:
+        cex = rule_counterexample(rule)
+        if cex is not None:
+            return None, cex
+    return rule.serialize_bindings(), None
+
+
+def _kill(executor):
+    # Shuts executor down without waiting for the queries still running,
+    # ProcessPoolExecutor can only kill its workers publicly from python 3.14
+    terminate_workers = getattr(executor, 'terminate_workers', None)
+    if terminate_workers is not None:
+        terminate_workers()
+        return
+    processes = list((executor._processes or {}).values())
+    executor.shutdown(wait=False, cancel_futures=True)
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        process.join()
+
+
+def synthesize(arch_ref: str, ir_refs, *,
+               max_workers=None, timeout=None, solve_kwargs=None, corpus=None):
+    '''
+    Finds a rewrite rule for every ir op in ir_refs on to the arch at
+    arch_ref, see the module docstring for the form of the references.
+
+    timeout bounds the wall time of the run, ops without a rule by then are
+    reported as TIMEOUT and the workers (including queries still running)
+    are killed.  An op is reported as ERROR (with the first exception
+    raised) if a query for it failed and no other query found a rule.  A
+    worker dying (e.g. killed by the OOM killer) fails the queries in flight
+    with BrokenProcessPool and the remaining queries run on a new pool.
+
+    If corpus (a Corpus) is given, rules are verified by the workers, rules
+    with a counterexample are dropped and the counterexample added to the
+    corpus.
+
+    Returns {ir_ref: MappingResult}
+    '''
+    solve_kwargs = dict(solve_kwargs or {})
+    arch_fc = _import(arch_ref)
+    paths = arch_variants(arch_ref)
+    ir_refs = list(ir_refs)
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+
+    # Queries are submitted as workers free up so the queries of ops
+    # already mapped can be skipped
+    queries = deque((ir_ref, variant) for ir_ref in ir_refs for variant in paths)
+    remaining = {ir_ref: len(paths) for ir_ref in ir_refs}
+    errors = {}
+    results = {}
+    # {future: (ir_ref, variant)} of the queries waited on, the queries of an
+    # op are dropped once it is mapped and no longer count against
+    # max_workers (a running query keeps its worker until it returns)
+    futures = {}
+
+    start = time.perf_counter()
+    executor = ProcessPoolExecutor(max_workers)
+    try:
+        while True:
+            while queries and len(futures) < max_workers:
+                ir_ref, variant = queries.popleft()
+                if ir_ref in results:
+                    continue
+                try:
+                    future = executor.submit(
+                        _solve, arch_ref, ir_ref, variant, solve_kwargs, corpus is not None)
+                except BrokenProcessPool:
+                    # the queries in flight fail with BrokenProcessPool
+                    queries.appendleft((ir_ref, variant))
+                    _kill(executor)
+                    executor = ProcessPoolExecutor(max_workers)
+                    continue
+                futures[future] = ir_ref, variant
+            if not futures:
+                break
+
+            if timeout is None:
+                wait_for = None
+            else:
+                wait_for = timeout - (time.perf_counter() - start)
+                if wait_for <= 0:
+                    break
+            finished, _ = wait(futures, timeout=wait_for, return_when=FIRST_COMPLETED)
+            if not finished:
+                break
+            for future in finished:
+                if future not in futures:
+                    # dropped, its op was mapped by a future finished with it
+                    continue
+                ir_ref, variant = futures.pop(future)
+                exc = future.exception()
+                if exc is None:
+                    bindings, cex = future.result()
+                else:
+                    bindings, cex = None, None
+                if cex is not None:
+                    corpus.add(isa_key(arch_fc), cex)
+                remaining[ir_ref] -= 1
+                if exc is not None:
+                    errors.setdefault(ir_ref, (variant, exc))
+                elapsed = time.perf_counter() - start
+                if bindings is not None:
+                    rule = read_serialized_bindings(bindings, _import(ir_ref), arch_fc)
+                    results[ir_ref] = MappingResult(rule, variant, elapsed, FOUND)
+                    for other, (other_ref, _) in list(futures.items()):
+                        if other_ref == ir_ref:
+                            other.cancel()
+                            del futures[other]
+                elif remaining[ir_ref] == 0:
+                    if ir_ref in errors:
+                        variant, exc = errors[ir_ref]
+                        results[ir_ref] = MappingResult(None, variant, elapsed, ERROR, exc)
+                    else:
+                        results[ir_ref] = MappingResult(None, None, elapsed, UNMAPPABLE)
+    finally:
+        _kill(executor)
+
+    elapsed = time.perf_counter() - start
+    for ir_ref in ir_refs:
+        if ir_ref not in results:
+            results[ir_ref] = MappingResult(None, None, elapsed, TIMEOUT)
+    return results
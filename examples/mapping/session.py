@@ -0,0 +1,155 @@
+'''
+Incremental solver sessions.
+
+An ArchSession symbolically executes a mappable arch once, asserts its
+outputs in a solver once and then runs every query (a fixed instruction
+checked against an ir op) between push and pop.  Queries share the
+encoding of the arch and whatever the solver learned about it.
+'''
+import typing as tp
+
+from hwtypes import AbstractBit, AbstractBitVector
+from hwtypes.modifiers import strip_modifiers
+from pysmt.shortcuts import Or, Solver
+
+from peak.assembler import Assembler
+
+from .corpus import isa_key
+
+
+def free_value(fam, name: str, T):
+    '''
+    Free SMT value of the python type T (possibly modified), returns
+    (value, variable, assembler).  For adts variable is the bit vector of
+    the assembled value and assembler is its Assembler, otherwise value is
+    variable and assembler is None.
+    '''
+    T = strip_modifiers(T)
+    if issubclass(T, AbstractBit):
+        var = fam.Bit(name=name)
+        return var, var, None
+    elif issubclass(T, AbstractBitVector):
+        var = fam.BitVector[T.size](name=name)
+        return var, var, None
+    assembler = Assembler(T)
+    var = fam.BitVector[assembler.width](name=name)
+    return fam.get_adt_t(T)(var), var, assembler
+
+
+def constant(var, assembler, value):
+    '''
+    SMT constant of the python value value for the variable var (and its
+    assembler) from free_value.
+    '''
+    if assembler is not None:
+        value = assembler.assemble(value)
+    return type(var)(int(value))
+
+
+def symbolic_outputs(arch_fc, fam):
+    '''
+    Evaluates the peak of arch_fc for the SMT family fam on free inputs,
+    returns ({input name: free_value(...)}, {output name: value}).
+    '''
+    inputs = {
+        name: free_value(fam, name, T)
+        for name, T in arch_fc.Py.input_t.field_dict.items()
+    }
+    outputs = arch_fc(fam)()(*(value for value, _, _ in inputs.values()))
+    if not isinstance(outputs, tuple):
+        outputs = outputs,
+    return inputs, dict(zip(arch_fc.Py.output_t.field_dict, outputs))
+
+
+class ArchSession:
+    '''
+    Solver session for the SMT peak of arch_fc.
+
+    inputs maps the input names of the arch to free SMT values (the
+    instruction as an assembled adt), outputs its output names to variables
+    asserted equal to the outputs of the arch.
+
+    Counterexamples found by check are added to corpus (a Corpus) if given.
+    '''
+    def __init__(self, arch_fc, family, solver_name='z3', logic=None, corpus=None):
+        fam = family.SMTFamily()
+        self.family = fam
+        self.isa = isa_key(arch_fc)
+        self.corpus = corpus
+        self.inputs = {}
+        self._vars = {}
+        self._assemblers = {}
+        inputs, outputs = symbolic_outputs(arch_fc, fam)
+        for name, (value, var, assembler) in inputs.items():
+            self.inputs[name] = value
+            self._vars[name] = var
+            self._assemblers[name] = assembler
+
+        self.solver = Solver(name=solver_name, logic=logic)
+        self.outputs = {}
+        for name, value in outputs.items():
+            var = type(value)(name=f'{name}_out')
+            self.solver.add_assertion((var == value).value)
+            self.outputs[name] = var
+        self.queries = 0
+
+    def check(self, expected: tp.Mapping, **fixed):
+        '''
+        Checks the outputs of the arch against expected with the inputs in
+        fixed (by name, python values) held constant.
+
+        expected maps output names to SMT values over inputs, outputs not
+        in expected are unconstrained.
+
+        Returns None if they agree on all other inputs or a counterexample
+        mapping input names to ints.
+        '''
+        cex = self._solve(Or(*(
+            (self.outputs[name] != value).value
+            for name, value in expected.items()
+        )), fixed)
+        if cex is not None and self.corpus is not None:
+            self.corpus.add(self.isa, cex)
+        return cex
+
+    def find(self, condition, **fixed):
+        '''
+        Returns inputs (mapping input names to ints) for which condition,
+        an SMT bit over inputs and outputs, holds with the inputs in fixed
+        held constant or None if there are none.
+        '''
+        return self._solve(condition.value, fixed)
+
+    def _solve(self, formula, fixed):
+        solver = self.solver
+        self.queries += 1
+        solver.push()
+        try:
+            for name, value in fixed.items():
+                solver.add_assertion((self._vars[name] == constant(
+                    self._vars[name], self._assemblers[name], value)).value)
+            solver.add_assertion(formula)
+            if not solver.solve():
+                return None
+            return {name: solver.get_py_value(var.value)
+                    for name, var in self._vars.items()}
+        finally:
+            solver.pop()
+
+    def close(self):
+        self.solver.exit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def check_fresh(arch_fc, family, expected, solver_name='z3', logic=None, corpus=None, **fixed):
+    '''
+    ArchSession.check without a session, builds the arch and a solver per
+    query.  expected is a function of the inputs of the session.
+    '''
+    with ArchSession(arch_fc, family, solver_name, logic, corpus) as session:
+        return session.check(expected(session.inputs), **fixed)
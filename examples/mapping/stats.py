@@ -0,0 +1,178 @@
+'''
+Size and build time of the SMT form of family closures.
+
+smt_stats(fc, family) builds the SMT peak of fc, evaluates it on free
+inputs and reports, as a json serializable dict,
+
+    build_time    seconds to build (fc(family)) and instantiate the peak
+    eval_time     seconds to symbolically evaluate it
+    outputs       {output name: term stats}
+    total         term stats of all outputs together
+    components    {attribute path: component stats}
+
+where term stats are
+
+    nodes         distinct nodes of the term dag
+    depth         depth of the dag
+    tree          size of the term as a tree (i.e. without sharing)
+
+Components are the sub peaks and helpers (register files, memories, ...)
+reachable from the peak through instance attributes, e.g. 'riscv.Decode'.
+Their stats are accumulated over all calls made during evaluation:
+
+    calls         number of calls
+    time          seconds spent in them (including nested components)
+    nodes         distinct nodes of all their outputs
+    depth         deepest output
+'''
+import json
+import time
+
+from hwtypes import AbstractBit, AbstractBitVector
+from pysmt.fnode import FNode
+
+from peak import Peak
+
+from .session import free_value
+
+
+def _terms(value):
+    # pysmt terms of an SMT value (bit, bit vector, adt or tuple of them)
+    if isinstance(value, FNode):
+        yield value
+    elif isinstance(getattr(value, 'value', None), FNode):
+        yield value.value
+    elif isinstance(value, (tuple, list)):
+        for v in value:
+            yield from _terms(v)
+    elif isinstance(value, dict):
+        for v in value.values():
+            yield from _terms(v)
+    elif hasattr(value, '_value_'):
+        # assembled adt
+        yield from _terms(value._value_)
+    elif hasattr(value, 'value_dict'):
+        yield from _terms(value.value_dict)
+
+
+def term_stats(*terms) -> dict:
+    '''
+    Stats of the dag made of terms, see the module docstring.
+    '''
+    depth = {}
+    tree = {}
+    stack = list(terms)
+    while stack:
+        node = stack[-1]
+        if node in depth:
+            stack.pop()
+            continue
+        args = node.args()
+        todo = [arg for arg in args if arg not in depth]
+        if todo:
+            stack.extend(todo)
+            continue
+        stack.pop()
+        depth[node] = 1 + max((depth[arg] for arg in args), default=0)
+        tree[node] = 1 + sum(tree[arg] for arg in args)
+    return {
+        'nodes': len(depth),
+        'depth': max((depth[t] for t in terms), default=0),
+        'tree': sum(tree[t] for t in terms),
+    }
+
+
+class _Probe:
+    # Stands in for a component of a peak, records calls to it and to its
+    # methods and forwards everything else.
+    def __init__(self, path, obj, records):
+        object.__setattr__(self, '_path', path)
+        object.__setattr__(self, '_obj', obj)
+        object.__setattr__(self, '_records', records)
+
+    def _record(self, path, f, args, kwargs):
+        record = self._records.setdefault(path, {'calls': 0, 'time': 0.0, 'terms': []})
+        start = time.perf_counter()
+        out = f(*args, **kwargs)
+        record['time'] += time.perf_counter() - start
+        record['calls'] += 1
+        record['terms'].extend(_terms(out))
+        return out
+
+    def __call__(self, *args, **kwargs):
+        return self._record(self._path, self._obj, args, kwargs)
+
+    def __getattr__(self, name):
+        attr = getattr(self._obj, name)
+        if callable(attr) and not isinstance(attr, type):
+            path = self._path
+            def method(*args, **kwargs):
+                return self._record(path, attr, args, kwargs)
+            return method
+        return attr
+
+    def __setattr__(self, name, value):
+        setattr(self._obj, name, value)
+
+
+def _instrument(obj, path, records):
+    # Replaces the components of obj with probes, recursing in to sub peaks
+    for name, attr in list(vars(obj).items()):
+        sub = f'{path}.{name}' if path else name
+        if isinstance(attr, Peak):
+            _instrument(attr, sub, records)
+        elif (isinstance(attr, (type, _Probe, AbstractBit, AbstractBitVector))
+                or callable(attr)
+                or not hasattr(attr, '__dict__')):
+            continue
+        setattr(obj, name, _Probe(sub, attr, records))
+
+
+def smt_stats(fc, family) -> dict:
+    '''
+    Builds and evaluates the SMT peak of fc, see the module docstring.
+    family is the family module of fc.
+    '''
+    fam = family.SMTFamily()
+    start = time.perf_counter()
+    peak_t = fc(fam)
+    peak = peak_t()
+    build_time = time.perf_counter() - start
+
+    inputs = [free_value(fam, name, T)[0] for name, T in fc.Py.input_t.field_dict.items()]
+    records = {}
+    _instrument(peak, '', records)
+
+    start = time.perf_counter()
+    outputs = peak(*inputs)
+    eval_time = time.perf_counter() - start
+    if not isinstance(outputs, tuple):
+        outputs = outputs,
+
+    output_terms = {
+        name: list(_terms(value))
+        for name, value in zip(fc.Py.output_t.field_dict, outputs)
+    }
+    components = {}
+    for path, record in sorted(records.items()):
+        stats = term_stats(*record['terms'])
+        components[path] = {
+            'calls': record['calls'],
+            'time': record['time'],
+            'nodes': stats['nodes'],
+            'depth': stats['depth'],
+        }
+
+    return {
+        'name': peak_t.__name__,
+        'build_time': build_time,
+        'eval_time': eval_time,
+        'outputs': {name: term_stats(*terms) for name, terms in output_terms.items()},
+        'total': term_stats(*(t for terms in output_terms.values() for t in terms)),
+        'components': components,
+    }
+
+
+def dump_stats(stats, path: str):
+    with open(path, 'w') as f:
+        json.dump(stats, f, indent=2, sort_keys=True)
@@ -1,28 +1,44 @@
+from ..asmgen import fields, generate, product as _product, variant as _variant
 from .isa import ISA_fc
 
 isa = ISA_fc.Py
 
 
+# Types and tags shared by the constructors
+ASM_PRELUDE = '''\
+_Inst = isa.Inst
+_R3 = isa.R3
+_I2 = isa.I2
+_R2 = isa.R2
+_Idx = isa.Idx
+_Imm = isa.Imm
+_IDX = tuple(_Idx(i) for i in range(1 << _Idx.size))
+'''
+
 ASM_TEMPLATE_RI = '''\
+_{INST_NAME}{SUFFIX}_R = isa.R3Inst.{INST_NAME}{SUFFIX}
+_{INST_NAME}{SUFFIX}_I = isa.I2Inst.{INST_NAME}I{SUFFIX}
+
 def asm_{INST_NAME}{SUFFIX}(rd, rs, rt=None, im=None):
     if rt is not None and im is not None:
         raise ValueError('May not specify both rt and imm')
     elif rt is None and im is None:
         raise ValueError('Must specify either rt or imm')
 
-    rd = isa.Idx(rd)
-    rs = isa.Idx(rs)
+    rd = _Idx(rd)
+    rs = _Idx(rs)
 
     if rt is not None:
-        rt = isa.Idx(rt)
-        op = isa.R3Inst.{INST_NAME}{SUFFIX}
-        inst = isa.R3(rd, rs, rt, op)
+        inst = _R3(rd, rs, _Idx(rt), _{INST_NAME}{SUFFIX}_R)
     else:
-        im = isa.Imm(im)
-        op = isa.I2Inst.{INST_NAME}I{SUFFIX}
-        inst = isa.I2(rd, rs, im, op)
+        inst = _I2(rd, rs, _Imm(im), _{INST_NAME}{SUFFIX}_I)
 
-    return isa.Inst(inst)
+    return _Inst(inst)
+
+def fast_{INST_NAME}{SUFFIX}(rd, rs, rt=None, im=None):
+    if rt is not None:
+        return _variant(_Inst, _product(_R3, {R3_FIELDS}))
+    return _variant(_Inst, _product(_I2, {I2_FIELDS}))
 '''
 
 _NAME_SUFFIX = (
@@ -34,22 +50,27 @@ _NAME_SUFFIX = (
     ('SLT', 'U'),
 )
 
+_source = [ASM_PRELUDE]
 for inst_name, suffix in _NAME_SUFFIX:
     f_str = ASM_TEMPLATE_RI.format(
         INST_NAME=inst_name,
         SUFFIX=suffix,
+        R3_FIELDS=fields(isa.R3, rd='_IDX[rd]', rs='_IDX[rs]', rt='_IDX[rt]',
+                         op=f'_{inst_name}{suffix}_R'),
+        I2_FIELDS=fields(isa.I2, rd='_IDX[rd]', rs='_IDX[rs]', im='_Imm(im)',
+                         op=f'_{inst_name}{suffix}_I'),
     )
 
-    exec(f_str)
+    _source.append(f_str)
 
 ASM_TEMPLATE_R = '''\
+_{INST_NAME}_R = isa.R3Inst.{INST_NAME}
+
 def asm_{INST_NAME}(rd, rs, rt):
-    rd = isa.Idx(rd)
-    rs = isa.Idx(rs)
-    rt = isa.Idx(rt)
-    op = isa.R3Inst.{INST_NAME}
-    inst = isa.R3(rd, rs, rt, op)
-    return isa.Inst(inst)
+    return _Inst(_R3(_Idx(rd), _Idx(rs), _Idx(rt), _{INST_NAME}_R))
+
+def fast_{INST_NAME}(rd, rs, rt):
+    return _variant(_Inst, _product(_R3, {R3_FIELDS}))
 '''
 
 
@@ -58,26 +79,36 @@ for inst_name in isa.R3Inst._field_table_:
     if inst_name in _DONE:
         continue
 
-    f_str = ASM_TEMPLATE_R.format(INST_NAME=inst_name)
-    exec(f_str)
+    f_str = ASM_TEMPLATE_R.format(
+        INST_NAME=inst_name,
+        R3_FIELDS=fields(isa.R3, rd='_IDX[rd]', rs='_IDX[rs]', rt='_IDX[rt]',
+                         op=f'_{inst_name}_R'),
+    )
+    _source.append(f_str)
+
 
+ASM_TEMPLATE_CL = '''\
+_{INST_NAME}_R = isa.R2Inst.{INST_NAME}
 
-def asm_CLO(rd, rs, rt=None, im=None):
+def asm_{INST_NAME}(rd, rs, rt=None, im=None):
     if rt is not None or im is not None:
         raise ValueError('Must not specify either rt or imm')
 
-    rd = isa.Idx(rd)
-    rs = isa.Idx(rs)
-    op = isa.R2Inst.CLO
-    inst = isa.R2(rd, rs, op)
-    return isa.Inst(inst)
+    return _Inst(_R2(_Idx(rd), _Idx(rs), _{INST_NAME}_R))
+
+def fast_{INST_NAME}(rd, rs, rt=None, im=None):
+    return _variant(_Inst, _product(_R2, {R2_FIELDS}))
+'''
+
+
+for inst_name in ('CLO', 'CLZ'):
+    f_str = ASM_TEMPLATE_CL.format(
+        INST_NAME=inst_name,
+        R2_FIELDS=fields(isa.R2, rd='_IDX[rd]', rs='_IDX[rs]', op=f'_{inst_name}_R'),
+    )
+    _source.append(f_str)
 
-def asm_CLZ(rd, rs, rt=None, im=None):
-    if rt is not None or im is not None:
-        raise ValueError('Must not specify either rt or imm')
 
-    rd = isa.Idx(rd)
-    rs = isa.Idx(rs)
-    op = isa.R2Inst.CLZ
-    inst = isa.R2(rd, rs, op)
-    return isa.Inst(inst)
+# defines asm_<inst> and fast_<inst> for every instruction
+generate(globals(), '\n\n'.join(_source))
+del _source
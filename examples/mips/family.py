@@ -5,6 +5,7 @@ from peak import family
 from ast_tools.passes import remove_asserts
 
 from . import sizes
+from ..regfile import array_register_file
 
 # A bit of hack putting the def of word and idx here
 # and not isa but it makes life easier
@@ -42,6 +43,13 @@ class PyFamily(_MipsFamily_mixin, family.PyFamily):
         return RegisterFile
 
 
+class ArrayPyFamily(PyFamily):
+    # List backed register file, see examples.regfile.  Unlike the dict based
+    # register file, registers which were never written read as 0.
+    def get_register_file(fam_self):
+        return array_register_file(fam_self.Word, fam_self.Idx)
+
+
 class SMTFamily(_MipsFamily_mixin, family.SMTFamily):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -4,7 +4,7 @@ from peak import Peak, name_outputs, family_closure, Const
 
 
 from .isa import ISA_fc
-from .util import Initial, clo
+from .util import Initial, clo, run_loop
 from . import family
 from .micro import Micro_fc
 
@@ -212,6 +212,10 @@ def MIPS32_fc(family):
             self.register_file.store(rd, cl)
             return acc_out
 
+        def run(self, program, pc, acc, max_steps=None):
+            # See util.run_loop, returns RunResult(pc, retired, time, acc)
+            return run_loop(self, program, pc, acc, max_steps)
+
 
     @family.assemble(locals(), globals())
     class ALU(Peak):
@@ -0,0 +1,125 @@
+'''
+Text assembler for the MIPS example.
+
+    acc = isa.BitVector[64](0)
+    for inst in assemble(source):
+        acc = cpu(inst, acc)
+
+The MIPS example has no instruction encoding and no control flow (no pc,
+branches or memory), so sources are assembled to a list of isa.Inst rather
+than to an encoded buffer, labels are accepted but nothing can refer to
+them, and there is no on disk cache.  Instructions are built straight from
+the parsed fields, without the type checks of the ADT constructors, and
+identical lines share one (immutable) instruction.
+
+Operands follow the fields of the layout of an instruction:
+
+    addu subu and or xor nor slt sltu ... (R3)    rd, rs, rt
+    addiu andi ori xori slti sltiu (I2)           rd, rs, imm
+    sll srl sra rotr (Rs)                         rd, rs, sa
+    ext ins (Rlm)                                 rd, rs, mb, lb
+    clo clz seb seh wsbh mult div madd ... (R2)   rd, rs
+    mfhi mflo mthi mtlo (R1)                      rd
+    lui                                           rd, imm
+
+Registers are $0-$31 or their ABI names ($zero, $at, $v0, ...).
+'''
+import typing as tp
+
+from .. import textasm
+from ..asmgen import product, variant
+from .isa import ISA_fc
+
+isa = ISA_fc.Py
+
+
+_ABI = (
+    ['zero', 'at', 'v0', 'v1']
+    + [f'a{i}' for i in range(4)]
+    + [f't{i}' for i in range(8)]
+    + [f's{i}' for i in range(8)]
+    + ['t8', 't9', 'k0', 'k1', 'gp', 'sp', 'fp', 'ra']
+)
+_REGS = {f'${name}': i for i, name in enumerate(_ABI)}
+_REGS.update({f'${i}': i for i in range(32)})
+_REGS['$s8'] = 30
+
+# fields holding a register index, the others are immediates
+_REG_FIELDS = ('rd', 'rs', 'rt')
+
+# mnemonic -> R1Inst (dir, reg), T moves to hi / lo
+_R1_MNEMONIC = {
+    'mthi': ('T', 'HI'),
+    'mtlo': ('T', 'LO'),
+    'mfhi': ('F', 'HI'),
+    'mflo': ('F', 'LO'),
+}
+
+
+def _reg(text: str) -> int:
+    try:
+        return _REGS[text.lower()]
+    except KeyError:
+        raise ValueError(f'unknown register {text!r}') from None
+
+
+class TextAssembler:
+    '''
+    Assembles text to a list of isa.Inst.
+    '''
+    def __init__(self, isa):
+        self.isa = isa
+        self._idx = tuple(isa.Idx(i) for i in range(1 << isa.Idx.size))
+        # mnemonic -> (layout, op or None)
+        self._insts = {}
+        for T in (isa.R2, isa.R3, isa.Rs, isa.Rlm, isa.I2):
+            for name in T.op._field_table_:
+                self._insts[name.lower()] = (T, getattr(T.op, name))
+        for name, (d, r) in _R1_MNEMONIC.items():
+            self._insts[name] = (isa.R1, isa.R1Inst(getattr(isa.TF, d), getattr(isa.LOHI, r)))
+        self._insts['lui'] = (isa.LUI, None)
+
+    @property
+    def mnemonics(self) -> tp.List[str]:
+        return sorted(self._insts)
+
+    def _inst(self, mnemonic: str, ops: tp.List[str]):
+        try:
+            T, op = self._insts[mnemonic]
+        except KeyError:
+            raise ValueError(f'unknown instruction {mnemonic!r}') from None
+        texts = iter(textasm.operands(ops, len(T.field_dict) - (op is not None)))
+        values = []
+        for name, field_T in T.field_dict.items():
+            if name == 'op':
+                values.append(op)
+            elif name in _REG_FIELDS:
+                values.append(self._idx[_reg(next(texts))])
+            else:
+                value = textasm.parse_int(next(texts))
+                values.append(field_T(textasm.check_int(value, field_T.size, value < 0)))
+        return variant(self.isa.Inst, product(T, *values))
+
+    def assemble(self, source: str) -> tp.List:
+        '''
+        Returns the instructions of source.
+        '''
+        insts = []
+        seen = {}
+        for line_no, _, mnemonic, ops in textasm.parse(source):
+            if mnemonic is None:
+                continue
+            key = mnemonic, tuple(ops)
+            try:
+                inst = seen[key]
+            except KeyError:
+                try:
+                    inst = seen[key] = self._inst(mnemonic, ops)
+                except ValueError as e:
+                    raise ValueError(f'line {line_no}: {e}') from None
+            insts.append(inst)
+        return insts
+
+
+assembler = TextAssembler(isa)
+assemble = assembler.assemble
@@ -1,21 +1,51 @@
-from hwtypes import modifiers
+from collections import namedtuple
+import time
+
+from hwtypes import BitVector, modifiers
 
 Initial = modifiers.make_modifier('Initial', cache=True)
 
+# _CLO8[b] is the number of leading ones of the byte b
+_CLO8 = tuple(8 - (~b & 0xff).bit_length() for b in range(256))
+
+def _clo_int(n, size):
+    if size < 8:
+        # pad with zeros on the right to a byte
+        return _CLO8[(n << (8 - size)) & 0xff]
+    cnt = 0
+    for shift in range(size - 8, -1, -8):
+        byte_cnt = _CLO8[(n >> shift) & 0xff]
+        cnt += byte_cnt
+        if byte_cnt != 8:
+            break
+    return cnt
+
 def _clo(x):
+    # Returns (all, low) where all is x[:] == -1 as a 1 bit vector and low
+    # are the low bits of the count (None for a single bit), i.e. the count
+    # is low.concat(all).  Halves are combined with muxes and concats only:
+    # if the top half is all ones the count is half + count(bot), which as
+    # count(bot) <= half is count(bot) with bit log2(half) set unless bot is
+    # also all ones.
     if x.size == 1:
-        return x
+        return x, None
+    half_size = x.size >> 1
+    assert (half_size << 1) == x.size
+    all_t, low_t = _clo(x[half_size:])
+    all_b, low_b = _clo(x[:half_size])
+    if low_t is None:
+        low = all_t & ~all_b
     else:
-        half_size = x.size >> 1
-        assert (half_size << 1) == x.size
-        top = _clo(x[half_size:]).zext(1)
-        bot = _clo(x[:half_size]).zext(1)
-        return (top == half_size).ite(top + bot, top)
+        low = all_t[0].ite(low_b.concat(~all_b), low_t.zext(1))
+    return all_t & all_b, low
 
 def clo(x):
     if (x.size & (x.size - 1)) != 0:
         raise TypeError(f'clo only works on bitvectors with power of 2 width')
-    lo = _clo(x)
+    if isinstance(x, BitVector):
+        return type(x)(_clo_int(x.as_uint(), x.size))
+    all_, low = _clo(x)
+    lo = all_ if low is None else low.concat(all_)
     # k.bit_length() returns number of bits necesary to represent k
     assert lo.size == x.size.bit_length()
     return lo.zext(x.size - lo.size)
@@ -24,3 +54,33 @@ def clz(x):
     if (x.size & (x.size - 1)) != 0:
         raise TypeError(f'clz only works on bitvectors with power of 2 width')
     return clo(~x)
+
+
+RunResult = namedtuple('RunResult', ['pc', 'retired', 'time', 'acc'])
+
+
+def run_loop(cpu, program, pc, acc, max_steps=None) -> RunResult:
+    '''
+    Steps cpu over program starting at pc, threading the accumulator.
+    program[pc] is indexed with the pc as an int (e.g. a dict) and raises
+    IndexError or KeyError outside of the program.  There are no branches
+    so pc always advances by 4.
+
+    Halts when pc leaves the program or after max_steps instructions.
+    time is the wall time in seconds.
+    '''
+    if max_steps is not None and max_steps < 0:
+        raise ValueError('max_steps must be non-negative')
+    fetch = program.__getitem__
+    limit = -1 if max_steps is None else max_steps
+    retired = 0
+    start = time.perf_counter()
+    while retired != limit:
+        try:
+            inst = fetch(pc)
+        except (IndexError, KeyError):
+            break
+        acc = cpu(inst, acc)
+        retired += 1
+        pc += 4
+    return RunResult(pc, retired, time.perf_counter() - start, acc)
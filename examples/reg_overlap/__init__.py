@@ -1,3 +1,3 @@
-from . import family
-from . import isa
-from . import sim
+from ..lazy import lazy_submodules
+
+__getattr__, __dir__ = lazy_submodules(__name__, ('family', 'isa', 'sim'))
@@ -2,6 +2,8 @@ from ast_tools.passes import remove_asserts
 
 from peak import family
 
+from ..regfile import array_register_file
+
 
 class _Family_mixin:
     @property
@@ -35,6 +37,13 @@ class PyFamily(_Family_mixin, family.PyFamily):
 
         return RegisterFile
 
+class ArrayPyFamily(PyFamily):
+    # List backed register file, see examples.regfile.  Unlike the dict based
+    # register file, registers which were never written read as 0.  There is
+    # no zero register.
+    def get_register_file(fam_self):
+        return array_register_file(fam_self.DWord, fam_self.Idx, zero_reg=False)
+
 class SMTFamily(_Family_mixin, family.SMTFamily):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
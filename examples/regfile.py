@@ -0,0 +1,45 @@
+'''
+List backed register file shared by the ArrayPyFamily of the examples.
+
+The PyFamily register files are dicts keyed by Idx which type check every
+access.  array_register_file instead keeps the registers as ints in a flat
+list indexed by register number, which avoids hashing bitvectors.  It
+differs from the dict register files in that:
+
+    - registers which were never written read as 0 (the dict register files
+      raise KeyError, unless they initialize every register)
+    - indices and values are not type checked
+'''
+import typing as tp
+
+
+def array_register_file(Word, Idx, n_ports: int = 2, zero_reg: bool = True) -> tp.Type:
+    '''
+    Returns a register file class with load1 .. load{n_ports} and store,
+    holding 1 << Idx.size registers of type Word.  If zero_reg, stores to
+    register 0 are dropped so it always reads as 0.
+    '''
+    n_regs = 1 << Idx.size
+
+    class RegisterFile:
+        __slots__ = ('rf',)
+
+        def __init__(self):
+            self.rf = [0] * n_regs
+
+        def _load(self, idx):
+            return Word(self.rf[idx.as_uint()])
+
+        if zero_reg:
+            def store(self, idx, value):
+                idx = idx.as_uint()
+                if idx != 0:
+                    self.rf[idx] = value.as_uint()
+        else:
+            def store(self, idx, value):
+                self.rf[idx.as_uint()] = value.as_uint()
+
+    for i in range(1, n_ports+1):
+        setattr(RegisterFile, f'load{i}', RegisterFile._load)
+
+    return RegisterFile
@@ -0,0 +1,564 @@
+import functools
+import struct
+import typing as tp
+
+from .isa import ISA_fc
+
+isa = ISA_fc.Py
+
+# Major opcodes
+LOAD = 0x03
+OP_IMM = 0x13
+AUIPC = 0x17
+STORE = 0x23
+OP = 0x33
+LUI = 0x37
+BRANCH = 0x63
+JALR = 0x67
+JAL = 0x6f
+MADD = 0x43
+MSUB = 0x47
+NMSUB = 0x4b
+NMADD = 0x4f
+OP_FP = 0x53
+
+
+# (funct3, funct7) for register-register ops
+_OP_FUNCT = {
+    'ADD': (0, 0x00),
+    'SUB': (0, 0x20),
+    'SLL': (1, 0x00),
+    'SLT': (2, 0x00),
+    'SLTU': (3, 0x00),
+    'XOR': (4, 0x00),
+    'SRL': (5, 0x00),
+    'SRA': (5, 0x20),
+    'OR': (6, 0x00),
+    'AND': (7, 0x00),
+    'MUL': (0, 0x01),
+    'MULH': (1, 0x01),
+    'MULHSU': (2, 0x01),
+    'MULHU': (3, 0x01),
+    'DIV': (4, 0x01),
+    'DIVU': (5, 0x01),
+    'REM': (6, 0x01),
+    'REMU': (7, 0x01),
+}
+
+# funct3 for register-immediate arith (there is no SUBI)
+_OP_IMM_FUNCT3 = {
+    'ADD': 0,
+    'SLT': 2,
+    'SLTU': 3,
+    'XOR': 4,
+    'OR': 6,
+    'AND': 7,
+}
+
+# Bit counting uses the Zbb encodings (clz / ctz / cpop),
+# funct3 = 1, funct7 = 0x30 with the operation in the rs2 field
+_EXT_FUNCT = (1, 0x30)
+_EXT_RS2 = {
+    'CNTLZ': 0,
+    'CNTTZ': 1,
+    'POPCNT': 2,
+}
+
+_BRANCH_FUNCT3 = {
+    'BEQ': 0,
+    'BNE': 1,
+    'BLT': 4,
+    'BGE': 5,
+    'BLTU': 6,
+    'BGEU': 7,
+}
+
+# LD / LWU (funct3 3 / 6) and SD (funct3 3) are RV64 only and decode as
+# illegal instructions
+_LOAD_FUNCT3 = {
+    'LB': 0,
+    'LH': 1,
+    'LW': 2,
+    'LBU': 4,
+    'LHU': 5,
+}
+
+_STORE_FUNCT3 = {
+    'SB': 0,
+    'SH': 1,
+    'SW': 2,
+}
+
+_RM_FUNCT3 = {
+    'RNE': 0,
+    'RTZ': 1,
+    'RDN': 2,
+    'RUP': 3,
+    'RMM': 4,
+    'DYN': 7,
+}
+
+# funct7 of single precision OP_FP instructions
+_FP_COMPUTE_FUNCT7 = {
+    'FADD': 0x00,
+    'FSUB': 0x04,
+    'FMUL': 0x08,
+    'FDIV': 0x0c,
+}
+_FP_MINMAX_FUNCT7 = 0x14
+_FP_SQRT_FUNCT7 = 0x2c
+_FP_COMPARE_FUNCT7 = 0x50
+_FP_CLASS_FUNCT7 = 0x70
+
+_FP_MINMAX_FUNCT3 = {
+    'MIN': 0,
+    'MAX': 1,
+}
+
+_FP_COMPARE_FUNCT3 = {
+    'LE': 0,
+    'LT': 1,
+    'EQ': 2,
+}
+
+# FNMA is -(rs1*rs2)+rs3 (fnmsub) and FNMS is -(rs1*rs2)-rs3 (fnmadd)
+_FP_FUSED_OPCODE = {
+    'FMA': MADD,
+    'FMS': MSUB,
+    'FNMA': NMSUB,
+    'FNMS': NMADD,
+}
+
+
+# Field extraction
+def _rd(w): return (w >> 7) & 0x1f
+def _funct3(w): return (w >> 12) & 0x7
+def _rs1(w): return (w >> 15) & 0x1f
+def _rs2(w): return (w >> 20) & 0x1f
+def _funct7(w): return w >> 25
+def _rs3(w): return w >> 27
+
+
+# Immediates, as stored in the isa (i.e. without the implicit low zeros)
+def _i_imm(w):
+    return w >> 20
+
+def _s_imm(w):
+    return ((w >> 25) << 5) | ((w >> 7) & 0x1f)
+
+def _b_imm(w):
+    # imm[12:1]
+    return (((w >> 31) & 0x1) << 11) \
+        | (((w >> 7) & 0x1) << 10) \
+        | (((w >> 25) & 0x3f) << 4) \
+        | ((w >> 8) & 0xf)
+
+def _u_imm(w):
+    return w >> 12
+
+def _j_imm(w):
+    # imm[20:1]
+    return (((w >> 31) & 0x1) << 19) \
+        | (((w >> 12) & 0xff) << 11) \
+        | (((w >> 20) & 0x1) << 10) \
+        | ((w >> 21) & 0x3ff)
+
+
+def _s_bits(imm):
+    return ((imm >> 5) << 25) | ((imm & 0x1f) << 7)
+
+def _b_bits(imm):
+    return (((imm >> 11) & 0x1) << 31) \
+        | (((imm >> 4) & 0x3f) << 25) \
+        | ((imm & 0xf) << 8) \
+        | (((imm >> 10) & 0x1) << 7)
+
+def _j_bits(imm):
+    return (((imm >> 19) & 0x1) << 31) \
+        | ((imm & 0x3ff) << 21) \
+        | (((imm >> 10) & 0x1) << 20) \
+        | (((imm >> 11) & 0xff) << 12)
+
+
+def _r_bits(opcode, funct3, funct7, rd, rs1, rs2):
+    return (funct7 << 25) | (rs2 << 20) | (rs1 << 15) | (funct3 << 12) | (rd << 7) | opcode
+
+
+def _matching(union):
+    # Returns (field name, value) of the matching field of a TaggedUnion
+    for field in type(union).field_dict:
+        m = getattr(union, field)
+        if m.match:
+            return field, m.value
+    # Should have returned
+    raise AssertionError('Unreachable code')
+
+
+def _illegal(w):
+    raise ValueError(f'illegal instruction {w:#010x}')
+
+
+class InstCodec:
+    '''
+    Translates between isa.Inst and 32 bit RISC-V encodings.
+
+    Decoding is table driven: the opcode selects a decoder which looks up
+    funct3 / funct7 in a precomputed table.  Support for the M, F and bit
+    counting extensions is enabled when isa defines them.  Decoded
+    instructions are cached by encoding and shared, they must not be mutated.
+    '''
+    def __init__(self, isa, cache_size=1 << 16):
+        self.isa = isa
+        self._idx = tuple(isa.Idx(i) for i in range(1 << isa.Idx.size))
+        # opcode -> decoder(word) -> isa.Inst
+        self._decoders = {}
+        # top level instruction type -> encoder(value) -> int
+        self._encoders = {}
+
+        self._init_base()
+        if hasattr(isa, 'Ext') and isa.Ext in isa.Inst.field_dict:
+            self._init_ext()
+        if hasattr(isa, 'OP_FP') and isa.OP_FP in isa.Inst.field_dict:
+            self._init_fp()
+
+        self.decode = functools.lru_cache(maxsize=cache_size)(self._decode)
+
+    def _init_base(self):
+        isa = self.isa
+        idx = self._idx
+        Inst = isa.Inst
+
+        # OP
+        op_table = {}
+        for tag_kw, tag_T in isa.AluInst.field_dict.items():
+            for name in tag_T._field_table_:
+                op_table[_OP_FUNCT[name]] = isa.AluInst(**{tag_kw: getattr(tag_T, name)})
+        op_funct = {v: k for k, v in op_table.items()}
+
+        def enc_op(value):
+            data = value.data
+            f3, f7 = op_funct[value.tag]
+            return _r_bits(OP, f3, f7, data.rd.as_uint(), data.rs1.as_uint(), data.rs2.as_uint())
+
+        def dec_op(w):
+            tag = op_table.get((_funct3(w), _funct7(w)))
+            if tag is None:
+                _illegal(w)
+            return Inst(isa.OP(isa.R(rd=idx[_rd(w)], rs1=idx[_rs1(w)], rs2=idx[_rs2(w)]), tag))
+
+        self._encoders[isa.OP] = enc_op
+        self._decoders[OP] = dec_op
+
+        # OP_IMM
+        arith_table = {
+            f3: getattr(isa.ArithInst, name) for name, f3 in _OP_IMM_FUNCT3.items()
+        }
+        shift_table = {
+            _OP_FUNCT[name]: getattr(isa.ShiftInst, name) for name in isa.ShiftInst._field_table_
+        }
+        arith_funct3 = {v: k for k, v in arith_table.items()}
+        shift_funct = {v: k for k, v in shift_table.items()}
+        # funct3 -> (funct7 -> decoder), filled in by extensions
+        self._op_imm_funct7 = op_imm_funct7 = {}
+
+        def enc_op_imm(value):
+            kind, value = _matching(value)
+            data = value.data
+            if kind == 'arith':
+                try:
+                    f3 = arith_funct3[value.tag]
+                except KeyError:
+                    raise ValueError(f'{value.tag} has no immediate form') from None
+                return (data.imm.as_uint() << 20) | (data.rs1.as_uint() << 15) \
+                    | (f3 << 12) | (data.rd.as_uint() << 7) | OP_IMM
+            else:
+                f3, f7 = shift_funct[value.tag]
+                return _r_bits(OP_IMM, f3, f7, data.rd.as_uint(), data.rs1.as_uint(), data.imm.as_uint())
+
+        def dec_op_imm(w):
+            f3 = _funct3(w)
+            rd = idx[_rd(w)]
+            rs1 = idx[_rs1(w)]
+            tag = shift_table.get((f3, _funct7(w)))
+            if tag is not None:
+                data = isa.Is(rd=rd, rs1=rs1, imm=isa.Is.imm(_rs2(w)))
+                return Inst(isa.OP_IMM(shift=isa.OP_IMM_S(data, tag)))
+
+            tag = arith_table.get(f3)
+            if tag is not None:
+                data = isa.I(rd=rd, rs1=rs1, imm=isa.I.imm(_i_imm(w)))
+                return Inst(isa.OP_IMM(arith=isa.OP_IMM_A(data, tag)))
+
+            dec = op_imm_funct7.get((f3, _funct7(w)))
+            if dec is None:
+                _illegal(w)
+            return dec(w)
+
+        self._encoders[isa.OP_IMM] = enc_op_imm
+        self._decoders[OP_IMM] = dec_op_imm
+
+        # LUI / AUIPC
+        def gen_u(T, opcode):
+            def enc_u(value):
+                data = value.data
+                return (data.imm.as_uint() << 12) | (data.rd.as_uint() << 7) | opcode
+
+            def dec_u(w):
+                return Inst(T(isa.U(rd=idx[_rd(w)], imm=isa.U.imm(_u_imm(w)))))
+
+            self._encoders[T] = enc_u
+            self._decoders[opcode] = dec_u
+
+        gen_u(isa.LUI, LUI)
+        gen_u(isa.AUIPC, AUIPC)
+
+        # JAL
+        def enc_jal(value):
+            data = value.data
+            return _j_bits(data.imm.as_uint()) | (data.rd.as_uint() << 7) | JAL
+
+        def dec_jal(w):
+            return Inst(isa.JAL(isa.J(rd=idx[_rd(w)], imm=isa.J.imm(_j_imm(w)))))
+
+        self._encoders[isa.JAL] = enc_jal
+        self._decoders[JAL] = dec_jal
+
+        # JALR
+        def enc_jalr(value):
+            data = value.data
+            return (data.imm.as_uint() << 20) | (data.rs1.as_uint() << 15) \
+                | (data.rd.as_uint() << 7) | JALR
+
+        def dec_jalr(w):
+            if _funct3(w) != 0:
+                _illegal(w)
+            data = isa.I(rd=idx[_rd(w)], rs1=idx[_rs1(w)], imm=isa.I.imm(_i_imm(w)))
+            return Inst(isa.JALR(data))
+
+        self._encoders[isa.JALR] = enc_jalr
+        self._decoders[JALR] = dec_jalr
+
+        # Branch
+        branch_table = {
+            f3: getattr(isa.BranchInst, name) for name, f3 in _BRANCH_FUNCT3.items()
+        }
+        branch_funct3 = {v: k for k, v in branch_table.items()}
+
+        def enc_branch(value):
+            data = value.data
+            return _b_bits(data.imm.as_uint()) | (data.rs2.as_uint() << 20) \
+                | (data.rs1.as_uint() << 15) | (branch_funct3[value.tag] << 12) | BRANCH
+
+        def dec_branch(w):
+            tag = branch_table.get(_funct3(w))
+            if tag is None:
+                _illegal(w)
+            data = isa.B(rs1=idx[_rs1(w)], rs2=idx[_rs2(w)], imm=isa.B.imm(_b_imm(w)))
+            return Inst(isa.Branch(data, tag))
+
+        self._encoders[isa.Branch] = enc_branch
+        self._decoders[BRANCH] = dec_branch
+
+        # Load
+        load_table = {
+            f3: getattr(isa.LoadInst, name) for name, f3 in _LOAD_FUNCT3.items()
+        }
+        load_funct3 = {v: k for k, v in load_table.items()}
+
+        def enc_load(value):
+            data = value.data
+            try:
+                f3 = load_funct3[value.tag]
+            except KeyError:
+                raise ValueError(f'{value.tag} is not an RV32 instruction') from None
+            return (data.imm.as_uint() << 20) | (data.rs1.as_uint() << 15) \
+                | (f3 << 12) | (data.rd.as_uint() << 7) | LOAD
+
+        def dec_load(w):
+            tag = load_table.get(_funct3(w))
+            if tag is None:
+                _illegal(w)
+            data = isa.I(rd=idx[_rd(w)], rs1=idx[_rs1(w)], imm=isa.I.imm(_i_imm(w)))
+            return Inst(isa.Load(data, tag))
+
+        self._encoders[isa.Load] = enc_load
+        self._decoders[LOAD] = dec_load
+
+        # Store
+        store_table = {
+            f3: getattr(isa.StoreInst, name) for name, f3 in _STORE_FUNCT3.items()
+        }
+        store_funct3 = {v: k for k, v in store_table.items()}
+
+        def enc_store(value):
+            data = value.data
+            try:
+                f3 = store_funct3[value.tag]
+            except KeyError:
+                raise ValueError(f'{value.tag} is not an RV32 instruction') from None
+            return _s_bits(data.imm.as_uint()) | (data.rs2.as_uint() << 20) \
+                | (data.rs1.as_uint() << 15) | (f3 << 12) | STORE
+
+        def dec_store(w):
+            tag = store_table.get(_funct3(w))
+            if tag is None:
+                _illegal(w)
+            data = isa.S(rs1=idx[_rs1(w)], rs2=idx[_rs2(w)], imm=isa.S.imm(_s_imm(w)))
+            return Inst(isa.Store(data, tag))
+
+        self._encoders[isa.Store] = enc_store
+        self._decoders[STORE] = dec_store
+
+    def _init_ext(self):
+        isa = self.isa
+        idx = self._idx
+        ext_table = {
+            rs2: getattr(isa.BitInst, name) for name, rs2 in _EXT_RS2.items()
+        }
+        ext_rs2 = {v: k for k, v in ext_table.items()}
+        f3, f7 = _EXT_FUNCT
+
+        def enc_ext(value):
+            data = value.data
+            return _r_bits(OP_IMM, f3, f7, data.rd.as_uint(), data.rs.as_uint(), ext_rs2[value.tag])
+
+        def dec_ext(w):
+            tag = ext_table.get(_rs2(w))
+            if tag is None:
+                _illegal(w)
+            return isa.Inst(isa.Ext(isa.E(rd=idx[_rd(w)], rs=idx[_rs1(w)]), tag))
+
+        self._encoders[isa.Ext] = enc_ext
+        self._op_imm_funct7[_EXT_FUNCT] = dec_ext
+
+    def _init_fp(self):
+        isa = self.isa
+        idx = self._idx
+        Inst = isa.Inst
+
+        rm_table = {f3: getattr(isa.RM, name) for name, f3 in _RM_FUNCT3.items()}
+        rm_funct3 = {v: k for k, v in rm_table.items()}
+
+        compute_table = {
+            f7: getattr(isa.FPComputeInst, name) for name, f7 in _FP_COMPUTE_FUNCT7.items()
+        }
+        compute_funct7 = {v: k for k, v in compute_table.items()}
+        minmax_table = {
+            f3: getattr(isa.FPMinMaxInst, name) for name, f3 in _FP_MINMAX_FUNCT3.items()
+        }
+        minmax_funct3 = {v: k for k, v in minmax_table.items()}
+        compare_table = {
+            f3: getattr(isa.FPCompareInst, name) for name, f3 in _FP_COMPARE_FUNCT3.items()
+        }
+        compare_funct3 = {v: k for k, v in compare_table.items()}
+
+        def enc_op_fp(value):
+            kind, value = _matching(value)
+            data = value.data
+            rd = data.rd.as_uint()
+            rs1 = data.rs1.as_uint()
+            if kind == 'compute':
+                return _r_bits(OP_FP, rm_funct3[value.rm], compute_funct7[value.tag],
+                        rd, rs1, data.rs2.as_uint())
+            elif kind == 'minmax':
+                return _r_bits(OP_FP, minmax_funct3[value.tag], _FP_MINMAX_FUNCT7,
+                        rd, rs1, data.rs2.as_uint())
+            elif kind == 'compare':
+                return _r_bits(OP_FP, compare_funct3[value.tag], _FP_COMPARE_FUNCT7,
+                        rd, rs1, data.rs2.as_uint())
+            elif kind == 'sqrt':
+                return _r_bits(OP_FP, rm_funct3[value.rm], _FP_SQRT_FUNCT7, rd, rs1, 0)
+            else:
+                assert kind == 'class_'
+                return _r_bits(OP_FP, 1, _FP_CLASS_FUNCT7, rd, rs1, 0)
+
+        def dec_rm(w):
+            rm = rm_table.get(_funct3(w))
+            if rm is None:
+                _illegal(w)
+            return rm
+
+        def dec_op_fp(w):
+            f3 = _funct3(w)
+            f7 = _funct7(w)
+            rd = idx[_rd(w)]
+            rs1 = idx[_rs1(w)]
+            if f7 in compute_table:
+                data = isa.R(rd=rd, rs1=rs1, rs2=idx[_rs2(w)])
+                value = isa.FComputation(data=data, rm=dec_rm(w), tag=compute_table[f7])
+                return Inst(isa.OP_FP(compute=value))
+            elif f7 == _FP_MINMAX_FUNCT7 and f3 in minmax_table:
+                data = isa.R(rd=rd, rs1=rs1, rs2=idx[_rs2(w)])
+                return Inst(isa.OP_FP(minmax=isa.FMinMax(data=data, tag=minmax_table[f3])))
+            elif f7 == _FP_COMPARE_FUNCT7 and f3 in compare_table:
+                data = isa.R(rd=rd, rs1=rs1, rs2=idx[_rs2(w)])
+                return Inst(isa.OP_FP(compare=isa.FCMP(data=data, tag=compare_table[f3])))
+            elif f7 == _FP_SQRT_FUNCT7 and _rs2(w) == 0:
+                data = isa.R2(rd=rd, rs1=rs1)
+                return Inst(isa.OP_FP(sqrt=isa.FSqrt(data=data, rm=dec_rm(w))))
+            elif f7 == _FP_CLASS_FUNCT7 and f3 == 1 and _rs2(w) == 0:
+                return Inst(isa.OP_FP(class_=isa.FCLASS(data=isa.R2(rd=rd, rs1=rs1))))
+            else:
+                _illegal(w)
+
+        self._encoders[isa.OP_FP] = enc_op_fp
+        self._decoders[OP_FP] = dec_op_fp
+
+        fused_opcode = {
+            getattr(isa.FPFusedInst, name): opcode for name, opcode in _FP_FUSED_OPCODE.items()
+        }
+
+        def enc_fused(value):
+            data = value.data
+            return (data.rs3.as_uint() << 27) | _r_bits(fused_opcode[value.tag],
+                    rm_funct3[value.rm], 0, data.rd.as_uint(), data.rs1.as_uint(), data.rs2.as_uint())
+
+        def gen_dec_fused(tag):
+            def dec_fused(w):
+                # only single precision (fmt == 0)
+                if (_funct7(w) & 0x3) != 0:
+                    _illegal(w)
+                data = isa.R4(rd=idx[_rd(w)], rs1=idx[_rs1(w)], rs2=idx[_rs2(w)], rs3=idx[_rs3(w)])
+                return Inst(isa.OP_FUSED(data=data, rm=dec_rm(w), tag=tag))
+            return dec_fused
+
+        self._encoders[isa.OP_FUSED] = enc_fused
+        for tag, opcode in fused_opcode.items():
+            self._decoders[opcode] = gen_dec_fused(tag)
+
+    def encode(self, inst) -> int:
+        for T, enc in self._encoders.items():
+            m = inst[T]
+            if m.match:
+                return enc(m.value)
+        raise ValueError(f'{inst} can not be encoded')
+
+    def _decode(self, word: int):
+        if not 0 <= word < (1 << 32):
+            raise ValueError(f'{word} is not a 32 bit word')
+        dec = self._decoders.get(word & 0x7f)
+        if dec is None:
+            _illegal(word)
+        return dec(word)
+
+    def encode_all(self, insts: tp.Iterable) -> bytes:
+        words = [self.encode(inst) for inst in insts]
+        return struct.pack(f'<{len(words)}I', *words)
+
+    def decode_all(self, buf) -> tp.List:
+        '''
+        Decodes a little endian buffer (bytes / bytearray / memoryview / mmap)
+        of instructions without copying it.
+        '''
+        buf = memoryview(buf)
+        if buf.nbytes % 4:
+            raise ValueError('buffer length must be a multiple of 4')
+        decode = self.decode
+        return [decode(w) for (w,) in struct.iter_unpack('<I', buf)]
+
+
+codec = InstCodec(isa)
+encode = codec.encode
+decode = codec.decode
+encode_all = codec.encode_all
+decode_all = codec.decode_all
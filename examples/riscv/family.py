@@ -3,6 +3,11 @@ from peak import family
 
 from ast_tools.passes import remove_asserts
 
+from ..regfile import array_register_file
+
+
+PAGE_BITS = 12
+PAGE_SIZE = 1 << PAGE_BITS
 
 # A bit of hack putting the def of word and idx here
 # and not isa but it makes life easier
@@ -39,6 +44,63 @@ class PyFamily(_RiscFamily_mixin, family.PyFamily):
                     self.rf[idx] = value
         return RegisterFile
 
+    def get_memory(fam_self):
+        # Sparse byte addressed memory, pages are allocated on first store.
+        # Reads of pages which were never written return 0.
+        Word = fam_self.Word
+        class Memory:
+            def __init__(self):
+                self.pages = {}
+
+            def read(self, addr: int, n: int) -> bytes:
+                offset = addr & (PAGE_SIZE - 1)
+                if offset + n <= PAGE_SIZE:
+                    page = self.pages.get(addr >> PAGE_BITS)
+                    if page is None:
+                        return bytes(n)
+                    return bytes(page[offset:offset+n])
+                # crosses a page boundary
+                head = PAGE_SIZE - offset
+                return self.read(addr, head) + self.read((addr + head) & 0xffffffff, n - head)
+
+            def write(self, addr: int, data: bytes):
+                offset = addr & (PAGE_SIZE - 1)
+                n = len(data)
+                if offset + n <= PAGE_SIZE:
+                    page_idx = addr >> PAGE_BITS
+                    page = self.pages.get(page_idx)
+                    if page is None:
+                        page = self.pages[page_idx] = bytearray(PAGE_SIZE)
+                    page[offset:offset+n] = data
+                else:
+                    head = PAGE_SIZE - offset
+                    self.write(addr, data[:head])
+                    self.write((addr + head) & 0xffffffff, data[head:])
+
+            def load(self, addr, size):
+                if not isinstance(addr, Word):
+                    raise TypeError(addr)
+                data = self.read(addr.as_uint(), 1 << size.as_uint())
+                return Word(int.from_bytes(data, 'little'))
+
+            def store(self, addr, value, size, en):
+                if not isinstance(addr, Word):
+                    raise TypeError(addr)
+                elif not isinstance(value, Word):
+                    raise TypeError(value)
+                elif en:
+                    n = 1 << size.as_uint()
+                    data = value.as_uint().to_bytes(4, 'little')[:n]
+                    self.write(addr.as_uint(), data)
+        return Memory
+
+
+class ArrayPyFamily(PyFamily):
+    # List backed register file, see examples.regfile.  Unlike the dict based
+    # register file, registers which were never written read as 0.
+    def get_register_file(fam_self):
+        return array_register_file(fam_self.Word, fam_self.Idx)
+
 
 class SMTFamily(_RiscFamily_mixin, family.SMTFamily):
     def __init__(self, *args, **kwargs):
@@ -79,3 +141,37 @@ class SMTFamily(_RiscFamily_mixin, family.SMTFamily):
 
         return RegisterFile
 
+    def get_memory(fam_self):
+        # Memory is modeled by a single load port and a single store port.
+        # Loads return ld_data (free unless set) and record the address,
+        # stores record their operands guarded by the enable.
+        class Memory:
+            def __init__(self):
+                self.ld_data = fam_self.Word()
+                self.ld_addr = fam_self.Word(0)
+                self.st_addr = fam_self.Word(0)
+                self.st_data = fam_self.Word(0)
+                self.st_size = fam_self.BitVector[2](0)
+                self.st_en = fam_self.Bit(0)
+
+            def load(self, addr, size):
+                if not isinstance(addr, fam_self.Word):
+                    raise TypeError(addr)
+                self.ld_addr = addr
+                return self.ld_data
+
+            def store(self, addr, value, size, en):
+                if not isinstance(addr, fam_self.Word):
+                    raise TypeError(addr)
+                elif not isinstance(value, fam_self.Word):
+                    raise TypeError(value)
+                self.st_addr = en.ite(addr, self.st_addr)
+                self.st_data = en.ite(value, self.st_data)
+                self.st_size = en.ite(size, self.st_size)
+                self.st_en = en | self.st_en
+
+            def _set_ld_data_(self, val):
+                self.ld_data = val
+
+        return Memory
+
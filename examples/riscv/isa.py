@@ -150,7 +150,7 @@ def ISA_fc(family):
 
     class Store(Product):
         data = S
-        tag = LoadInst
+        tag = StoreInst
 
 
     # This sum type defines the opcode field
@@ -169,5 +169,10 @@ def ISA_fc(family):
         is_jump = Bit
         cmp_zero = Bit
         invert = Bit
+        is_load = Bit
+        is_store = Bit
+        # log2 of the access size in bytes
+        mem_size = BitVector[2]
+        mem_signed = Bit
 
     return SimpleNamespace(**locals())
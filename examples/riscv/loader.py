@@ -0,0 +1,173 @@
+import mmap
+import struct
+import sys
+import typing as tp
+
+from . import encoding
+from .native import NativeR32I
+from .util import RunResult
+
+
+_ELF_MAGIC = b'\x7fELF'
+_ELFCLASS32 = 1
+_ELFDATA2LSB = 1
+_EM_RISCV = 243
+_PT_LOAD = 1
+_PF_X = 1
+
+# e_ident, e_type, e_machine, e_version, e_entry, e_phoff, e_shoff, e_flags,
+# e_ehsize, e_phentsize, e_phnum, e_shentsize, e_shnum, e_shstrndx
+_EHDR = struct.Struct('<16sHHIIIIIHHHHHH')
+# p_type, p_offset, p_vaddr, p_paddr, p_filesz, p_memsz, p_flags, p_align
+_PHDR = struct.Struct('<IIIIIIII')
+_WORD = struct.Struct('<I')
+
+
+class Program:
+    '''
+    Instruction memory over a buffer holding a raw binary or a static RV32
+    ELF.  Words are read from the buffer in place and only decoded when
+    fetched (decoding is memoized by the codec).
+
+    program[pc] returns the decoded instruction at pc and raises IndexError
+    outside of the executable segments.  codec decides the ISA the program
+    is decoded to, pass the codec of the encoding module of the simulator
+    it runs on (e.g. examples.riscv_m.encoding.codec), run checks that they
+    agree.  load writes every loadable segment
+    (e.g. .text, .data, .bss) to a data memory.
+    '''
+    def __init__(self, buf, base: int = 0, codec=encoding.codec):
+        self._mmap = None
+        self._view = view = memoryview(buf).cast('B')
+        self.codec = codec
+        if bytes(view[:4]) == _ELF_MAGIC:
+            self.entry, self.segments, self.data = _parse_elf(view)
+        else:
+            self.entry = base
+            self.segments = [(base, view)]
+            self.data = [(base, view, len(view))]
+        # Last segment hit, straight line code stays within a segment
+        self._seg = self.segments[0]
+
+    @classmethod
+    def from_file(cls, path, base: int = 0, codec=encoding.codec) -> 'Program':
+        with open(path, 'rb') as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        program = cls(mm, base, codec)
+        program._mmap = mm
+        return program
+
+    def load(self, memory):
+        '''
+        Writes the segments to memory (see family.PyFamily.get_memory), the
+        part of a segment past its file contents is zero filled.
+        '''
+        for vaddr, contents, size in self.data:
+            memory.write(vaddr, bytes(contents) + bytes(size - len(contents)))
+
+    def close(self):
+        self._seg = None
+        self.segments = []
+        self.data = []
+        self._view.release()
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _find(self, pc: int):
+        base, mem = self._seg
+        offset = pc - base
+        if 0 <= offset <= len(mem) - 4:
+            return mem, offset
+        for seg in self.segments:
+            base, mem = seg
+            offset = pc - base
+            if 0 <= offset <= len(mem) - 4:
+                self._seg = seg
+                return mem, offset
+        raise IndexError(f'pc {pc:#x} is outside of the program')
+
+    def fetch(self, pc: int) -> int:
+        if pc & 0x3:
+            raise ValueError(f'misaligned pc {pc:#x}')
+        return _WORD.unpack_from(*self._find(pc))[0]
+
+    def __getitem__(self, pc: int):
+        return self.codec.decode(self.fetch(pc))
+
+    def __contains__(self, pc: int) -> bool:
+        try:
+            self._find(pc)
+        except IndexError:
+            return False
+        return True
+
+
+def _parse_elf(view):
+    # Returns the entry, the executable segments as (vaddr, contents) and
+    # all loadable segments as (vaddr, contents, memsz)
+    (e_ident, e_type, e_machine, e_version, e_entry, e_phoff, e_shoff, e_flags,
+            e_ehsize, e_phentsize, e_phnum, *_) = _EHDR.unpack_from(view)
+    if e_ident[4] != _ELFCLASS32 or e_ident[5] != _ELFDATA2LSB:
+        raise ValueError('Only little endian ELF32 is supported')
+    if e_machine != _EM_RISCV:
+        raise ValueError(f'Not a RISC-V ELF (e_machine={e_machine})')
+
+    segments = []
+    data = []
+    for i in range(e_phnum):
+        (p_type, p_offset, p_vaddr, p_paddr, p_filesz, p_memsz, p_flags,
+                p_align) = _PHDR.unpack_from(view, e_phoff + i*e_phentsize)
+        if p_type != _PT_LOAD:
+            continue
+        if p_filesz > p_memsz:
+            raise ValueError(f'segment {i} is larger in the file than in memory')
+        contents = view[p_offset:p_offset + p_filesz]
+        data.append((p_vaddr, contents, p_memsz))
+        if p_flags & _PF_X:
+            segments.append((p_vaddr, contents))
+
+    if not segments:
+        raise ValueError('ELF has no executable segments')
+    return e_entry, segments, data
+
+
+def _cpu_isa(cpu):
+    # The ISA of a NativeR32I or of the sim module defining the python peak
+    if isinstance(cpu, NativeR32I):
+        return cpu.isa
+    return sys.modules[type(cpu).__module__].ISA_fc.Py
+
+
+def run(cpu, program: Program,
+        pc: tp.Optional[int] = None,
+        max_steps: tp.Optional[int] = None,
+        load: bool = True,
+        ) -> RunResult:
+    '''
+    Runs cpu (a python family R32I or a NativeR32I) on program starting at
+    pc (default: the program entry), see util.run_loop for the halting
+    conditions.
+
+    If load, the segments of program are first written to the memory of cpu
+    (if it has one), pass load=False to continue an earlier run.  Raises
+    ValueError if program is not decoded to the ISA of cpu.
+    '''
+    isa = _cpu_isa(cpu)
+    if program.codec.isa is not isa:
+        raise ValueError(
+            'program is decoded to another ISA than the one of the cpu, pass the codec '
+            'of its encoding module (e.g. examples.riscv_m.encoding.codec) to Program')
+    if load and hasattr(cpu, 'memory'):
+        program.load(cpu.memory)
+    if pc is None:
+        pc = program.entry
+    if not isinstance(cpu, NativeR32I):
+        pc = isa.Word(pc)
+    return cpu.run(program, pc, max_steps)
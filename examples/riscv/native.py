@@ -0,0 +1,270 @@
+'''
+Native integer execution engine for the riscv simulators.
+
+NativeR32I runs the same instructions as R32I but keeps its state in plain
+python ints.  Instructions are still decoded by the python Decode peak of the
+simulator, the resulting _DecodeOut is lowered once to a tuple of ints and an
+ALU function and then cached.  The ALU functions mirror the hwtypes semantics
+used by the peak model (e.g. division rounds towards negative infinity).
+
+Loads and stores go to a PyFamily memory (see family.PyFamily.get_memory),
+the same sparse pages the peak model uses.
+
+Lockstep drives a NativeR32I and checks it against the peak model.
+'''
+from .family import PyFamily
+from .util import DecodeCache, run_loop
+
+
+MASK = (1 << 32) - 1
+_SIGN = 1 << 31
+
+
+def _sint(x: int) -> int:
+    return (x ^ _SIGN) - _SIGN
+
+
+def _sll(a: int, b: int) -> int:
+    # avoid building a huge int for large shift amounts
+    return (a << b) & MASK if b < 32 else 0
+
+
+def _div(a: int, b: int) -> int:
+    if b == 0:
+        return MASK
+    return (_sint(a) // _sint(b)) & MASK
+
+
+def _rem(a: int, b: int) -> int:
+    if b == 0:
+        return a
+    return (_sint(a) % _sint(b)) & MASK
+
+
+ALU_OPS = {
+    # ArithInst
+    'ADD': lambda a, b: (a + b) & MASK,
+    'SUB': lambda a, b: (a - b) & MASK,
+    'SLT': lambda a, b: int(_sint(a) < _sint(b)),
+    'SLTU': lambda a, b: int(a < b),
+    'AND': lambda a, b: a & b,
+    'OR': lambda a, b: a | b,
+    'XOR': lambda a, b: a ^ b,
+    # ShiftInst
+    'SLL': _sll,
+    'SRL': lambda a, b: a >> b,
+    'SRA': lambda a, b: (_sint(a) >> b) & MASK,
+    # MulDivInst
+    'MUL': lambda a, b: (a * b) & MASK,
+    'MULH': lambda a, b: ((_sint(a) * _sint(b)) >> 32) & MASK,
+    'MULHU': lambda a, b: (a * b) >> 32,
+    'MULHSU': lambda a, b: ((_sint(a) * b) >> 32) & MASK,
+    'DIV': _div,
+    'DIVU': lambda a, b: a // b if b else MASK,
+    'REM': _rem,
+    'REMU': lambda a, b: a % b if b else a,
+}
+
+
+def _load(memory, addr: int, n: int, signed: bool) -> int:
+    value = int.from_bytes(memory.read(addr, n), 'little')
+    if signed:
+        sign = 1 << (8*n - 1)
+        value = ((value ^ sign) - sign) & MASK
+    return value
+
+
+def _store(memory, addr: int, value: int, n: int):
+    memory.write(addr, value.to_bytes(4, 'little')[:n])
+
+
+BIT_OPS = {
+    'POPCNT': lambda a: bin(a).count('1'),
+    'CNTLZ': lambda a: 32 - a.bit_length(),
+    'CNTTZ': lambda a: (a & -a).bit_length() - 1 if a else 32,
+}
+
+
+class NativeR32I:
+    '''
+    Executes riscv instructions on python ints.
+    Supports the riscv, riscv_m and riscv_ext simulators.
+
+    sim is the simulator module (e.g. examples.riscv.sim), isa its ISA, regs
+    holds the register file, memory the data memory and pc is passed and
+    returned as an int.
+    '''
+    def __init__(self, sim, decode_cache_size=4096):
+        self.isa = sim.ISA_fc.Py
+        self._decode = sim.R32I_fc.Py().Decode
+        self.regs = [0] * 32
+        self.memory = PyFamily().get_memory()()
+        self.decode = DecodeCache(self._lower, decode_cache_size)
+
+    def _lower(self, inst, pc):
+        decoded = self._decode(inst, pc)
+        if getattr(decoded, 'is_fp', False):
+            raise NotImplementedError('floating point instructions are not supported')
+
+        exec_inst = decoded.exec_inst
+        for field in type(exec_inst).field_dict:
+            m = getattr(exec_inst, field)
+            if m.match:
+                op = ALU_OPS[m.value.name]
+                break
+        else:
+            raise AssertionError('Unreachable code')
+
+        if getattr(decoded, 'is_ext', False):
+            bit_op = BIT_OPS[decoded.bit_inst.name]
+        else:
+            bit_op = None
+
+        # load is (bytes, signed) and store is the number of bytes, None if
+        # the instruction does not access memory
+        load = store = None
+        if getattr(decoded, 'is_load', False):
+            load = 1 << decoded.mem_size.as_uint(), bool(decoded.mem_signed)
+        elif getattr(decoded, 'is_store', False):
+            store = 1 << decoded.mem_size.as_uint()
+
+        return (
+            decoded.rs1.as_uint(),
+            decoded.rs2.as_uint(),
+            decoded.rd.as_uint(),
+            decoded.imm.as_uint(),
+            bool(decoded.use_imm),
+            bool(decoded.use_pc),
+            op,
+            bit_op,
+            bool(decoded.mask_lsb),
+            bool(decoded.is_branch),
+            bool(decoded.is_jump),
+            bool(decoded.cmp_zero),
+            bool(decoded.invert),
+            load,
+            store,
+        )
+
+    def __call__(self, inst, pc: int) -> int:
+        (rs1, rs2, rd, imm, use_imm, use_pc, op, bit_op,
+            mask_lsb, is_branch, is_jump, cmp_zero, invert, load, store) = self.decode(inst, pc)
+        regs = self.regs
+
+        a = regs[rs1]
+        if bit_op is not None:
+            a = bit_op(a)
+        if use_pc:
+            a = pc
+
+        if use_imm:
+            b = imm
+        else:
+            b = regs[rs2]
+
+        c = op(a, b)
+
+        if mask_lsb:
+            c &= ~1
+
+        if store is not None:
+            _store(self.memory, c, regs[rs2], store)
+        elif load is not None:
+            c = _load(self.memory, c, *load)
+
+        pc_next = (pc + 4) & MASK
+        if is_branch:
+            out = 0
+            if cmp_zero:
+                cond = c == 0
+            else:
+                cond = bool(c & 1)
+
+            if cond != invert:
+                pc_next = (pc + imm) & MASK
+        elif is_jump:
+            out = pc_next
+            pc_next = c
+        else:
+            out = c
+
+        if rd:
+            regs[rd] = out
+        return pc_next
+
+    def run(self, program, pc: int, max_steps=None):
+        # See util.run_loop, returns RunResult(pc, retired, time)
+        return run_loop(self, program, pc, max_steps)
+
+
+class _ModelMemory:
+    # Memory of the model in Lockstep.  Loads read the native memory, stores
+    # are recorded to be checked against it once the native engine has run.
+    def __init__(self, memory):
+        self.memory = memory
+        self.stores = []
+
+    def load(self, addr, size):
+        return self.memory.load(addr, size)
+
+    def store(self, addr, value, size, en):
+        if en:
+            n = 1 << size.as_uint()
+            self.stores.append((addr.as_uint(), value.as_uint().to_bytes(4, 'little')[:n]))
+
+
+class Lockstep:
+    '''
+    Runs a NativeR32I and checks every sample_every-th instruction against
+    the peak model of the same simulator.  The model is synchronized with the
+    native register file before each check and reads the native memory, so
+    unchecked instructions only run natively.  Raises AssertionError on the
+    first divergence.
+    '''
+    def __init__(self, sim, sample_every=1):
+        if sample_every <= 0:
+            raise ValueError('sample_every must be positive')
+        isa = sim.ISA_fc.Py
+        self._Word = isa.Word
+        self.native = NativeR32I(sim)
+        self.model = sim.R32I_fc(sim.family.ArrayPyFamily())()
+        self._model_memory = None
+        if hasattr(self.model, 'memory'):
+            self._model_memory = self.model.memory = _ModelMemory(self.native.memory)
+        self.sample_every = sample_every
+        self.steps = 0
+        self.checked = 0
+
+    @property
+    def regs(self):
+        return self.native.regs
+
+    def __call__(self, inst, pc: int) -> int:
+        check = self.steps % self.sample_every == 0
+        self.steps += 1
+        if not check:
+            return self.native(inst, pc)
+
+        model_rf = self.model.register_file.rf
+        model_rf[:] = self.native.regs
+        model_memory = self._model_memory
+        if model_memory is not None:
+            model_memory.stores.clear()
+        model_pc = self.model(inst, self._Word(pc)).as_uint()
+        pc_next = self.native(inst, pc)
+        self.checked += 1
+
+        if pc_next != model_pc:
+            raise AssertionError(
+                f'{inst} @ {pc:#x}: native pc_next {pc_next:#x} != model {model_pc:#x}')
+        if model_rf != self.native.regs:
+            diff = {i: (n, m) for i, (n, m) in enumerate(zip(self.native.regs, model_rf)) if n != m}
+            raise AssertionError(
+                f'{inst} @ {pc:#x}: register mismatch {{idx: (native, model)}} {diff}')
+        if model_memory is not None:
+            for addr, data in model_memory.stores:
+                native = self.native.memory.read(addr, len(data))
+                if native != data:
+                    raise AssertionError(
+                        f'{inst} @ {pc:#x}: memory mismatch at {addr:#x} native {native.hex()} != model {data.hex()}')
+        return pc_next
@@ -2,7 +2,7 @@ from peak import Peak, name_outputs, family_closure, Const
 
 
 from .isa import ISA_fc
-from .util import Initial
+from .util import Initial, run_loop
 from . import family
 
 @family_closure(family)
@@ -17,6 +17,8 @@ def R32I_fc(family):
 
     isa = ISA_fc.Py
     RegisterFile = family.get_register_file()
+    Memory = family.get_memory()
+    MemSize = BitVector[2]
     ExecInst = family.get_constructor(isa.AluInst)
     DecodeOut = family.get_constructor(isa._DecodeOut)
 
@@ -34,6 +36,10 @@ def R32I_fc(family):
             is_jump = Bit(0)
             cmp_zero = Bit(0)
             invert = Bit(0)
+            is_load = Bit(0)
+            is_store = Bit(0)
+            mem_size = MemSize(0)
+            mem_signed = Bit(0)
 
             # Note rd != 0 is implicit enable
             rd = Idx(0)
@@ -135,10 +141,47 @@ def R32I_fc(family):
                     invert = cmp_ge
 
             elif inst[isa.Load].match:
+                is_load = Bit(1)
+                load_inst = inst[isa.Load].value
+                # No 64 bit loads on a 32 bit machine
+                assert load_inst.tag != isa.LoadInst.LD
+                rs1 = load_inst.data.rs1
+                imm = load_inst.data.imm.sext(20)
+                use_imm = Bit(1)
+                rd = load_inst.data.rd
+                # address calculation
                 exec_inst = ExecInst(arith=isa.ArithInst.ADD)
+
+                is_lb = load_inst.tag == isa.LoadInst.LB
+                is_lh = load_inst.tag == isa.LoadInst.LH
+                mem_signed = is_lb | is_lh
+                if is_lb | (load_inst.tag == isa.LoadInst.LBU):
+                    mem_size = MemSize(0)
+                elif is_lh | (load_inst.tag == isa.LoadInst.LHU):
+                    mem_size = MemSize(1)
+                else:
+                    # LW / LWU are the same on a 32 bit machine
+                    mem_size = MemSize(2)
+
             else:
                 assert inst[isa.Store].match
+                is_store = Bit(1)
+                store_inst = inst[isa.Store].value
+                assert store_inst.tag != isa.StoreInst.SD
+                rs1 = store_inst.data.rs1
+                rs2 = store_inst.data.rs2
+                imm = store_inst.data.imm.sext(20)
+                use_imm = Bit(1)
+                # address calculation
                 exec_inst = ExecInst(arith=isa.ArithInst.ADD)
+
+                if store_inst.tag == isa.StoreInst.SB:
+                    mem_size = MemSize(0)
+                elif store_inst.tag == isa.StoreInst.SH:
+                    mem_size = MemSize(1)
+                else:
+                    mem_size = MemSize(2)
+
             return DecodeOut(
                 rs1 = rs1,
                 rs2 = rs2,
@@ -152,6 +195,10 @@ def R32I_fc(family):
                 is_jump = is_jump,
                 cmp_zero = cmp_zero,
                 invert = invert,
+                is_load = is_load,
+                is_store = is_store,
+                mem_size = mem_size,
+                mem_signed = mem_signed,
             )
 
 
@@ -196,6 +243,7 @@ def R32I_fc(family):
     class R32I(Peak):
         def __init__(self):
             self.register_file = RegisterFile()
+            self.memory = Memory()
             self.Decode = Decode()
             self.ALU = ALU()
 
@@ -219,9 +267,14 @@ def R32I_fc(family):
             is_jump = decoded.is_jump
             cmp_zero = decoded.cmp_zero
             invert = decoded.invert
+            is_load = decoded.is_load
+            is_store = decoded.is_store
+            mem_size = decoded.mem_size
+            mem_signed = decoded.mem_signed
 
             a = self.register_file.load1(rs1)
             b = self.register_file.load2(rs2)
+            st_data = b
 
             if use_pc:
                 a = pc
@@ -237,6 +290,22 @@ def R32I_fc(family):
                 c = BitVector[1](0).concat(c[1:]) # clear bottom bit for jalr
 
 
+            # Memory
+            # store is always called, is_store is its enable
+            self.memory.store(c, st_data, mem_size, is_store)
+            if is_load:
+                ld_data = self.memory.load(c, mem_size)
+                # move the loaded bytes to the top of the word and shift
+                # them back down to sign / zero extend
+                shamt = Word(32) - (Word(8) << mem_size.zext(30))
+                ld_data = ld_data.bvshl(shamt)
+                if mem_signed:
+                    ld_data = ld_data.bvashr(shamt)
+                else:
+                    ld_data = ld_data.bvlshr(shamt)
+                c = ld_data
+
+
             # Commit
             assert not (is_jump & is_branch)
 
@@ -262,6 +331,10 @@ def R32I_fc(family):
 
             self.register_file.store(rd, out)
             return pc_next
+
+        def run(self, program, pc, max_steps=None):
+            # See util.run_loop, returns RunResult(pc, retired, time)
+            return run_loop(self, program, pc, max_steps)
     return R32I
 
 
@@ -270,6 +343,9 @@ def R32I_mappable_fc(family):
     R32I = R32I_fc(family)
     Word = family.Word
     isa = ISA_fc.Py
+    # sliced families narrow the instruction, see slice.py
+    Inst = getattr(family, 'Inst', isa.Inst)
+    widen = getattr(family, 'widen', lambda inst: inst)
 
 
     @family.assemble(locals(), globals())
@@ -277,20 +353,27 @@ def R32I_mappable_fc(family):
         def __init__(self):
             self.riscv = R32I()
 
-        @name_outputs(pc_next=isa.Word, rd=isa.Word)
+        # The memory is exposed through its ports: loads return ld_data and
+        # stores drive the st_ outputs (st_en is 0 if nothing is stored)
+        @name_outputs(pc_next=isa.Word, rd=isa.Word, st_addr=isa.Word,
+                      st_data=isa.Word, st_size=isa.BitVector[2], st_en=isa.Bit)
         def __call__(self,
-                     inst: Const(isa.Inst),
+                     inst: Const(Inst),
                      pc: isa.Word,
                      rs1: isa.Word,
                      rs2: isa.Word,
                      rd: Initial(isa.Word),
-                     ) -> (isa.Word, isa.Word):
+                     ld_data: isa.Word,
+                     ) -> (isa.Word, isa.Word, isa.Word, isa.Word, isa.BitVector[2], isa.Bit):
 
             self._set_rs1_(rs1)
             self._set_rs2_(rs2)
             self._set_rd_(rd)
-            pc_next = self.riscv(inst, pc)
-            return pc_next, self.riscv.register_file.rd
+            self._set_ld_data_(ld_data)
+            pc_next = self.riscv(widen(inst), pc)
+            memory = self.riscv.memory
+            return (pc_next, self.riscv.register_file.rd,
+                    memory.st_addr, memory.st_data, memory.st_size, memory.st_en)
 
         def _set_rs1_(self, rs1):
             self.riscv.register_file._set_rs1_(rs1)
@@ -301,6 +384,9 @@ def R32I_mappable_fc(family):
         def _set_rd_(self, rd):
             self.riscv.register_file._set_rd_(rd)
 
+        def _set_ld_data_(self, ld_data):
+            self.riscv.memory._set_ld_data_(ld_data)
+
     return R32I_mappable
 
 
@@ -309,6 +395,9 @@ def R32I_mappable_no_pc_fc(family):
     R32I = R32I_fc(family)
     Word = family.Word
     isa = ISA_fc.Py
+    # sliced families narrow the instruction, see slice.py
+    Inst = getattr(family, 'Inst', isa.Inst)
+    widen = getattr(family, 'widen', lambda inst: inst)
 
 
     @family.assemble(locals(), globals())
@@ -316,20 +405,26 @@ def R32I_mappable_no_pc_fc(family):
         def __init__(self):
             self.riscv = R32I()
 
-        @name_outputs(rd=isa.Word)
+        # see R32I_mappable_fc for the memory ports
+        @name_outputs(rd=isa.Word, st_addr=isa.Word, st_data=isa.Word,
+                      st_size=isa.BitVector[2], st_en=isa.Bit)
         def __call__(self,
-                     inst: Const(isa.Inst),
+                     inst: Const(Inst),
                      rs1: isa.Word,
                      rs2: isa.Word,
-                     ) -> isa.Word:
+                     ld_data: isa.Word,
+                     ) -> (isa.Word, isa.Word, isa.Word, isa.BitVector[2], isa.Bit):
 
             pc = Word(0)
             rd = Word(0x5555)
             self._set_rs1_(rs1)
             self._set_rs2_(rs2)
             self._set_rd_(rd)
-            pc_next = self.riscv(inst, pc)
-            return self.riscv.register_file.rd
+            self._set_ld_data_(ld_data)
+            pc_next = self.riscv(widen(inst), pc)
+            memory = self.riscv.memory
+            return (self.riscv.register_file.rd,
+                    memory.st_addr, memory.st_data, memory.st_size, memory.st_en)
 
         def _set_rs1_(self, rs1):
             self.riscv.register_file._set_rs1_(rs1)
@@ -340,4 +435,7 @@ def R32I_mappable_no_pc_fc(family):
         def _set_rd_(self, rd):
             self.riscv.register_file._set_rd_(rd)
 
+        def _set_ld_data_(self, ld_data):
+            self.riscv.memory._set_ld_data_(ld_data)
+
     return R32I_mappable
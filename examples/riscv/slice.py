@@ -0,0 +1,195 @@
+'''
+Path sliced SMT models.
+
+slice_family(choices) is a drop in for the family module of the mappable
+closures whose SMT peaks only cover the given fields of isa.Inst, e.g.
+
+    sliced = slice_family([isa.OP])
+    ArchMapper(R32I_mappable_fc, family=sliced)
+
+The instruction input of the mappable peaks (Py and SMT) is narrowed to
+Sum[choices] (see R32I_mappable_fc), the Py peaks widen it back to isa.Inst
+before running it.  In the SMT peaks the if / elif chains
+dispatching on inst[isa.X].match are folded before the peaks are
+symbolically executed: branches of unreachable fields are dropped and if a
+single field is reachable its branch is inlined.  Nested tagged unions (e.g.
+AluInst.arith) are not sliced, use path constraints for those.
+'''
+from types import SimpleNamespace
+import typing as tp
+
+import libcst as cst
+
+from ast_tools.passes import Pass, PASS_ARGS_T
+from ast_tools.stack import SymbolTable
+from hwtypes.adt import Sum
+
+from . import family
+
+
+def _match_name(test: cst.BaseExpression, isa_name: str):
+    # Returns X for tests of the form `<expr>[isa.X].match`
+    if not (isinstance(test, cst.Attribute) and test.attr.value == 'match'):
+        return None
+    sub = test.value
+    if not (isinstance(sub, cst.Subscript) and len(sub.slice) == 1):
+        return None
+    index = sub.slice[0].slice
+    if not isinstance(index, cst.Index):
+        return None
+    field = index.value
+    if (isinstance(field, cst.Attribute)
+            and isinstance(field.value, cst.Name)
+            and field.value.value == isa_name):
+        return field.attr.value
+    return None
+
+
+class _MatchFolder(cst.CSTTransformer):
+    def __init__(self, names, reachable, isa_name):
+        self.names = names
+        self.reachable = reachable
+        self.isa_name = isa_name
+        self.elifs = set()
+
+    def visit_If(self, node: cst.If):
+        if isinstance(node.orelse, cst.If):
+            self.elifs.add(node.orelse)
+
+    def _name(self, test):
+        name = _match_name(test, self.isa_name)
+        if name in self.names:
+            return name
+        return None
+
+    def _fold(self, node: cst.If):
+        # Returns the folded chain as an If or as a list of statements
+        head = node
+        branches = []
+        while isinstance(node, cst.If):
+            branches.append((self._name(node.test), node.test, node.body))
+            node = node.orelse
+        exhaustive = node is not None
+        if exhaustive:
+            # else branches of the form `assert <expr>[isa.X].match`
+            first = node.body.body[0] if node.body.body else None
+            name = None
+            if (isinstance(first, cst.SimpleStatementLine)
+                    and isinstance(first.body[0], cst.Assert)):
+                name = self._name(first.body[0].test)
+            branches.append((name, None, node.body))
+
+        n_branches = len(branches)
+        branches = [b for b in branches if b[0] is None or b[0] in self.reachable]
+        if not branches:
+            return []
+        if exhaustive and all(name is not None for name, _, _ in branches):
+            # one of the remaining fields matches, the last test is implied
+            if len(branches) == 1:
+                return list(branches[0][2].body)
+            elif len(branches) == n_branches and branches[-1][1] is None:
+                return head
+            name, _, body = branches[-1]
+            branches[-1] = name, None, body
+        elif len(branches) == n_branches:
+            return head
+
+        _, test, body = branches[-1]
+        if test is None:
+            chain = cst.Else(body=body)
+        else:
+            chain = cst.If(test=test, body=body)
+        for _, test, body in reversed(branches[:-1]):
+            chain = cst.If(test=test, body=body, orelse=chain)
+        if isinstance(chain, cst.Else):
+            return list(chain.body.body)
+        return chain
+
+    def leave_If(self, original_node: cst.If, updated_node: cst.If):
+        if original_node in self.elifs:
+            # folded with the head of the chain
+            return updated_node
+        folded = self._fold(updated_node)
+        if isinstance(folded, cst.If):
+            return folded
+        elif folded:
+            return cst.FlattenSentinel(folded)
+        else:
+            return cst.RemoveFromParent()
+
+
+class fold_matches(Pass):
+    '''
+    Folds `if <expr>[isa.X].match:` chains assuming only the fields of
+    isa.Inst named in reachable can match.
+    '''
+    def __init__(self, names, reachable, isa_name='isa'):
+        self.names = frozenset(names)
+        self.reachable = frozenset(reachable)
+        self.isa_name = isa_name
+
+    def rewrite(self,
+            tree: cst.CSTNode,
+            env: SymbolTable,
+            metadata: tp.MutableMapping) -> PASS_ARGS_T:
+        tree = tree.visit(_MatchFolder(self.names, self.reachable, self.isa_name))
+        return tree, env, metadata
+
+
+def _check_choices(choices):
+    # isa imports family
+    from .isa import ISA_fc
+    Inst = ISA_fc.Py.Inst
+    for choice in choices:
+        if choice not in Inst.field_dict:
+            raise ValueError(f'{choice} is not a field of {Inst}')
+    return tuple(choices)
+
+
+class _SlicedFamily_mixin:
+    @property
+    def Inst(self):
+        return Sum[self.choices]
+
+    # Family closures are memoized by family, slices to different choices
+    # must not share their peaks.  Sum[choices] does not depend on the order
+    # of the choices, neither does the slice.
+    def __eq__(self, other):
+        return (type(self) is type(other)
+                and frozenset(self.choices) == frozenset(other.choices))
+
+    def __hash__(self):
+        return hash((type(self), frozenset(self.choices)))
+
+
+class SlicedPyFamily(_SlicedFamily_mixin, family.PyFamily):
+    def __init__(self, choices, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.choices = _check_choices(choices)
+
+    def widen(self, inst):
+        # The python peaks are not folded, they take an isa.Inst
+        from .isa import ISA_fc
+        return ISA_fc.Py.Inst(inst.value)
+
+
+class SlicedSMTFamily(_SlicedFamily_mixin, family.SMTFamily):
+    def __init__(self, choices, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.choices = _check_choices(choices)
+        from .isa import ISA_fc
+        names = [T.__name__ for T in ISA_fc.Py.Inst.field_dict]
+        reachable = [T.__name__ for T in self.choices]
+        self._passes = fold_matches(names, reachable), *self._passes
+
+
+def slice_family(choices):
+    '''
+    Family for the closures in sim with peaks sliced to choices, a sequence
+    of fields of isa.Inst.
+    '''
+    choices = tuple(choices)
+    return SimpleNamespace(
+        PyFamily=lambda *args, **kwargs: SlicedPyFamily(choices, *args, **kwargs),
+        SMTFamily=lambda *args, **kwargs: SlicedSMTFamily(choices, *args, **kwargs),
+    )
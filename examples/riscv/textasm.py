@@ -0,0 +1,442 @@
+'''
+Text assembler for the RISC-V examples.
+
+    buf = assemble(source, base=0x1000)
+    program = Program(buf, base=0x1000)
+
+Sources are assembled in one pass straight to 32 bit encodings, no isa.Inst
+is built.  References to labels defined further down are patched once the
+whole source is read.  The result is a little endian buffer of words, as
+written by encoding.encode_all and read by loader.Program / decode_all.
+Pass cache= (a directory) to keep assembled programs on disk, keyed by a
+hash of the source, the base address and the assembler.
+
+Instructions (operands as in the RISC-V spec):
+
+    add sub sll slt sltu xor srl sra or and     rd, rs1, rs2
+    addi slti sltiu xori ori andi               rd, rs1, imm
+    slli srli srai                              rd, rs1, shamt
+    lui auipc                                   rd, imm20
+    jal                                         [rd,] target
+    jalr                                        [rd,] offset(rs1)
+    beq bne blt bge bltu bgeu                   rs1, rs2, target
+    lb lh lw lbu lhu ...                        rd, offset(rs1)
+    sb sh sw ...                                rs2, offset(rs1)
+
+and, if the ISA has them, the M extension (mul, div, ...), the bit
+counting instructions (clz ctz cpop rd, rs1) and the single precision
+instructions of the F extension:
+
+    fadd.s fsub.s fmul.s fdiv.s                 frd, frs1, frs2[, rm]
+    fsqrt.s                                     frd, frs1[, rm]
+    fmin.s fmax.s                               frd, frs1, frs2
+    feq.s flt.s fle.s                           rd, frs1, frs2
+    fclass.s                                    rd, frs1
+    fmadd.s fmsub.s fnmsub.s fnmadd.s           frd, frs1, frs2, frs3[, rm]
+
+The pseudo instructions nop, mv, li, not, neg, j, jr, ret, beqz and bnez
+are expanded, .word emits a literal word.  Registers are x0-x31, floating
+point registers f0-f31, or their ABI names.  The rounding mode rm is one
+of rne, rtz, rdn, rup, rmm and dyn (the default).  Branch and jump targets
+are labels, '.' (the instruction itself) or byte offsets.  The F loads and
+stores and the moves between register files are not supported, the ISA
+does not have them.
+'''
+import struct
+import typing as tp
+
+from .. import textasm
+from . import encoding
+from .encoding import (
+    OP, OP_IMM, LUI, AUIPC, JAL, JALR, BRANCH, LOAD, STORE,
+    OP_FP, MADD, MSUB, NMSUB, NMADD,
+    _OP_FUNCT, _OP_IMM_FUNCT3, _EXT_FUNCT, _EXT_RS2, _BRANCH_FUNCT3,
+    _LOAD_FUNCT3, _STORE_FUNCT3, _RM_FUNCT3,
+    _FP_COMPUTE_FUNCT7, _FP_MINMAX_FUNCT7, _FP_SQRT_FUNCT7, _FP_COMPARE_FUNCT7,
+    _FP_CLASS_FUNCT7, _FP_MINMAX_FUNCT3, _FP_COMPARE_FUNCT3,
+    _s_bits, _b_bits, _j_bits, _r_bits,
+)
+from .isa import ISA_fc
+
+isa = ISA_fc.Py
+
+
+_ABI = (
+    ['zero', 'ra', 'sp', 'gp', 'tp', 't0', 't1', 't2', 's0', 's1']
+    + [f'a{i}' for i in range(8)]
+    + [f's{i}' for i in range(2, 12)]
+    + [f't{i}' for i in range(3, 7)]
+)
+_REGS = {name: i for i, name in enumerate(_ABI)}
+_REGS.update({f'x{i}': i for i in range(32)})
+_REGS['fp'] = 8
+
+_FABI = (
+    [f'ft{i}' for i in range(8)]
+    + ['fs0', 'fs1']
+    + [f'fa{i}' for i in range(8)]
+    + [f'fs{i}' for i in range(2, 12)]
+    + [f'ft{i}' for i in range(8, 12)]
+)
+_FREGS = {name: i for i, name in enumerate(_FABI)}
+_FREGS.update({f'f{i}': i for i in range(32)})
+
+_RMS = {name.lower(): f3 for name, f3 in _RM_FUNCT3.items()}
+
+# FNMS / FNMA of the isa are fnmadd / fnmsub, see encoding._FP_FUSED_OPCODE
+_FP_FUSED_MNEMONIC = {
+    'fmadd.s': MADD,
+    'fmsub.s': MSUB,
+    'fnmsub.s': NMSUB,
+    'fnmadd.s': NMADD,
+}
+
+_IMM_MNEMONIC = {
+    'ADD': 'addi',
+    'SLT': 'slti',
+    'SLTU': 'sltiu',
+    'XOR': 'xori',
+    'OR': 'ori',
+    'AND': 'andi',
+}
+
+_EXT_MNEMONIC = {
+    'CNTLZ': 'clz',
+    'CNTTZ': 'ctz',
+    'POPCNT': 'cpop',
+}
+
+
+def _reg(text: str) -> int:
+    try:
+        return _REGS[text.lower()]
+    except KeyError:
+        raise ValueError(f'unknown register {text!r}') from None
+
+
+def _freg(text: str) -> int:
+    try:
+        return _FREGS[text.lower()]
+    except KeyError:
+        raise ValueError(f'unknown floating point register {text!r}') from None
+
+
+def _rm_operands(ops, n):
+    # n operands and an optional rounding mode, dynamic by default
+    if len(ops) == n + 1:
+        *ops, rm = ops
+        try:
+            return ops, _RMS[rm.lower()]
+        except KeyError:
+            raise ValueError(f'unknown rounding mode {rm!r}') from None
+    return textasm.operands(ops, n), _RM_FUNCT3['DYN']
+
+
+def _i_bits(opcode, funct3, rd, rs1, imm):
+    return (textasm.check_int(imm, 12, True) << 20) | (rs1 << 15) | (funct3 << 12) | (rd << 7) | opcode
+
+
+def _branch_bits(offset):
+    if offset & 1:
+        raise ValueError(f'misaligned branch offset {offset}')
+    return _b_bits(textasm.check_int(offset, 13, True) >> 1)
+
+
+def _jal_bits(offset):
+    if offset & 1:
+        raise ValueError(f'misaligned jump offset {offset}')
+    return _j_bits(textasm.check_int(offset, 21, True) >> 1)
+
+
+# An assembled instruction: its word and, for branches and jumps, the
+# target operand and a function returning the bits of a pc relative offset
+_Emit = tp.Tuple[int, tp.Optional[str], tp.Optional[tp.Callable[[int], int]]]
+
+
+class TextAssembler:
+    '''
+    Assembles text to the 32 bit encodings of isa.  Instructions of the M,
+    bit counting and F extensions are accepted when isa defines them.
+    '''
+    def __init__(self, isa):
+        self.isa = isa
+        # mnemonic -> handler(operands) -> [_Emit]
+        self._handlers = {}
+        self._init_base()
+        if hasattr(isa, 'Ext') and isa.Ext in isa.Inst.field_dict:
+            self._init_ext()
+        if hasattr(isa, 'OP_FP') and isa.OP_FP in isa.Inst.field_dict:
+            self._init_fp()
+        self._init_pseudo()
+
+    @property
+    def mnemonics(self) -> tp.List[str]:
+        return sorted(self._handlers)
+
+    def _init_base(self):
+        isa = self.isa
+        h = self._handlers
+
+        def gen_r(f3, f7):
+            def asm_r(ops):
+                rd, rs1, rs2 = map(_reg, textasm.operands(ops, 3))
+                return [(_r_bits(OP, f3, f7, rd, rs1, rs2), None, None)]
+            return asm_r
+
+        for tag_T in isa.AluInst.field_dict.values():
+            for name in tag_T._field_table_:
+                h[name.lower()] = gen_r(*_OP_FUNCT[name])
+
+        def gen_i(f3):
+            def asm_i(ops):
+                rd, rs1, imm = textasm.operands(ops, 3)
+                return [(_i_bits(OP_IMM, f3, _reg(rd), _reg(rs1), textasm.parse_int(imm)), None, None)]
+            return asm_i
+
+        for name, f3 in _OP_IMM_FUNCT3.items():
+            if name in isa.ArithInst._field_table_:
+                h[_IMM_MNEMONIC[name]] = gen_i(f3)
+
+        def gen_shift(f3, f7):
+            def asm_shift(ops):
+                rd, rs1, shamt = textasm.operands(ops, 3)
+                shamt = textasm.check_int(textasm.parse_int(shamt), isa.Is.imm.size, False)
+                return [(_r_bits(OP_IMM, f3, f7, _reg(rd), _reg(rs1), shamt), None, None)]
+            return asm_shift
+
+        for name in isa.ShiftInst._field_table_:
+            h[name.lower() + 'i'] = gen_shift(*_OP_FUNCT[name])
+
+        def gen_u(opcode):
+            def asm_u(ops):
+                rd, imm = textasm.operands(ops, 2)
+                imm = textasm.parse_int(imm)
+                imm = textasm.check_int(imm, 20, imm < 0)
+                return [((imm << 12) | (_reg(rd) << 7) | opcode, None, None)]
+            return asm_u
+
+        h['lui'] = gen_u(LUI)
+        h['auipc'] = gen_u(AUIPC)
+
+        def asm_jal(ops):
+            if len(ops) == 1:
+                ops = ['ra', *ops]
+            rd, target = textasm.operands(ops, 2)
+            return [((_reg(rd) << 7) | JAL, target, _jal_bits)]
+
+        def asm_jalr(ops):
+            if len(ops) == 1:
+                ops = ['ra', *ops]
+            if len(ops) == 3:
+                # jalr rd, rs1, imm
+                rd, rs1, imm = ops
+                offset = textasm.parse_int(imm)
+            else:
+                rd, mem = textasm.operands(ops, 2)
+                offset, rs1 = textasm.parse_mem(mem)
+            return [(_i_bits(JALR, 0, _reg(rd), _reg(rs1), offset), None, None)]
+
+        h['jal'] = asm_jal
+        h['jalr'] = asm_jalr
+
+        def gen_branch(f3):
+            def asm_branch(ops):
+                rs1, rs2, target = textasm.operands(ops, 3)
+                word = (_reg(rs2) << 20) | (_reg(rs1) << 15) | (f3 << 12) | BRANCH
+                return [(word, target, _branch_bits)]
+            return asm_branch
+
+        for name, f3 in _BRANCH_FUNCT3.items():
+            h[name.lower()] = gen_branch(f3)
+
+        def gen_load(f3):
+            def asm_load(ops):
+                rd, mem = textasm.operands(ops, 2)
+                offset, rs1 = textasm.parse_mem(mem)
+                return [(_i_bits(LOAD, f3, _reg(rd), _reg(rs1), offset), None, None)]
+            return asm_load
+
+        for name, f3 in _LOAD_FUNCT3.items():
+            if name in isa.LoadInst._field_table_:
+                h[name.lower()] = gen_load(f3)
+
+        def gen_store(f3):
+            def asm_store(ops):
+                rs2, mem = textasm.operands(ops, 2)
+                offset, rs1 = textasm.parse_mem(mem)
+                imm = textasm.check_int(offset, 12, True)
+                word = _s_bits(imm) | (_reg(rs2) << 20) | (_reg(rs1) << 15) | (f3 << 12) | STORE
+                return [(word, None, None)]
+            return asm_store
+
+        for name, f3 in _STORE_FUNCT3.items():
+            if name in isa.StoreInst._field_table_:
+                h[name.lower()] = gen_store(f3)
+
+        def asm_word(ops):
+            value, = textasm.operands(ops, 1)
+            value = textasm.parse_int(value)
+            return [(textasm.check_int(value, 32, value < 0), None, None)]
+
+        h['.word'] = asm_word
+
+    def _init_ext(self):
+        f3, f7 = _EXT_FUNCT
+
+        def gen_ext(rs2):
+            def asm_ext(ops):
+                rd, rs1 = map(_reg, textasm.operands(ops, 2))
+                return [(_r_bits(OP_IMM, f3, f7, rd, rs1, rs2), None, None)]
+            return asm_ext
+
+        for name in self.isa.BitInst._field_table_:
+            self._handlers[_EXT_MNEMONIC[name]] = gen_ext(_EXT_RS2[name])
+
+    def _init_fp(self):
+        h = self._handlers
+
+        def gen_compute(f7):
+            def asm_compute(ops):
+                (rd, rs1, rs2), rm = _rm_operands(ops, 3)
+                return [(_r_bits(OP_FP, rm, f7, _freg(rd), _freg(rs1), _freg(rs2)), None, None)]
+            return asm_compute
+
+        for name, f7 in _FP_COMPUTE_FUNCT7.items():
+            h[name.lower() + '.s'] = gen_compute(f7)
+
+        def asm_sqrt(ops):
+            (rd, rs1), rm = _rm_operands(ops, 2)
+            return [(_r_bits(OP_FP, rm, _FP_SQRT_FUNCT7, _freg(rd), _freg(rs1), 0), None, None)]
+
+        h['fsqrt.s'] = asm_sqrt
+
+        def gen_fp_r(f3, f7, reg_rd):
+            def asm_fp_r(ops):
+                rd, rs1, rs2 = textasm.operands(ops, 3)
+                return [(_r_bits(OP_FP, f3, f7, reg_rd(rd), _freg(rs1), _freg(rs2)), None, None)]
+            return asm_fp_r
+
+        for name, f3 in _FP_MINMAX_FUNCT3.items():
+            h[f'f{name.lower()}.s'] = gen_fp_r(f3, _FP_MINMAX_FUNCT7, _freg)
+        # compares write the integer register file
+        for name, f3 in _FP_COMPARE_FUNCT3.items():
+            h[f'f{name.lower()}.s'] = gen_fp_r(f3, _FP_COMPARE_FUNCT7, _reg)
+
+        def asm_class(ops):
+            rd, rs1 = textasm.operands(ops, 2)
+            return [(_r_bits(OP_FP, 1, _FP_CLASS_FUNCT7, _reg(rd), _freg(rs1), 0), None, None)]
+
+        h['fclass.s'] = asm_class
+
+        def gen_fused(opcode):
+            def asm_fused(ops):
+                (rd, rs1, rs2, rs3), rm = _rm_operands(ops, 4)
+                word = _r_bits(opcode, rm, 0, _freg(rd), _freg(rs1), _freg(rs2))
+                return [((_freg(rs3) << 27) | word, None, None)]
+            return asm_fused
+
+        for name, opcode in _FP_FUSED_MNEMONIC.items():
+            h[name] = gen_fused(opcode)
+
+    def _init_pseudo(self):
+        h = self._handlers
+        addi, xori, sub, jal, jalr = h['addi'], h['xori'], h['sub'], h['jal'], h['jalr']
+        beq, bne = h['beq'], h['bne']
+
+        def asm_li(ops):
+            rd, value = textasm.operands(ops, 2)
+            value = textasm.parse_int(value)
+            textasm.check_int(value, 32, value < 0)
+            if -2048 <= value < 2048:
+                return addi([rd, 'zero', str(value)])
+            # lui of the upper bits rounded so the addi of the sign extended
+            # low 12 bits lands on value
+            lo = ((value & 0xfff) ^ 0x800) - 0x800
+            hi = ((value - lo) >> 12) & 0xfffff
+            emits = h['lui']([rd, str(hi)])
+            if lo:
+                emits += addi([rd, rd, str(lo)])
+            return emits
+
+        def asm_neg(ops):
+            rd, rs = textasm.operands(ops, 2)
+            return sub([rd, 'zero', rs])
+
+        def gen_bz(branch):
+            def asm_bz(ops):
+                rs, target = textasm.operands(ops, 2)
+                return branch([rs, 'zero', target])
+            return asm_bz
+
+        pseudo = {
+            'nop': lambda ops: addi(['zero', 'zero', '0'] + textasm.operands(ops, 0)),
+            'mv': lambda ops: addi(textasm.operands(ops, 2) + ['0']),
+            'not': lambda ops: xori(textasm.operands(ops, 2) + ['-1']),
+            'neg': asm_neg,
+            'li': asm_li,
+            'j': lambda ops: jal(['zero'] + textasm.operands(ops, 1)),
+            'jr': lambda ops: jalr(['zero', f'0({textasm.operands(ops, 1)[0]})']),
+            'ret': lambda ops: jalr(['zero', '0(ra)'] + textasm.operands(ops, 0)),
+            'beqz': gen_bz(beq),
+            'bnez': gen_bz(bne),
+        }
+        for name, f in pseudo.items():
+            h.setdefault(name, f)
+
+    def _words(self, source: str, base: int) -> tp.List[int]:
+        words = []
+        labels = {}
+        # (index in words, label, bits(offset), line number)
+        fixups = []
+        for line_no, line_labels, mnemonic, ops in textasm.parse(source):
+            try:
+                for label in line_labels:
+                    if label in labels:
+                        raise ValueError(f'label {label} redefined')
+                    labels[label] = base + 4 * len(words)
+                if mnemonic is None:
+                    continue
+                try:
+                    handler = self._handlers[mnemonic]
+                except KeyError:
+                    raise ValueError(f'unknown instruction {mnemonic!r}') from None
+                for word, target, bits in handler(ops):
+                    if target is not None:
+                        pc = base + 4 * len(words)
+                        if target == '.':
+                            word |= bits(0)
+                        elif target in labels:
+                            word |= bits(labels[target] - pc)
+                        elif target[0].isdigit() or target[0] in '+-':
+                            word |= bits(textasm.parse_int(target))
+                        else:
+                            fixups.append((len(words), target, bits, line_no))
+                    words.append(word)
+            except ValueError as e:
+                raise ValueError(f'line {line_no}: {e}') from None
+
+        for i, label, bits, line_no in fixups:
+            try:
+                words[i] |= bits(labels[label] - (base + 4 * i))
+            except KeyError:
+                raise ValueError(f'line {line_no}: undefined label {label}') from None
+            except ValueError as e:
+                raise ValueError(f'line {line_no}: {e}') from None
+        return words
+
+    def assemble(self, source: str, base: int = 0, cache: tp.Optional[str] = None) -> bytes:
+        '''
+        Returns the little endian encoding of source placed at base.  If
+        cache is a directory, assembled programs are kept there.
+        '''
+        if cache is not None:
+            key = textasm.source_key(
+                source, base, self.mnemonics,
+                textasm.code_hash(__file__, textasm.__file__, encoding.__file__))
+            return textasm.cached(cache, key, lambda: self.assemble(source, base))
+        words = self._words(source, base)
+        return struct.pack(f'<{len(words)}I', *words)
+
+
+assembler = TextAssembler(isa)
+assemble = assembler.assemble
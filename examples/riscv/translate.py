@@ -0,0 +1,250 @@
+'''
+Basic block translation for the riscv simulators.
+
+BlockTranslator splits a program in to basic blocks (ending at the first
+branch or jump) and compiles each block to a single python function over
+the integer register file of a NativeR32I.  Registers are held in locals for
+the duration of a block and written back on exit, loads and stores go to
+the memory of the NativeR32I.  Blocks are cached by
+their start pc and must be invalidated when the program is modified, use
+BlockTranslator.write to do both.
+'''
+from collections import namedtuple, OrderedDict
+import time
+
+from .native import ALU_OPS, BIT_OPS, MASK, NativeR32I, _load, _sint, _store
+from .util import CacheInfo, RunResult, run_loop
+
+
+Block = namedtuple('Block', ['start', 'end', 'length', 'fn', 'source'])
+
+
+_OP_NAMES = {f: name for name, f in ALU_OPS.items()}
+_BIT_NAMES = {f: name for name, f in BIT_OPS.items()}
+
+# Inline forms of the common ALU ops, everything else is a call to ALU_OPS.
+# Operands are always atoms (names, literals or calls).
+_EXPRS = {
+    'ADD': '({a} + {b}) & MASK',
+    'SUB': '({a} - {b}) & MASK',
+    'SLT': 'int(_sint({a}) < _sint({b}))',
+    'SLTU': 'int({a} < {b})',
+    'AND': '{a} & {b}',
+    'OR': '{a} | {b}',
+    'XOR': '{a} ^ {b}',
+    'SRL': '{a} >> {b}',
+    'SRA': '(_sint({a}) >> {b}) & MASK',
+}
+
+_GLOBALS = {
+    'MASK': MASK,
+    '_sint': _sint,
+    '_load': _load,
+    '_store': _store,
+    **{f'_op_{name}': f for name, f in ALU_OPS.items()},
+    **{f'_bit_{name}': f for name, f in BIT_OPS.items()},
+}
+
+
+class BlockTranslator:
+    '''
+    Runs a program on a NativeR32I a basic block at a time.
+
+    program is indexed by an int pc (see util.run_loop), regs is the
+    register file of the underlying NativeR32I.  At most max_blocks blocks
+    of at most max_block_length instructions are kept (least recently used
+    are evicted first).
+    '''
+    def __init__(self, sim, program, max_blocks=1024, max_block_length=64):
+        if max_blocks <= 0:
+            raise ValueError('max_blocks must be positive')
+        if max_block_length <= 0:
+            raise ValueError('max_block_length must be positive')
+        self.native = NativeR32I(sim)
+        self.program = program
+        self.max_blocks = max_blocks
+        self.max_block_length = max_block_length
+        self.hits = 0
+        self.misses = 0
+        self._blocks = OrderedDict()
+
+    @property
+    def regs(self):
+        return self.native.regs
+
+    @property
+    def memory(self):
+        return self.native.memory
+
+    def cache_info(self) -> CacheInfo:
+        return CacheInfo(self.hits, self.misses, self.max_blocks, len(self._blocks))
+
+    def write(self, pc: int, inst):
+        self.program[pc] = inst
+        self.invalidate(pc)
+
+    def invalidate(self, pc=None):
+        '''
+        Drop all blocks containing pc (all blocks if pc is None).  Blocks
+        ending at pc are dropped too as a block cut short at the end of the
+        program would otherwise not grow when pc is written.
+        '''
+        if pc is None:
+            self._blocks.clear()
+            return
+        stale = [start for start, block in self._blocks.items()
+                 if block.start <= pc <= block.end]
+        for start in stale:
+            del self._blocks[start]
+
+    def lookup(self, pc: int):
+        '''
+        Returns the block starting at pc or None if pc is not in the program.
+        '''
+        blocks = self._blocks
+        try:
+            block = blocks[pc]
+        except KeyError:
+            self.misses += 1
+            block = self.translate(pc)
+            if block is None:
+                return None
+            blocks[pc] = block
+            if len(blocks) > self.max_blocks:
+                blocks.popitem(last=False)
+        else:
+            self.hits += 1
+            blocks.move_to_end(pc)
+        return block
+
+    def translate(self, start: int):
+        '''
+        Compiles the block starting at start, returns None if start is not in
+        the program.  Does not touch the cache.
+        '''
+        decode = self.native.decode
+        program = self.program
+
+        body = []
+        read = set()
+        written = set()
+
+        def reg(idx):
+            if idx == 0:
+                return '0'
+            if idx not in written:
+                read.add(idx)
+            return f'x{idx}'
+
+        pc = start
+        length = 0
+        pc_next = None
+        while pc_next is None:
+            try:
+                inst = program[pc]
+            except (IndexError, KeyError):
+                if length == 0:
+                    return None
+                break
+            (rs1, rs2, rd, imm, use_imm, use_pc, op, bit_op,
+                mask_lsb, is_branch, is_jump, cmp_zero, invert, load, store) = decode(inst, pc)
+
+            if use_pc:
+                a = str(pc)
+            elif bit_op is not None:
+                a = f'_bit_{_BIT_NAMES[bit_op]}({reg(rs1)})'
+            else:
+                a = reg(rs1)
+
+            if use_imm:
+                b = str(imm)
+            else:
+                b = reg(rs2)
+
+            if a.isdigit() and b.isdigit():
+                c = str(op(int(a), int(b)))
+            else:
+                name = _OP_NAMES[op]
+                try:
+                    c = _EXPRS[name].format(a=a, b=b)
+                except KeyError:
+                    c = f'_op_{name}({a}, {b})'
+
+            if mask_lsb:
+                c = f'({c}) & {MASK & ~1}'
+
+            fallthrough = (pc + 4) & MASK
+            if is_branch:
+                if cmp_zero:
+                    cond = f'({c}) == 0'
+                else:
+                    cond = f'({c}) & 1'
+                if invert:
+                    cond = f'not ({cond})'
+                taken = (pc + imm) & MASK
+                body.append(f'pc_next = {taken} if {cond} else {fallthrough}')
+                pc_next = 'pc_next'
+            elif is_jump:
+                body.append(f'pc_next = {c}')
+                if rd:
+                    body.append(f'x{rd} = {fallthrough}')
+                    written.add(rd)
+                pc_next = 'pc_next'
+            elif store is not None:
+                body.append(f'_store(mem, {c}, {reg(rs2)}, {store})')
+            elif load is not None:
+                if rd:
+                    body.append(f'x{rd} = _load(mem, {c}, {load[0]}, {load[1]})')
+                    written.add(rd)
+            elif rd:
+                body.append(f'x{rd} = {c}')
+                written.add(rd)
+
+            length += 1
+            pc = fallthrough
+            if length == self.max_block_length:
+                break
+
+        if pc_next is None:
+            pc_next = str(pc)
+
+        lines = [f'def _block(r, mem):']
+        lines.extend(f'    x{idx} = r[{idx}]' for idx in sorted(read))
+        lines.extend(f'    {line}' for line in body)
+        lines.extend(f'    r[{idx}] = x{idx}' for idx in sorted(written))
+        lines.append(f'    return {pc_next}')
+        source = '\n'.join(lines)
+
+        ns = dict(_GLOBALS)
+        exec(compile(source, f'<block {start:#x}>', 'exec'), ns)
+        return Block(start, start + 4*length, length, ns['_block'], source)
+
+    def run(self, pc: int, max_steps=None) -> RunResult:
+        '''
+        Same as util.run_loop but a block at a time.  If the next block would
+        exceed max_steps the remaining instructions are run one at a time.
+        '''
+        if max_steps is not None and max_steps < 0:
+            raise ValueError('max_steps must be non-negative')
+        regs = self.regs
+        memory = self.native.memory
+        lookup = self.lookup
+        retired = 0
+        start = time.perf_counter()
+        while True:
+            block = lookup(pc)
+            if block is None:
+                break
+            if max_steps is not None and retired + block.length > max_steps:
+                result = run_loop(self.native, self.program, pc, max_steps - retired)
+                pc = result.pc
+                retired += result.retired
+                break
+            pc_next = block.fn(regs, memory)
+            retired += block.length
+            if pc_next == block.end - 4:
+                # jump to self
+                pc = pc_next
+                break
+            pc = pc_next
+        return RunResult(pc, retired, time.perf_counter() - start)
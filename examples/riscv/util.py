@@ -1,7 +1,92 @@
+from collections import namedtuple, OrderedDict
+import time
+
 from hwtypes import modifiers
 
 Initial = modifiers.make_modifier('Initial', cache=True)
 
 
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
+
+class DecodeCache:
+    '''
+    LRU memoization of a Decode peak (python family only).
+
+    Decode is a pure function of the instruction (pc is accepted but never
+    read) so its output can be reused whenever the same instruction is
+    executed again.  Instructions are hashed structurally, two equal
+    instructions share an entry.  Cached instructions must not be mutated.
+    '''
+    def __init__(self, decode, maxsize=1024):
+        if maxsize <= 0:
+            raise ValueError('maxsize must be positive')
+        self.decode = decode
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+
+    def __call__(self, inst, pc):
+        cache = self._cache
+        try:
+            decoded = cache[inst]
+        except KeyError:
+            self.misses += 1
+            decoded = cache[inst] = self.decode(inst, pc)
+            if len(cache) > self.maxsize:
+                cache.popitem(last=False)
+        else:
+            self.hits += 1
+            cache.move_to_end(inst)
+        return decoded
+
+    def cache_info(self) -> CacheInfo:
+        return CacheInfo(self.hits, self.misses, self.maxsize, len(self._cache))
+
+    def cache_clear(self):
+        self.hits = 0
+        self.misses = 0
+        self._cache.clear()
+
+
+def cache_decode(cpu, maxsize=1024) -> DecodeCache:
+    '''
+    Opt a simulator instance in to decode caching.
+    Returns the cache so hit / miss counts can be inspected.
+    '''
+    if isinstance(cpu.Decode, DecodeCache):
+        raise ValueError('Decode is already cached')
+    cpu.Decode = cache = DecodeCache(cpu.Decode, maxsize)
+    return cache
+
+
+RunResult = namedtuple('RunResult', ['pc', 'retired', 'time'])
+
 
+def run_loop(cpu, program, pc, max_steps=None) -> RunResult:
+    '''
+    Steps cpu over program starting at pc.  program[pc] is indexed with the
+    pc as an int (e.g. a loader.Program or a dict) and raises IndexError or
+    KeyError outside of the program.
 
+    Halts when pc leaves the program, on a jump to self (e.g. `j .`) or
+    after max_steps instructions.  time is the wall time in seconds.
+    '''
+    if max_steps is not None and max_steps < 0:
+        raise ValueError('max_steps must be non-negative')
+    fetch = program.__getitem__
+    limit = -1 if max_steps is None else max_steps
+    retired = 0
+    start = time.perf_counter()
+    while retired != limit:
+        try:
+            inst = fetch(int(pc))
+        except (IndexError, KeyError):
+            break
+        pc_next = cpu(inst, pc)
+        retired += 1
+        if pc_next == pc:
+            break
+        pc = pc_next
+    return RunResult(pc, retired, time.perf_counter() - start)
@@ -1,10 +1,22 @@
 from ..riscv.asm import *
+from ..asmgen import fields, generate, product as _product, variant as _variant
 from .isa import ISA_fc
 
 isa = ISA_fc.Py
 
 
+# Types and tags shared by the constructors
+ASM_PRELUDE = '''\
+_Inst = isa.Inst
+_Ext = isa.Ext
+_E = isa.E
+_Idx = isa.Idx
+_IDX = tuple(_Idx(i) for i in range(1 << _Idx.size))
+'''
+
 ASM_TEMPLATE = '''\
+_{inst_name}_TAG = isa.BitInst.{inst_name}
+
 def asm_{inst_name}(rs=None, rd=None, rs1=None):
     if rd is None:
         raise ValueError('rd is required')
@@ -12,14 +24,27 @@ def asm_{inst_name}(rs=None, rd=None, rs1=None):
     if (rs is None) == (rs1 is None):
         raise ValueError('exactly one rs and rs1 is required')
 
-    rs = isa.Idx(rs if rs1 is None else rs1)
-    rd = isa.Idx(rd)
+    rs = _Idx(rs if rs1 is None else rs1)
+    rd = _Idx(rd)
+
+    data = _E(rd=rd, rs=rs)
 
-    data = isa.E(rd=rd, rs=rs)
-    tag = isa.BitInst.{inst_name}
+    return _Inst(_Ext(data, _{inst_name}_TAG))
 
-    return isa.Inst(isa.Ext(data, tag))
+def fast_{inst_name}(rs=None, rd=None, rs1=None):
+    rs = rs if rs1 is None else rs1
+    data = _product(_E, {E_FIELDS})
+    return _variant(_Inst, _product(_Ext, {EXT_FIELDS}))
 '''
 
+_source = [ASM_PRELUDE]
 for inst_name in isa.BitInst._field_table_:
-    exec(ASM_TEMPLATE.format(inst_name=inst_name))
+    _source.append(ASM_TEMPLATE.format(
+        inst_name=inst_name,
+        E_FIELDS=fields(isa.E, rd='_IDX[rd]', rs='_IDX[rs]'),
+        EXT_FIELDS=fields(isa.Ext, data='data', tag=f'_{inst_name}_TAG'),
+    ))
+
+# defines asm_<inst> and fast_<inst> for every instruction
+generate(globals(), '\n\n'.join(_source))
+del _source
@@ -3,8 +3,20 @@ from ast_tools.passes import loop_unroll
 
 
 PyFamily = family.PyFamily
+ArrayPyFamily = family.ArrayPyFamily
 
 class SMTFamily(family.SMTFamily):
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, bit_counter_tree=True, **kwargs):
         super().__init__(*args, **kwargs)
         self._passes = loop_unroll(), *self._passes
+        # R32I uses the log depth BitCounterTree_fc, or the fully unrolled
+        # BitCounter_fc if False
+        self.bit_counter_tree = bit_counter_tree
+
+    # Family closures are memoized by family, families with different
+    # bit counters must not share their peaks
+    def __eq__(self, other):
+        return type(self) is type(other) and self.bit_counter_tree == other.bit_counter_tree
+
+    def __hash__(self):
+        return hash((type(self), self.bit_counter_tree))
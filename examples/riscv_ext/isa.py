@@ -11,7 +11,8 @@ from ..riscv import isa
 
 @family_closure(family)
 def ISA_fc(family):
-    ns = isa.ISA_fc(family)
+    # copy as the riscv namespace is shared (family closures are memoized)
+    ns = SimpleNamespace(**vars(isa.ISA_fc(family)))
 
     class E(Product):
         rd = ns.Idx
@@ -35,4 +36,28 @@ def ISA_fc(family):
     # replace Inst
     ns.Inst = Sum[ns.OP, ns.OP_IMM, ns.LUI, ns.AUIPC, ns.JAL, ns.JALR, ns.Branch, ns.Load, ns.Store, Ext]
 
+    # replace _DecodeOut, the bit counter sits in front of the ALU
+    class _DecodeOut(Product):
+        rs1 = ns.Idx
+        rs2 = ns.Idx
+        rd = ns.Idx
+        imm = ns.Word
+        use_imm = ns.Bit
+        use_pc = ns.Bit
+        exec_inst= ns.AluInst
+        bit_inst = BitInst
+        mask_lsb = ns.Bit
+        is_ext = ns.Bit
+        is_branch = ns.Bit
+        is_jump = ns.Bit
+        cmp_zero = ns.Bit
+        invert = ns.Bit
+        is_load = ns.Bit
+        is_store = ns.Bit
+        # log2 of the access size in bytes
+        mem_size = ns.BitVector[2]
+        mem_signed = ns.Bit
+
+    ns._DecodeOut = _DecodeOut
+
     return ns
@@ -5,6 +5,7 @@ from peak import Peak, name_outputs, family_closure, Const
 
 from .isa import ISA_fc
 from .util import Initial
+from ..riscv.util import run_loop
 from . import family
 
 
@@ -21,41 +22,45 @@ def R32I_fc(family):
 
     isa = ISA_fc.Py
     RegisterFile = family.get_register_file()
-    BitCounter = BitCounter_fc(family)
+    Memory = family.get_memory()
+    MemSize = BitVector[2]
+    BitCounter = _bit_counter(family)
 
     ExecInst = family.get_constructor(isa.AluInst)
+    BitInst = family.get_constructor(isa.BitInst)
+    DecodeOut = family.get_constructor(isa._DecodeOut)
 
     @family.assemble(locals(), globals())
-    class R32I(Peak):
-        def __init__(self):
-            self.register_file = RegisterFile()
-            self.bitcounter = BitCounter()
-
-        @name_outputs(pc_next=isa.Word)
+    class Decode(Peak):
         def __call__(self,
-                     inst: isa.Inst,
-                     pc: isa.Word) -> isa.Word:
-            # Decode
-            # Inputs:
-            #   inst, pc
-            # Outputs:
-            #   a, b, exec_inst, rd
-            #   lsb_mask, is_branch, is_jump
-            #   branch_offset, cmp_zero, invert,
-            lsb_mask = Word(-1)
+                inst: isa.Inst,
+                pc: isa.Word,
+                ) -> isa._DecodeOut:
+
+            use_imm = Bit(0)
+            use_pc = Bit(0)
+            mask_lsb = Bit(0)
+            is_ext = Bit(0)
             is_branch = Bit(0)
             is_jump = Bit(0)
-            branch_offset = Word(0)
             cmp_zero = Bit(0)
             invert = Bit(0)
+            is_load = Bit(0)
+            is_store = Bit(0)
+            mem_size = MemSize(0)
+            mem_signed = Bit(0)
 
             # Note rd != 0 is implicit enable
             rd = Idx(0)
+            rs1 = Idx(0)
+            rs2 = Idx(0)
+            imm = Word(0)
+            bit_inst = BitInst(isa.BitInst.POPCNT)
 
             if inst[isa.OP].match:
                 op_inst = inst[isa.OP].value
-                a = self.register_file.load1(op_inst.data.rs1)
-                b = self.register_file.load2(op_inst.data.rs2)
+                rs1 = op_inst.data.rs1
+                rs2 = op_inst.data.rs2
                 exec_inst = op_inst.tag
                 rd = op_inst.data.rd
 
@@ -69,56 +74,58 @@ def R32I_fc(family):
                     # radically increase its complexity.
                     assert op_imm_arith_inst.tag != isa.ArithInst.SUB
 
-                    a = self.register_file.load1(op_imm_arith_inst.data.rs1)
-                    b = op_imm_arith_inst.data.imm.sext(20)
+                    rs1 = op_imm_arith_inst.data.rs1
+                    imm = op_imm_arith_inst.data.imm.sext(20)
+                    use_imm = Bit(1)
                     exec_inst = ExecInst(arith=op_imm_arith_inst.tag)
                     rd = op_imm_arith_inst.data.rd
 
                 else:
                     assert op_imm_inst.shift.match
                     op_imm_shift_inst = op_imm_inst.shift.value
-                    a = self.register_file.load1(op_imm_shift_inst.data.rs1)
-                    b = op_imm_shift_inst.data.imm.zext(27)
+                    rs1 = op_imm_shift_inst.data.rs1
+                    imm = op_imm_shift_inst.data.imm.zext(27)
+                    use_imm = Bit(1)
                     exec_inst = ExecInst(shift=op_imm_shift_inst.tag)
                     rd = op_imm_shift_inst.data.rd
 
             elif inst[isa.LUI].match:
                 lui_inst = inst[isa.LUI].value.data
-                a = Word(0)
-                b = lui_inst.imm.sext(12) << 12
+                imm = lui_inst.imm.sext(12) << 12
                 rd = lui_inst.rd
                 exec_inst = ExecInst(arith=isa.ArithInst.ADD)
+                use_imm = Bit(1)
 
             elif inst[isa.AUIPC].match:
                 auipc_inst = inst[isa.AUIPC].value.data
-                a = pc
-                b = auipc_inst.imm.sext(12) << 12
+                use_pc = Bit(1)
+                imm = auipc_inst.imm.sext(12) << 12
                 rd = auipc_inst.rd
                 exec_inst = ExecInst(arith=isa.ArithInst.ADD)
 
             elif inst[isa.JAL].match:
                 is_jump = Bit(1)
                 jal_inst = inst[isa.JAL].value.data
-                a = pc
-                b = jal_inst.imm.sext(12) << 1
+                use_pc = Bit(1)
+                imm = jal_inst.imm.sext(12) << 1
                 rd = jal_inst.rd
                 exec_inst = ExecInst(arith=isa.ArithInst.ADD)
 
             elif inst[isa.JALR].match:
                 is_jump = Bit(1)
-                lsb_mask = ~Word(1)
+                mask_lsb = Bit(1)
                 jalr_inst = inst[isa.JALR].value.data
-                a = self.register_file.load1(jalr_inst.rs1)
-                b = jalr_inst.imm.sext(20)
+                rs1 = jalr_inst.rs1
+                imm = jalr_inst.imm.sext(20)
                 rd = jalr_inst.rd
                 exec_inst = ExecInst(arith=isa.ArithInst.ADD)
 
             elif inst[isa.Branch].match:
                 is_branch = Bit(1)
                 branch_inst = inst[isa.Branch].value
-                a = self.register_file.load1(branch_inst.data.rs1)
-                b = self.register_file.load2(branch_inst.data.rs2)
-                branch_offset = branch_inst.data.imm.sext(20) << 1
+                rs1 = branch_inst.data.rs1
+                rs2 = branch_inst.data.rs2
+                imm = branch_inst.data.imm.sext(20) << 1
 
                 # hand coded common sub-expr elimin
                 is_eq = branch_inst.tag == isa.BranchInst.BEQ
@@ -144,28 +151,85 @@ def R32I_fc(family):
                     invert = cmp_ge
 
             elif inst[isa.Load].match:
-                a = Word(0)
-                b = Word(0)
+                is_load = Bit(1)
+                load_inst = inst[isa.Load].value
+                # No 64 bit loads on a 32 bit machine
+                assert load_inst.tag != isa.LoadInst.LD
+                rs1 = load_inst.data.rs1
+                imm = load_inst.data.imm.sext(20)
+                use_imm = Bit(1)
+                rd = load_inst.data.rd
+                # address calculation
                 exec_inst = ExecInst(arith=isa.ArithInst.ADD)
+
+                is_lb = load_inst.tag == isa.LoadInst.LB
+                is_lh = load_inst.tag == isa.LoadInst.LH
+                mem_signed = is_lb | is_lh
+                if is_lb | (load_inst.tag == isa.LoadInst.LBU):
+                    mem_size = MemSize(0)
+                elif is_lh | (load_inst.tag == isa.LoadInst.LHU):
+                    mem_size = MemSize(1)
+                else:
+                    # LW / LWU are the same on a 32 bit machine
+                    mem_size = MemSize(2)
+
             elif inst[isa.Store].match:
-                a = Word(0)
-                b = Word(0)
+                is_store = Bit(1)
+                store_inst = inst[isa.Store].value
+                assert store_inst.tag != isa.StoreInst.SD
+                rs1 = store_inst.data.rs1
+                rs2 = store_inst.data.rs2
+                imm = store_inst.data.imm.sext(20)
+                use_imm = Bit(1)
+                # address calculation
                 exec_inst = ExecInst(arith=isa.ArithInst.ADD)
+
+                if store_inst.tag == isa.StoreInst.SB:
+                    mem_size = MemSize(0)
+                elif store_inst.tag == isa.StoreInst.SH:
+                    mem_size = MemSize(1)
+                else:
+                    mem_size = MemSize(2)
+
             else:
                 assert inst[isa.Ext].match
                 ext_inst = inst[isa.Ext].value
-                _val = self.register_file.load1(ext_inst.data.rs)
+                is_ext = Bit(1)
+                rs1 = ext_inst.data.rs
                 rd = ext_inst.data.rd
-                a = self.bitcounter(ext_inst.tag, _val)
-                b = Word(0)
+                bit_inst = ext_inst.tag
+                # pass the count through the ALU: cnt + 0
+                use_imm = Bit(1)
                 exec_inst = ExecInst(arith=isa.ArithInst.ADD)
+            return DecodeOut(
+                rs1 = rs1,
+                rs2 = rs2,
+                rd = rd,
+                imm = imm,
+                use_imm = use_imm,
+                use_pc = use_pc,
+                exec_inst = exec_inst,
+                bit_inst = bit_inst,
+                mask_lsb = mask_lsb,
+                is_ext = is_ext,
+                is_branch = is_branch,
+                is_jump = is_jump,
+                cmp_zero = cmp_zero,
+                invert = invert,
+                is_load = is_load,
+                is_store = is_store,
+                mem_size = mem_size,
+                mem_signed = mem_signed,
+            )
 
-            # Execute
-            # Inputs:
-            #   a, b, exec_inst, lsb_mask, branch_offset
-            # Outputs:
-            #  c, branch_target
-            branch_target = pc + branch_offset
+
+    @family.assemble(locals(), globals())
+    class ALU(Peak):
+        def __call__(self,
+                exec_inst: isa.AluInst,
+                a: isa.Word,
+                b: isa.Word,
+            ) -> isa.Word:
             if exec_inst.arith.match:
                 arith_inst = exec_inst.arith.value
                 if arith_inst == isa.ArithInst.ADD:
@@ -193,17 +257,87 @@ def R32I_fc(family):
                 else:
                     assert shift_inst == isa.ShiftInst.SRA
                     c = a.bvashr(b)
+            return c
+
+
+    @family.assemble(locals(), globals())
+    class R32I(Peak):
+        def __init__(self):
+            self.register_file = RegisterFile()
+            self.memory = Memory()
+            self.Decode = Decode()
+            self.ALU = ALU()
+            self.bitcounter = BitCounter()
+
+        @name_outputs(pc_next=isa.Word)
+        def __call__(self,
+                     inst: isa.Inst,
+                     pc: isa.Word) -> isa.Word:
+            # Decode
+            decoded = self.Decode(inst, pc)
+
+            # unpack
+            rs1 = decoded.rs1
+            rs2 = decoded.rs2
+            rd = decoded.rd
+            imm = decoded.imm
+            use_imm = decoded.use_imm
+            use_pc = decoded.use_pc
+            exec_inst = decoded.exec_inst
+            bit_inst = decoded.bit_inst
+            mask_lsb = decoded.mask_lsb
+            is_ext = decoded.is_ext
+            is_branch = decoded.is_branch
+            is_jump = decoded.is_jump
+            cmp_zero = decoded.cmp_zero
+            invert = decoded.invert
+            is_load = decoded.is_load
+            is_store = decoded.is_store
+            mem_size = decoded.mem_size
+            mem_signed = decoded.mem_signed
+
+            a = self.register_file.load1(rs1)
+            b = self.register_file.load2(rs2)
+            st_data = b
+
+            if is_ext:
+                a = self.bitcounter(bit_inst, a)
+
+            if use_pc:
+                a = pc
+
+            if use_imm:
+                b = imm
+
+
+            # Execute
+            c = self.ALU(exec_inst, a, b)
+
+            if mask_lsb:
+                c = BitVector[1](0).concat(c[1:]) # clear bottom bit for jalr
+
+
+            # Memory
+            # store is always called, is_store is its enable
+            self.memory.store(c, st_data, mem_size, is_store)
+            if is_load:
+                ld_data = self.memory.load(c, mem_size)
+                # move the loaded bytes to the top of the word and shift
+                # them back down to sign / zero extend
+                shamt = Word(32) - (Word(8) << mem_size.zext(30))
+                ld_data = ld_data.bvshl(shamt)
+                if mem_signed:
+                    ld_data = ld_data.bvashr(shamt)
+                else:
+                    ld_data = ld_data.bvlshr(shamt)
+                c = ld_data
 
-            c = c & lsb_mask # clear bottom bit for jalr
 
             # Commit
-            # Inputs:
-            #   pc, rd, c, is_branch, is_jump
-            #   branch_target, cmp_zero, invert
-            # Outputs:
-            #   pc_next
             assert not (is_jump & is_branch)
-            pc_next = pc+4
+
+            pc_next = pc + 4
+            branch_target = pc + imm
             if is_branch:
                 out = Word(0)
                 if cmp_zero:
@@ -224,6 +358,10 @@ def R32I_fc(family):
 
             self.register_file.store(rd, out)
             return pc_next
+
+        def run(self, program, pc, max_steps=None):
+            # See util.run_loop, returns RunResult(pc, retired, time)
+            return run_loop(self, program, pc, max_steps)
     return R32I
 
 
@@ -279,6 +417,49 @@ def BitCounter_fc(family):
     return BitCounter
 
 
+@family_closure(family)
+def BitCounterTree_fc(family):
+    isa = ISA_fc.Py
+    Word = family.Word
+
+    @family.assemble(locals(), globals())
+    class BitCounter(Peak):
+        # Same as BitCounter_fc but CNTLZ / CNTTZ are computed as the
+        # popcount of the bits below the leading / trailing one so all
+        # three share a single log depth popcount
+        def __call__(self, inst: isa.BitInst, val: isa.Word) -> isa.Word:
+            if inst == isa.BitInst.POPCNT:
+                x = val
+            elif inst == isa.BitInst.CNTLZ:
+                # smear the leading one to the right
+                x = val | (val >> 1)
+                x = x | (x >> 2)
+                x = x | (x >> 4)
+                x = x | (x >> 8)
+                x = x | (x >> 16)
+                x = ~x
+            else:
+                assert inst == isa.BitInst.CNTTZ
+                x = ~val & (val - 1)
+
+            x = x - ((x >> 1) & 0x55555555)
+            x = (x & 0x33333333) + ((x >> 2) & 0x33333333)
+            x = (x + (x >> 4)) & 0x0f0f0f0f
+            x = x + (x >> 8)
+            x = x + (x >> 16)
+            return x & 0x3f
+
+    return BitCounter
+
+
+def _bit_counter(family):
+    # The python models use the reference BitCounter, SMT models the log
+    # depth one unless the family sets bit_counter_tree to False
+    if getattr(family, 'bit_counter_tree', False):
+        return BitCounterTree_fc(family)
+    return BitCounter_fc(family)
+
+
 @family_closure(family)
 def R32I_mappable_fc(family):
     R32I = R32I_fc(family)
@@ -291,20 +472,27 @@ def R32I_mappable_fc(family):
         def __init__(self):
             self.riscv = R32I()
 
-        @name_outputs(pc_next=isa.Word, rd=isa.Word)
+        # The memory is exposed through its ports: loads return ld_data and
+        # stores drive the st_ outputs (st_en is 0 if nothing is stored)
+        @name_outputs(pc_next=isa.Word, rd=isa.Word, st_addr=isa.Word,
+                      st_data=isa.Word, st_size=isa.BitVector[2], st_en=isa.Bit)
         def __call__(self,
                      inst: Const(isa.Inst),
                      pc: isa.Word,
                      rs1: isa.Word,
                      rs2: isa.Word,
                      rd: Initial(isa.Word),
-                     ) -> (isa.Word, isa.Word):
+                     ld_data: isa.Word,
+                     ) -> (isa.Word, isa.Word, isa.Word, isa.Word, isa.BitVector[2], isa.Bit):
 
             self._set_rs1_(rs1)
             self._set_rs2_(rs2)
             self._set_rd_(rd)
+            self._set_ld_data_(ld_data)
             pc_next = self.riscv(inst, pc)
-            return pc_next, self.riscv.register_file.rd
+            memory = self.riscv.memory
+            return (pc_next, self.riscv.register_file.rd,
+                    memory.st_addr, memory.st_data, memory.st_size, memory.st_en)
 
         def _set_rs1_(self, rs1):
             self.riscv.register_file._set_rs1_(rs1)
@@ -315,6 +503,9 @@ def R32I_mappable_fc(family):
         def _set_rd_(self, rd):
             self.riscv.register_file._set_rd_(rd)
 
+        def _set_ld_data_(self, ld_data):
+            self.riscv.memory._set_ld_data_(ld_data)
+
     return R32I_mappable
 
 
@@ -330,20 +521,26 @@ def R32I_mappable_no_pc_fc(family):
         def __init__(self):
             self.riscv = R32I()
 
-        @name_outputs(rd=isa.Word)
+        # see R32I_mappable_fc for the memory ports
+        @name_outputs(rd=isa.Word, st_addr=isa.Word, st_data=isa.Word,
+                      st_size=isa.BitVector[2], st_en=isa.Bit)
         def __call__(self,
                      inst: Const(isa.Inst),
                      rs1: isa.Word,
                      rs2: isa.Word,
-                     ) -> isa.Word:
+                     ld_data: isa.Word,
+                     ) -> (isa.Word, isa.Word, isa.Word, isa.BitVector[2], isa.Bit):
 
             pc = Word(0)
             rd = Word(0x5555)
             self._set_rs1_(rs1)
             self._set_rs2_(rs2)
             self._set_rd_(rd)
+            self._set_ld_data_(ld_data)
             pc_next = self.riscv(inst, pc)
-            return self.riscv.register_file.rd
+            memory = self.riscv.memory
+            return (self.riscv.register_file.rd,
+                    memory.st_addr, memory.st_data, memory.st_size, memory.st_en)
 
         def _set_rs1_(self, rs1):
             self.riscv.register_file._set_rs1_(rs1)
@@ -354,4 +551,7 @@ def R32I_mappable_no_pc_fc(family):
         def _set_rd_(self, rd):
             self.riscv.register_file._set_rd_(rd)
 
+        def _set_ld_data_(self, ld_data):
+            self.riscv.memory._set_ld_data_(ld_data)
+
     return R32I_mappable
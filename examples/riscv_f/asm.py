@@ -3,78 +3,85 @@ import typing as tp
 
 from hwtypes.adt import TaggedUnion
 
+from ..asmgen import fields, generate, product as _product, tagged as _tagged, variant as _variant
 from .isa import ISA_fc
 
 isa = ISA_fc.Py
 
+# Types and tags shared by the constructors
+ASM_PRELUDE = '''\
+_Inst = isa.Inst
+_OP = isa.OP
+_OP_IMM = isa.OP_IMM
+_R = isa.R
+_Idx = isa.Idx
+_IDX = tuple(_Idx(i) for i in range(1 << _Idx.size))
+_OP_IMM_arith = _tagged(_OP_IMM, 'arith')
+_OP_IMM_shift = _tagged(_OP_IMM, 'shift')
+'''
+
 ASM_TEMPLATE = '''\
+_{INST_NAME}_IMM = isa.{TAG_T}.{IMM_NAME}
+_{INST_NAME}_ALU = isa.AluInst({TAG_KW}=isa.{TAG_T}.{INST_NAME})
+
 def asm_{INST_NAME}(rs1, rd, rs2=None, imm=None):
     if imm is not None and rs2 is not None:
         raise ValueError('May not specify both rs2 and imm')
     elif imm is None and rs2 is None:
         raise ValueError('Must specify either rs2 or imm')
 
-    rs1 = isa.Idx(rs1)
-    rd = isa.Idx(rd)
+    rs1 = _Idx(rs1)
+    rd = _Idx(rd)
     if imm is not None:
-        imm = isa.{LAYOUT}.imm(imm)
-        data = isa.{LAYOUT}(rs1=rs1, rd=rd, imm=imm)
-        T = lambda data, tag: isa.OP_IMM({TAG_KW}=isa.{OP_T}(data, tag))
-        tag = isa.{TAG_T}.{INST_NAME}
-    else:
-        rs2 = isa.Idx(rs2)
-        data = isa.R(rs1=rs1, rs2=rs2, rd=rd)
-        T = isa.OP
-        tag = isa.AluInst({TAG_KW}=isa.{TAG_T}.{INST_NAME})
-    return isa.Inst(T(data, tag))
+        data = isa.{LAYOUT}(rs1=rs1, rd=rd, imm={IMM_NEG}isa.{LAYOUT}.imm(imm))
+        return _Inst(_OP_IMM({TAG_KW}=isa.{OP_T}(data, _{INST_NAME}_IMM)))
+    data = _R(rs1=rs1, rs2=_Idx(rs2), rd=rd)
+    return _Inst(_OP(data, _{INST_NAME}_ALU))
+
+def fast_{INST_NAME}(rs1, rd, rs2=None, imm=None):
+    if imm is not None:
+        data = _product(isa.{LAYOUT}, {IMM_FIELDS})
+        return _variant(_Inst, _OP_IMM_{TAG_KW}(_product(isa.{OP_T}, {IMM_INST})))
+    data = _product(_R, {REG_FIELDS})
+    return _variant(_Inst, _product(_OP, {REG_INST}))
 '''
 
 
-for inst_name in isa.ArithInst._field_table_:
-    if inst_name == 'SUB':
-        continue
-    f_str = ASM_TEMPLATE.format(
+def _format(inst_name, layout, op_t, tag_t, tag_kw, imm_name=None, imm_neg=''):
+    imm_name = imm_name or inst_name
+    return ASM_TEMPLATE.format(
             INST_NAME=inst_name,
-            LAYOUT='I',
-            OP_T='OP_IMM_A',
-            TAG_T='ArithInst',
-            TAG_KW='arith',
+            IMM_NAME=imm_name,
+            IMM_NEG=imm_neg,
+            LAYOUT=layout,
+            OP_T=op_t,
+            TAG_T=tag_t,
+            TAG_KW=tag_kw,
+            IMM_FIELDS=fields(getattr(isa, layout),
+                rd='_IDX[rd]', rs1='_IDX[rs1]', imm=f'{imm_neg}isa.{layout}.imm(imm)'),
+            IMM_INST=fields(getattr(isa, op_t), data='data', tag=f'_{inst_name}_IMM'),
+            REG_FIELDS=fields(isa.R, rd='_IDX[rd]', rs1='_IDX[rs1]', rs2='_IDX[rs2]'),
+            REG_INST=fields(isa.OP, data='data', tag=f'_{inst_name}_ALU'),
         )
-    exec(f_str)
 
 
-for inst_name in isa.ShiftInst._field_table_:
-    f_str = ASM_TEMPLATE.format(
-            INST_NAME=inst_name,
-            LAYOUT='Is',
-            OP_T='OP_IMM_S',
-            TAG_T='ShiftInst',
-            TAG_KW='shift',
-        )
+_source = [ASM_PRELUDE]
+for inst_name in isa.ArithInst._field_table_:
+    if inst_name == 'SUB':
+        # there is no SUBI instruction, assemble ADDI of -imm
+        _source.append(_format(inst_name, 'I', 'OP_IMM_A', 'ArithInst', 'arith',
+                               imm_name='ADD', imm_neg='-'))
+    else:
+        _source.append(_format(inst_name, 'I', 'OP_IMM_A', 'ArithInst', 'arith'))
 
-    exec(f_str)
 
+for inst_name in isa.ShiftInst._field_table_:
+    _source.append(_format(inst_name, 'Is', 'OP_IMM_S', 'ShiftInst', 'shift'))
 
-# special case asm_SUB because there is no SUBI instruction
-def asm_SUB(rs1, rd, rs2=None, imm=None):
-    if imm is not None and rs2 is not None:
-        raise ValueError('May not specify both rs2 and imm')
-    elif imm is None and rs2 is None:
-        raise ValueError('Must specify either rs2 or imm')
 
-    rs1 = isa.Idx(rs1)
-    rd = isa.Idx(rd)
-    if imm is not None:
-        imm = -isa.I.imm(imm)
-        data = isa.I(rs1=rs1, rd=rd, imm=imm)
-        T = lambda data, tag: isa.OP_IMM(arith=isa.OP_IMM_A(data, tag))
-        tag = isa.ArithInst.ADD
-    else:
-        rs2 = isa.Idx(rs2)
-        data = isa.R(rs1=rs1, rs2=rs2, rd=rd)
-        T = isa.OP
-        tag = isa.AluInst(arith=isa.ArithInst.SUB)
-    return isa.Inst(T(data, tag))
+# defines asm_<inst> and fast_<inst> for every instruction
+generate(globals(), '\n\n'.join(_source))
+del _source
 
 
 _LAYOUT_T = tp.Union[isa.R, isa.I, isa.Is, isa.S, isa.U, isa.B, isa.J]
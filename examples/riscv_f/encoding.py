@@ -0,0 +1,11 @@
+from ..riscv.encoding import InstCodec
+from .isa import ISA_fc
+
+isa = ISA_fc.Py
+
+
+codec = InstCodec(isa)
+encode = codec.encode
+decode = codec.decode
+encode_all = codec.encode_all
+decode_all = codec.decode_all
@@ -3,6 +3,9 @@ from peak import family
 
 from ast_tools.passes import remove_asserts
 
+from ..regfile import array_register_file
+from ..riscv import family as riscv_family
+
 
 # A bit of hack putting the def of word and idx here
 # and not isa but it makes life easier
@@ -15,8 +18,25 @@ class _RiscFamily_mixin:
     def Idx(self):
         return self.BitVector[5]
 
+    # see PyFamily
+    native_float = False
+
 
 class PyFamily(_RiscFamily_mixin, family.PyFamily):
+    def __init__(self, *args, native_float=False, **kwargs):
+        super().__init__(*args, **kwargs)
+        # R32I runs RNE float ops on host binary32 arithmetic where it
+        # matches the soft-float units (NativeFPU, see native_float)
+        self.native_float = native_float
+
+    # Family closures are memoized by family, the native and soft-float
+    # families must not share their peaks
+    def __eq__(self, other):
+        return type(self) is type(other) and self.native_float == other.native_float
+
+    def __hash__(self):
+        return hash((type(self), self.native_float))
+
     def get_register_file(fam_self, n_ports):
         class RegisterFile:
             def __init__(self):
@@ -40,11 +60,24 @@ class PyFamily(_RiscFamily_mixin, family.PyFamily):
 
         return RegisterFile
 
+    # the memory of the base riscv, sparse pages
+    get_memory = riscv_family.PyFamily.get_memory
+
+
+class ArrayPyFamily(PyFamily):
+    # List backed register file, see examples.regfile.
+    def get_register_file(fam_self, n_ports):
+        return array_register_file(fam_self.Word, fam_self.Idx, n_ports)
+
 
 class SMTFamily(_RiscFamily_mixin, family.SMTFamily):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self._passes = remove_asserts(), *self._passes
+
+    # the memory of the base riscv, ld_data and the st_ ports
+    get_memory = riscv_family.SMTFamily.get_memory
+
     def get_register_file(fam_self, n_ports):
         def _make_load(cls, i):
             def load(self, idx):
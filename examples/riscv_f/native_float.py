@@ -0,0 +1,133 @@
+'''
+Host binary32 arithmetic for the riscv_f FPU.
+
+Operands and results are the raw bits of a binary32 as python ints.  Every
+op returns None when the host result can not be trusted to match the
+soft-float units (NaN, infinite or subnormal operands / results, division by
+zero, ...), the caller then has to fall back to soft-float.
+
+Results are only valid under RNE.  add, sub, mul, div and sqrt are computed
+in binary64 and then rounded to binary32, binary64 carries more than 2p+2
+bits so the double rounding is innocuous and results are correctly rounded.
+There is no such guarantee for fused multiply add, it is not provided.
+'''
+import math
+import operator
+import random
+import struct
+
+
+_F32 = struct.Struct('<f')
+_U32 = struct.Struct('<I')
+_EXP_MASK = 0x7f800000
+_FRAC_MASK = 0x007fffff
+
+
+def _plain(bits: int) -> bool:
+    # zero or normal
+    exp = bits & _EXP_MASK
+    if exp == _EXP_MASK:
+        return False
+    return exp != 0 or not (bits & _FRAC_MASK)
+
+
+def _to_float(bits: int) -> float:
+    return _F32.unpack(_U32.pack(bits))[0]
+
+
+def _to_bits(x: float):
+    try:
+        bits = _U32.unpack(_F32.pack(x))[0]
+    except OverflowError:
+        return None
+    if _plain(bits):
+        return bits
+    return None
+
+
+def _arith(f):
+    def op(a: int, b: int):
+        if not (_plain(a) and _plain(b)):
+            return None
+        try:
+            return _to_bits(f(_to_float(a), _to_float(b)))
+        except (ZeroDivisionError, ValueError):
+            return None
+    return op
+
+
+def _compare(f):
+    def op(a: int, b: int):
+        if not (_plain(a) and _plain(b)):
+            return None
+        return int(f(_to_float(a), _to_float(b)))
+    return op
+
+
+def _minmax(f):
+    def op(a: int, b: int):
+        if not (_plain(a) and _plain(b)):
+            return None
+        x = _to_float(a)
+        y = _to_float(b)
+        if x == y:
+            # +0 / -0 ordering is up to the soft-float units
+            return a if a == b else None
+        return a if f(x, y) == x else b
+    return op
+
+
+# Keyed by FPUInst field and tag name.  All ops take two operands, sqrt
+# ignores the second.
+OPS = {
+    ('compute', 'FADD'): _arith(operator.add),
+    ('compute', 'FSUB'): _arith(operator.sub),
+    ('compute', 'FMUL'): _arith(operator.mul),
+    ('compute', 'FDIV'): _arith(operator.truediv),
+    ('minmax', 'MIN'): _minmax(min),
+    ('minmax', 'MAX'): _minmax(max),
+    ('compare', 'EQ'): _compare(operator.eq),
+    ('compare', 'LT'): _compare(operator.lt),
+    ('compare', 'LE'): _compare(operator.le),
+    ('other', 'FSQRT'): _arith(lambda x, y: math.sqrt(x)),
+}
+
+
+def _random_operand() -> int:
+    # mostly ordinary numbers, some raw bit patterns to hit the fallbacks
+    if random.random() < 0.75:
+        return _U32.unpack(_F32.pack(random.uniform(-1e4, 1e4)))[0]
+    return random.randrange(0, 1 << 32)
+
+
+def differential_check(n_samples=1000):
+    '''
+    Runs every op in OPS through the native and soft-float FPUs on random
+    operands under RNE and raises AssertionError on the first mismatch.
+
+    Returns {(field, tag name): number of samples taken by the native path}
+    '''
+    # sim imports this module
+    from . import family, sim
+    isa = sim.ISA_fc.Py
+    native_fpu = sim.R32I_fc(family.PyFamily(native_float=True))().FPU
+    soft_fpu = sim.R32I_fc.Py().FPU
+
+    native_hits = {}
+    for (field, name), op in OPS.items():
+        tag = getattr(isa.FPUInst.field_dict[field], name)
+        inst = isa.FPUInst(**{field: tag})
+        hits = 0
+        for _ in range(n_samples):
+            a = _random_operand()
+            b = _random_operand()
+            if op(a, b) is not None:
+                hits += 1
+            args = inst, isa.RM.RNE, isa.Word(a), isa.Word(b), isa.Word(0)
+            native = native_fpu(*args)
+            soft = soft_fpu(*args)
+            if native != soft:
+                raise AssertionError(
+                    f'{name}({a:#010x}, {b:#010x}): native {native} != soft-float {soft}')
+        native_hits[field, name] = hits
+    return native_hits
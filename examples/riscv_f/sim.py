@@ -1,11 +1,231 @@
+import functools
+
 from peak import Peak, name_outputs, family_closure, Const
 from peak.float import float_lib_gen, RoundingMode 
 
 from .isa import ISA_fc
 from .util import Initial
+from ..riscv.util import run_loop
 from . import family
+from . import native_float
+
+
+@functools.lru_cache(maxsize=None)
+def _float_fcs():
+    # generating the float library is deferred until R32I is first built
+    return float_lib_gen(8, 23)
+
+
+def __getattr__(name):
+    if name == 'float_fcs':
+        return _float_fcs()
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+@family_closure(family)
+def FPU_fc(family):
+    Word = family.Word
+
+    isa = ISA_fc.Py
+    float_fcs = _float_fcs()
+    RoundingMode_c = family.get_constructor(RoundingMode)
+
+    # The FPU dispatches to one sub-peak per group of float units.  In the
+    # python family only the selected unit is evaluated, SMT evaluates every
+    # branch and muxes the results, which is the shape the mapping needs.
+    @family.assemble(locals(), globals())
+    class FPCompute(Peak):
+        def __init__(self):
+            self.fp_add = float_fcs.Add_fc(family)()
+            self.fp_sub = float_fcs.Sub_fc(family)()
+            self.fp_mul = float_fcs.Mul_fc(family)()
+            self.fp_div = float_fcs.Div_fc(family)()
+
+        def __call__(self,
+                inst: isa.FPComputeInst,
+                rm: RoundingMode,
+                a: isa.Word,
+                b: isa.Word,
+                ) -> isa.Word:
+            if inst == isa.FPComputeInst.FADD:
+                return self.fp_add(rm, a, b)
+            elif inst == isa.FPComputeInst.FSUB:
+                return self.fp_sub(rm, a, b)
+            elif inst == isa.FPComputeInst.FMUL:
+                return self.fp_mul(rm, a, b)
+            else:
+                assert inst == isa.FPComputeInst.FDIV
+                return self.fp_div(rm, a, b)
+
+
+    @family.assemble(locals(), globals())
+    class FPMinMax(Peak):
+        def __init__(self):
+            self.fp_min = float_fcs.Min_fc(family)()
+            self.fp_max = float_fcs.Max_fc(family)()
+
+        def __call__(self,
+                inst: isa.FPMinMaxInst,
+                rm: RoundingMode,
+                a: isa.Word,
+                b: isa.Word,
+                ) -> isa.Word:
+            if inst == isa.FPMinMaxInst.MIN:
+                return self.fp_min(rm, a, b)
+            else:
+                assert inst == isa.FPMinMaxInst.MAX
+                return self.fp_max(rm, a, b)
+
+
+    @family.assemble(locals(), globals())
+    class FPCompare(Peak):
+        def __init__(self):
+            self.fp_eq = float_fcs.Eq_fc(family)()
+            self.fp_leq = float_fcs.Leq_fc(family)()
+            self.fp_lt = float_fcs.Lt_fc(family)()
+
+        def __call__(self,
+                inst: isa.FPCompareInst,
+                rm: RoundingMode,
+                a: isa.Word,
+                b: isa.Word,
+                ) -> isa.Word:
+            if inst == isa.FPCompareInst.EQ:
+                return Word(self.fp_eq(rm, a, b))
+            elif inst == isa.FPCompareInst.LT:
+                return Word(self.fp_lt(rm, a, b))
+            else:
+                assert inst == isa.FPCompareInst.LE
+                return Word(self.fp_leq(rm, a, b))
+
+
+    @family.assemble(locals(), globals())
+    class FPFused(Peak):
+        def __init__(self):
+            self.fp_fma = float_fcs.Fma_fc(family)()
+            self.fp_neg_1 = float_fcs.Neg_fc(family)()
+            self.fp_neg_2 = float_fcs.Neg_fc(family)()
+
+        def __call__(self,
+                inst: isa.FPFusedInst,
+                rm: RoundingMode,
+                a: isa.Word,
+                b: isa.Word,
+                c: isa.Word,
+                ) -> isa.Word:
+            if (inst == isa.FPFusedInst.FNMA) or (inst == isa.FPFusedInst.FNMS):
+                a = self.fp_neg_1(rm, a)
+
+            if (inst == isa.FPFusedInst.FMS) or (inst == isa.FPFusedInst.FNMS):
+                c = self.fp_neg_2(rm, c)
+            return self.fp_fma(rm, a, b, c)
+
+
+    @family.assemble(locals(), globals())
+    class FPOther(Peak):
+        def __init__(self):
+            self.fp_sqrt = float_fcs.Sqrt_fc(family)()
+
+        def __call__(self,
+                inst: isa.FPOther,
+                rm: RoundingMode,
+                a: isa.Word,
+                ) -> isa.Word:
+            if inst == isa.FPOther.FSQRT:
+                return self.fp_sqrt(rm, a)
+            else:
+                assert inst == isa.FPOther.FCLASS
+                # Not Implemented
+                return Word(0)
+
+
+    @family.assemble(locals(), globals())
+    class FPU(Peak):
+        def __init__(self):
+            self.compute = FPCompute()
+            self.minmax = FPMinMax()
+            self.compare = FPCompare()
+            self.fused = FPFused()
+            self.other = FPOther()
+
+        def __call__(self,
+                inst: isa.FPUInst,
+                rm: isa.RM,
+                a: isa.Word,
+                b: isa.Word,
+                c: isa.Word,
+                ) -> isa.Word:
+            #HACK
+            if rm == isa.RM.RNE:
+                rm = RoundingMode_c(RoundingMode.RNE)
+            elif rm == isa.RM.RTZ:
+                rm = RoundingMode_c(RoundingMode.RTZ)
+            elif rm == isa.RM.RDN:
+                rm = RoundingMode_c(RoundingMode.RDN)
+            elif rm == isa.RM.RUP:
+                rm = RoundingMode_c(RoundingMode.RUP)
+            elif rm == isa.RM.RMM:
+                rm = RoundingMode_c(RoundingMode.RMM)
+            else:
+                assert rm == isa.RM.DYN
+                return Word(0)
+
+            if inst.compute.match:
+                return self.compute(inst.compute.value, rm, a, b)
+            elif inst.minmax.match:
+                return self.minmax(inst.minmax.value, rm, a, b)
+            elif inst.compare.match:
+                return self.compare(inst.compare.value, rm, a, b)
+            elif inst.fused.match:
+                return self.fused(inst.fused.value, rm, a, b, c)
+            else:
+                assert inst.other.match
+                return self.other(inst.other.value, rm, a)
+
+    return FPU
+
+
+@family_closure(family)
+def NativeFPU_fc(family):
+    FPU = FPU_fc(family)
+    Word = family.Word
+
+    isa = ISA_fc.Py
+    FExecInst = family.get_constructor(isa.FPUInst)
+    _NATIVE_OPS = {
+        FExecInst(**{field: getattr(isa.FPUInst.field_dict[field], name)}): op
+        for (field, name), op in native_float.OPS.items()
+    }
+
+    @family.assemble(locals(), globals())
+    class NativeFPU(FPU):
+        # Host binary32 arithmetic under RNE, anything native_float
+        # declines falls back to the soft-float units
+        def __call__(self,
+                inst: isa.FPUInst,
+                rm: isa.RM,
+                a: isa.Word,
+                b: isa.Word,
+                c: isa.Word,
+                ) -> isa.Word:
+            if rm == isa.RM.RNE:
+                op = _NATIVE_OPS.get(inst)
+                if op is not None:
+                    out = op(a.as_uint(), b.as_uint())
+                    if out is not None:
+                        return Word(out)
+            return super().__call__(inst, rm, a, b, c)
+
+    return NativeFPU
+
+
+def _fpu(family):
+    # python families with native_float set run on host floats, see
+    # family.PyFamily
+    if family.native_float:
+        return NativeFPU_fc(family)
+    return FPU_fc(family)
 
-float_fcs = float_lib_gen(8, 23)
 
 # Named R32I to make testing easier
 @family_closure(family)
@@ -21,13 +241,14 @@ def R32I_fc(family):
     isa = ISA_fc.Py
     RegisterFile = family.get_register_file(2)
     FRegisterFile = family.get_register_file(3)
+    Memory = family.get_memory()
+    MemSize = BitVector[2]
 
     ExecInst = family.get_constructor(isa.AluInst)
     FExecInst =  family.get_constructor(isa.FPUInst)
     DecodeOut = family.get_constructor(isa._DecodeOut)
     RM = family.get_constructor(isa.RM)
 
-    RoundingMode_c = family.get_constructor(RoundingMode)
     @family.assemble(locals(), globals())
     class Decode(Peak):
         def __call__(self,
@@ -44,6 +265,10 @@ def R32I_fc(family):
             is_jump = Bit(0)
             cmp_zero = Bit(0)
             invert = Bit(0)
+            is_load = Bit(0)
+            is_store = Bit(0)
+            mem_size = MemSize(0)
+            mem_signed = Bit(0)
 
             # Note rd != 0 is implicit enable
             rd = Idx(0)
@@ -150,11 +375,46 @@ def R32I_fc(family):
                     invert = cmp_ge
 
             elif inst[isa.Load].match:
-                # NOT IMPLEMENTED
-                pass
+                is_load = Bit(1)
+                load_inst = inst[isa.Load].value
+                # No 64 bit loads on a 32 bit machine
+                assert load_inst.tag != isa.LoadInst.LD
+                rs1 = load_inst.data.rs1
+                imm = load_inst.data.imm.sext(20)
+                use_imm = Bit(1)
+                rd = load_inst.data.rd
+                # address calculation
+                exec_inst = ExecInst(arith=isa.ArithInst.ADD)
+
+                is_lb = load_inst.tag == isa.LoadInst.LB
+                is_lh = load_inst.tag == isa.LoadInst.LH
+                mem_signed = is_lb | is_lh
+                if is_lb | (load_inst.tag == isa.LoadInst.LBU):
+                    mem_size = MemSize(0)
+                elif is_lh | (load_inst.tag == isa.LoadInst.LHU):
+                    mem_size = MemSize(1)
+                else:
+                    # LW / LWU are the same on a 32 bit machine
+                    mem_size = MemSize(2)
+
             elif inst[isa.Store].match:
-                # NOT IMPLEMENTED
-                pass
+                is_store = Bit(1)
+                store_inst = inst[isa.Store].value
+                assert store_inst.tag != isa.StoreInst.SD
+                rs1 = store_inst.data.rs1
+                rs2 = store_inst.data.rs2
+                imm = store_inst.data.imm.sext(20)
+                use_imm = Bit(1)
+                # address calculation
+                exec_inst = ExecInst(arith=isa.ArithInst.ADD)
+
+                if store_inst.tag == isa.StoreInst.SB:
+                    mem_size = MemSize(0)
+                elif store_inst.tag == isa.StoreInst.SH:
+                    mem_size = MemSize(1)
+                else:
+                    mem_size = MemSize(2)
+
             elif inst[isa.OP_FP].match:
                 is_fp = Bit(1)
                 op_fp_inst = inst[isa.OP_FP].value
@@ -211,6 +471,10 @@ def R32I_fc(family):
                 is_jump = is_jump,
                 cmp_zero = cmp_zero,
                 invert = invert,
+                is_load = is_load,
+                is_store = is_store,
+                mem_size = mem_size,
+                mem_signed = mem_signed,
             )
 
 
@@ -250,161 +514,7 @@ def R32I_fc(family):
                     c = a.bvashr(b)
             return c
 
-    @family.assemble(locals(), globals())
-    class FPU(Peak):
-        def __init__(self):
-            self.fp_add = float_fcs.Add_fc(family)()
-            self.fp_sub = float_fcs.Sub_fc(family)()
-            self.fp_mul = float_fcs.Mul_fc(family)()
-            self.fp_div = float_fcs.Div_fc(family)()
-            self.fp_sqrt = float_fcs.Sqrt_fc(family)()
-            self.fp_min = float_fcs.Min_fc(family)()
-            self.fp_max = float_fcs.Max_fc(family)()
-            self.fp_fma = float_fcs.Fma_fc(family)()
-            self.fp_neg_1 = float_fcs.Neg_fc(family)()
-            self.fp_neg_2 = float_fcs.Neg_fc(family)()
-            self.fp_eq = float_fcs.Eq_fc(family)()
-            self.fp_leq = float_fcs.Leq_fc(family)()
-            self.fp_lt = float_fcs.Lt_fc(family)()
-
-
-        def __call__(self,
-                inst: isa.FPUInst,
-                rm: isa.RM,
-                a: isa.Word,
-                b: isa.Word,
-                c: isa.Word,
-                ) -> isa.Word:
-            add_in_0 = Word(0)
-            add_in_1 = Word(0)
-            sub_in_0 = Word(0)
-            sub_in_1 = Word(0)
-            mul_in_0 = Word(0)
-            mul_in_1 = Word(0)
-            div_in_0 = Word(0)
-            div_in_1 = Word(0)
-            min_in_0 = Word(0)
-            min_in_1 = Word(0)
-            max_in_0 = Word(0)
-            max_in_1 = Word(0)
-            fma_in_0 = Word(0)
-            fma_in_1 = Word(0)
-            fma_in_2 = Word(0)
-            eq_in_0 = Word(0)
-            eq_in_1 = Word(0)
-            lt_in_0 = Word(0)
-            lt_in_1 = Word(0)
-            le_in_0 = Word(0)
-            le_in_1 = Word(0)
-            sqrt_in = Word(0)
-
-            #HACK
-            if rm == isa.RM.RNE:
-                rm = RoundingMode_c(RoundingMode.RNE)
-            elif rm == isa.RM.RTZ:
-                rm = RoundingMode_c(RoundingMode.RTZ)
-            elif rm == isa.RM.RDN:
-                rm = RoundingMode_c(RoundingMode.RDN)
-            elif rm == isa.RM.RUP:
-                rm = RoundingMode_c(RoundingMode.RUP)
-            elif rm == isa.RM.RMM:
-                rm = RoundingMode_c(RoundingMode.RMM)
-            else:
-                assert rm == isa.RM.DYN
-                return Word(0)
-
-            if inst.compute.match:
-                if inst.compute.value == isa.FPComputeInst.FADD:
-                    add_in_0 = a
-                    add_in_1 = b
-                elif inst.compute.value == isa.FPComputeInst.FSUB:
-                    sub_in_0 = a
-                    sub_in_1 = b
-                elif inst.compute.value == isa.FPComputeInst.FMUL:
-                    mul_in_0 = a
-                    mul_in_1 = b
-                else:
-                    assert inst.compute.value == isa.FPComputeInst.FDIV
-                    div_in_0 = a
-                    div_in_1 = b
-            elif inst.minmax.match:
-                if inst.minmax.value == isa.FPMinMaxInst.MIN:
-                    min_in_0 = a
-                    min_in_1 = b
-                else:
-                    assert inst.minmax.value == isa.FPMinMaxInst.MAX
-                    max_in_0 = a
-                    max_in_1 = b
-            elif inst.compare.match:
-                if inst.compare.value == isa.FPCompareInst.EQ:
-                    eq_in_0 = a
-                    eq_in_1 = b
-                elif inst.compare.value == isa.FPCompareInst.LT:
-                    lt_in_0 = a
-                    lt_in_1 = b
-                else:
-                    assert inst.compare.value == isa.FPCompareInst.LE
-                    le_in_0 = a
-                    le_in_1 = b
-            elif inst.fused.match:
-                fma_in_0 = a
-                fma_in_1 = b
-                fma_in_2 = c
-                if (inst.fused.value == isa.FPFusedInst.FNMA) or (inst.fused.value == isa.FPFusedInst.FNMS):
-                    fma_in_0 = self.fp_neg_1(rm, fma_in_0)
-
-                if (inst.fused.value == isa.FPFusedInst.FMS) or (inst.fused.value == isa.FPFusedInst.FNMS):
-                    fma_in_2 = self.fp_neg_2(rm, fma_in_2)
-            else:
-                assert inst.other.match
-                if inst.other.value == isa.FPOther.FSQRT:
-                    sqrt_in = a
-                else:
-                    assert inst.other.value == isa.FPOther.FCLASS
-                    # Not Implemented
-
-
-
-            add_out = self.fp_add(rm, add_in_0, add_in_1)
-            sub_out = self.fp_sub(rm, sub_in_0, sub_in_1)
-            mul_out = self.fp_mul(rm, mul_in_0, mul_in_1)
-            div_out = self.fp_div(rm, div_in_0, div_in_1)
-            min_out = self.fp_min(rm, min_in_0, min_in_1)
-            max_out = self.fp_max(rm, max_in_0, max_in_1)
-            eq_out = Word(self.fp_eq(rm, eq_in_0, eq_in_1))
-            lt_out = Word(self.fp_lt(rm, lt_in_0, lt_in_1))
-            le_out = Word(self.fp_leq(rm, le_in_0, le_in_1))
-            fma_out = self.fp_fma(rm, fma_in_0, fma_in_1, fma_in_2)
-            sqrt_out = self.fp_sqrt(rm, sqrt_in)
-
-            if inst.compute.match:
-                if inst.compute.value == isa.FPComputeInst.FADD:
-                    return add_out
-                elif inst.compute.value == isa.FPComputeInst.FSUB:
-                    return sub_out
-                elif inst.compute.value == isa.FPComputeInst.FMUL:
-                    return mul_out
-                else:
-                    return div_out
-            elif inst.minmax.match:
-                if inst.minmax.value == isa.FPMinMaxInst.MIN:
-                    return min_out
-                else:
-                    return max_out
-            elif inst.compare.match:
-                if inst.compare.value == isa.FPCompareInst.EQ:
-                    return eq_out
-                elif inst.compare.value == isa.FPCompareInst.LT:
-                    return lt_out
-                else:
-                    return le_out
-            elif inst.fused.match:
-                return fma_out
-            else:
-                if inst.other.value == isa.FPOther.FSQRT:
-                    return sqrt_out
-                else:
-                    return Word(0)
+    FPU = _fpu(family)
 
 
     @family.assemble(locals(), globals())
@@ -412,6 +522,7 @@ def R32I_fc(family):
         def __init__(self):
             self.register_file = RegisterFile()
             self.f_register_file = FRegisterFile()
+            self.memory = Memory()
             self.Decode = Decode()
             self.ALU = ALU()
             self.FPU = FPU()
@@ -440,13 +551,14 @@ def R32I_fc(family):
             is_jump = decoded.is_jump
             cmp_zero = decoded.cmp_zero
             invert = decoded.invert
+            is_load = decoded.is_load
+            is_store = decoded.is_store
+            mem_size = decoded.mem_size
+            mem_signed = decoded.mem_signed
 
             a = self.register_file.load1(rs1)
             b = self.register_file.load2(rs2)
-
-            fa = self.f_register_file.load1(rs1)
-            fb = self.f_register_file.load2(rs2)
-            fc = self.f_register_file.load3(rs3)
+            st_data = b
 
             if use_pc:
                 a = pc
@@ -456,11 +568,33 @@ def R32I_fc(family):
 
             # Execute
             c = self.ALU(exec_inst, a, b)
-            fpu_out = self.FPU(f_exec_inst, rm, fa, fb, fc)
+            # In the python family this skips the FPU for integer
+            # instructions, in SMT the FPU is always evaluated and muxed
+            fpu_out = Word(0)
+            if is_fp:
+                fa = self.f_register_file.load1(rs1)
+                fb = self.f_register_file.load2(rs2)
+                fc = self.f_register_file.load3(rs3)
+                fpu_out = self.FPU(f_exec_inst, rm, fa, fb, fc)
 
             if mask_lsb:
                 c = BitVector[1](0).concat(c[1:]) # clear bottom bit for jalr
 
+            # Memory
+            # store is always called, is_store is its enable
+            self.memory.store(c, st_data, mem_size, is_store)
+            if is_load:
+                ld_data = self.memory.load(c, mem_size)
+                # move the loaded bytes to the top of the word and shift
+                # them back down to sign / zero extend
+                shamt = Word(32) - (Word(8) << mem_size.zext(30))
+                ld_data = ld_data.bvshl(shamt)
+                if mem_signed:
+                    ld_data = ld_data.bvashr(shamt)
+                else:
+                    ld_data = ld_data.bvlshr(shamt)
+                c = ld_data
+
             # Commit
             assert not (is_jump & is_branch)
 
@@ -487,6 +621,10 @@ def R32I_fc(family):
 
             self.register_file.store(rd, out)
             return pc_next
+
+        def run(self, program, pc, max_steps=None):
+            # See util.run_loop, returns RunResult(pc, retired, time)
+            return run_loop(self, program, pc, max_steps)
     return R32I
 
 
@@ -502,7 +640,10 @@ def R32I_mappable_fc(family):
         def __init__(self):
             self.riscv = R32I()
 
-        @name_outputs(pc_next=isa.Word, rd=isa.Word, f_rd=isa.Word)
+        # The memory is exposed through its ports: loads return ld_data and
+        # stores drive the st_ outputs (st_en is 0 if nothing is stored)
+        @name_outputs(pc_next=isa.Word, rd=isa.Word, f_rd=isa.Word, st_addr=isa.Word,
+                      st_data=isa.Word, st_size=isa.BitVector[2], st_en=isa.Bit)
         def __call__(self,
                      inst: Const(isa.Inst),
                      pc: isa.Word,
@@ -512,8 +653,9 @@ def R32I_mappable_fc(family):
                      f_rs1: isa.Word,
                      f_rs2: isa.Word,
                      f_rs3: isa.Word,
-                     f_rd: Initial(isa.Word)
-                     ) -> (isa.Word, isa.Word, isa.Word):
+                     f_rd: Initial(isa.Word),
+                     ld_data: isa.Word,
+                     ) -> (isa.Word, isa.Word, isa.Word, isa.Word, isa.Word, isa.BitVector[2], isa.Bit):
 
             self._set_rs1_(rs1)
             self._set_rs2_(rs2)
@@ -522,8 +664,11 @@ def R32I_mappable_fc(family):
             self._set_f_rs2_(f_rs2)
             self._set_f_rs3_(f_rs3)
             self._set_f_rd_(f_rd)
+            self._set_ld_data_(ld_data)
             pc_next = self.riscv(inst, pc)
-            return pc_next, self.riscv.register_file.rd, self.riscv.f_register_file.rd
+            memory = self.riscv.memory
+            return (pc_next, self.riscv.register_file.rd, self.riscv.f_register_file.rd,
+                    memory.st_addr, memory.st_data, memory.st_size, memory.st_en)
 
         def _set_rs1_(self, rs1):
             self.riscv.register_file._set_rs1_(rs1)
@@ -546,6 +691,9 @@ def R32I_mappable_fc(family):
         def _set_f_rd_(self, rd):
             self.riscv.f_register_file._set_rd_(rd)
 
+        def _set_ld_data_(self, ld_data):
+            self.riscv.memory._set_ld_data_(ld_data)
+
     return R32I_mappable
 
 
@@ -561,7 +709,9 @@ def R32I_mappable_no_pc_fc(family):
         def __init__(self):
             self.riscv = R32I()
 
-        @name_outputs(rd=isa.Word, f_rd=isa.Word)
+        # see R32I_mappable_fc for the memory ports
+        @name_outputs(rd=isa.Word, f_rd=isa.Word, st_addr=isa.Word, st_data=isa.Word,
+                      st_size=isa.BitVector[2], st_en=isa.Bit)
         def __call__(self,
                      inst: Const(isa.Inst),
                      rs1: isa.Word,
@@ -569,7 +719,8 @@ def R32I_mappable_no_pc_fc(family):
                      f_rs1: isa.Word,
                      f_rs2: isa.Word,
                      f_rs3: isa.Word,
-                     ) -> (isa.Word, isa.Word):
+                     ld_data: isa.Word,
+                     ) -> (isa.Word, isa.Word, isa.Word, isa.Word, isa.BitVector[2], isa.Bit):
 
             pc = Word(0)
             rd = Word(0x5555)
@@ -581,8 +732,11 @@ def R32I_mappable_no_pc_fc(family):
             self._set_f_rs2_(f_rs2)
             self._set_f_rs3_(f_rs3)
             self._set_f_rd_(f_rd)
+            self._set_ld_data_(ld_data)
             pc_next = self.riscv(inst, pc)
-            return self.riscv.register_file.rd, self.riscv.f_register_file.rd
+            memory = self.riscv.memory
+            return (self.riscv.register_file.rd, self.riscv.f_register_file.rd,
+                    memory.st_addr, memory.st_data, memory.st_size, memory.st_en)
 
         def _set_rs1_(self, rs1):
             self.riscv.register_file._set_rs1_(rs1)
@@ -605,5 +759,8 @@ def R32I_mappable_no_pc_fc(family):
         def _set_f_rd_(self, rd):
             self.riscv.f_register_file._set_rd_(rd)
 
+        def _set_ld_data_(self, ld_data):
+            self.riscv.memory._set_ld_data_(ld_data)
+
     return R32I_mappable
 
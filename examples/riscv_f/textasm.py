@@ -0,0 +1,8 @@
+from ..riscv.textasm import TextAssembler
+from .isa import ISA_fc
+
+isa = ISA_fc.Py
+
+
+assembler = TextAssembler(isa)
+assemble = assembler.assemble
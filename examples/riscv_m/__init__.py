@@ -1,3 +1,3 @@
-from . import family
-from . import sim
-from . import isa
+from ..lazy import lazy_submodules
+
+__getattr__, __dir__ = lazy_submodules(__name__, ('family', 'sim', 'isa'))
@@ -3,6 +3,9 @@ from peak import family
 
 from ast_tools.passes import remove_asserts
 
+from ..regfile import array_register_file
+from ..riscv import family as riscv_family
+
 
 # A bit of hack putting the def of word and idx here
 # and not isa but it makes life easier
@@ -39,11 +42,25 @@ class PyFamily(_RiscFamily_mixin, family.PyFamily):
                     self.rf[idx] = value
         return RegisterFile
 
+    # the memory of the base riscv, sparse pages
+    get_memory = riscv_family.PyFamily.get_memory
+
+
+class ArrayPyFamily(PyFamily):
+    # List backed register file, see examples.regfile.  Unlike the dict based
+    # register file, registers which were never written read as 0.
+    def get_register_file(fam_self):
+        return array_register_file(fam_self.Word, fam_self.Idx)
+
 
 class SMTFamily(_RiscFamily_mixin, family.SMTFamily):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self._passes = remove_asserts(), *self._passes
+
+    # the memory of the base riscv, ld_data and the st_ ports
+    get_memory = riscv_family.SMTFamily.get_memory
+
     def get_register_file(fam_self):
         class RegisterFile:
             def __init__(self):
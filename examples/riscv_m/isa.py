@@ -163,10 +163,29 @@ def ISA_fc(family):
 
     class Store(Product):
         data = S
-        tag = LoadInst
+        tag = StoreInst
 
 
     # This sum type defines the opcode field
     Inst = Sum[OP, OP_IMM, LUI, AUIPC, JAL, JALR, Branch, Load, Store]
 
+    class _DecodeOut(Product):
+        rs1 = Idx
+        rs2 = Idx
+        rd = Idx
+        imm = Word
+        use_imm = Bit
+        use_pc = Bit
+        exec_inst= AluInst
+        mask_lsb = Bit
+        is_branch = Bit
+        is_jump = Bit
+        cmp_zero = Bit
+        invert = Bit
+        is_load = Bit
+        is_store = Bit
+        # log2 of the access size in bytes
+        mem_size = BitVector[2]
+        mem_signed = Bit
+
     return SimpleNamespace(**locals())
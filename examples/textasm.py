@@ -0,0 +1,134 @@
+'''
+Line parsing and caching shared by the text assemblers of the examples
+(examples.riscv.textasm, examples.mips.textasm).
+
+Sources are line based.  A line holds optional labels, at most one
+instruction (a mnemonic followed by comma separated operands) and an
+optional comment from '#' to the end of the line:
+
+    loop:   addi x1, x1, -1     # count down
+            bnez x1, loop
+
+Errors are raised as ValueError prefixed with the line number.
+'''
+import functools
+import hashlib
+import os
+import re
+import tempfile
+import typing as tp
+
+
+_LABEL = re.compile(r'\s*([A-Za-z_.][\w.]*)\s*:')
+_MEM = re.compile(r'(.*)\((.*)\)$')
+
+# (line number, labels, mnemonic or None, operands)
+Line = tp.Tuple[int, tp.List[str], tp.Optional[str], tp.List[str]]
+
+
+def parse(source: str) -> tp.Iterator[Line]:
+    '''
+    Yields the lines of source holding labels or an instruction, mnemonics
+    are lower cased.
+    '''
+    for line_no, line in enumerate(source.splitlines(), 1):
+        line = line.partition('#')[0]
+        labels = []
+        m = _LABEL.match(line)
+        while m is not None:
+            labels.append(m.group(1))
+            line = line[m.end():]
+            m = _LABEL.match(line)
+        parts = line.split(None, 1)
+        if not parts:
+            if labels:
+                yield line_no, labels, None, []
+            continue
+        mnemonic = parts[0].lower()
+        operands = [op.strip() for op in parts[1].split(',')] if len(parts) > 1 else []
+        yield line_no, labels, mnemonic, operands
+
+
+def parse_int(text: str) -> int:
+    try:
+        return int(text, 0)
+    except ValueError:
+        raise ValueError(f'expected an integer, got {text!r}') from None
+
+
+def check_int(value: int, bits: int, signed: bool) -> int:
+    '''
+    Returns value as a bits wide unsigned field, raises ValueError if it does
+    not fit (as a signed value if signed, else unsigned).
+    '''
+    if signed:
+        lo, hi = -(1 << (bits - 1)), 1 << (bits - 1)
+    else:
+        lo, hi = 0, 1 << bits
+    if not lo <= value < hi:
+        raise ValueError(f'{value} does not fit in {bits} bits')
+    return value & ((1 << bits) - 1)
+
+
+def parse_mem(text: str) -> tp.Tuple[int, str]:
+    '''
+    Splits a memory operand 'offset(reg)' in to the offset (default 0) and
+    the register.
+    '''
+    m = _MEM.match(text)
+    if m is None:
+        raise ValueError(f'expected offset(register), got {text!r}')
+    offset = m.group(1).strip()
+    return (parse_int(offset) if offset else 0), m.group(2).strip()
+
+
+def operands(ops: tp.List[str], n: int) -> tp.List[str]:
+    if len(ops) != n:
+        raise ValueError(f'expected {n} operands, got {len(ops)}')
+    return ops
+
+
+def source_key(source: str, *salt) -> str:
+    '''
+    Cache key of source assembled with the settings in salt (reprs).
+    '''
+    h = hashlib.sha256()
+    for value in salt:
+        h.update(repr(value).encode())
+        h.update(b'\0')
+    h.update(source.encode())
+    return h.hexdigest()
+
+
+@functools.lru_cache(maxsize=None)
+def code_hash(*paths: str) -> str:
+    '''
+    Hash of the files at paths, e.g. the modules of an assembler so cached
+    programs are invalidated when it changes.
+    '''
+    h = hashlib.sha256()
+    for path in paths:
+        with open(path, 'rb') as f:
+            h.update(hashlib.sha256(f.read()).digest())
+    return h.hexdigest()
+
+
+def cached(directory: str, key: str, assemble: tp.Callable[[], bytes]) -> bytes:
+    '''
+    Returns the program stored under key in directory, assembling and
+    storing it on a miss.
+    '''
+    path = os.path.join(directory, f'{key}.bin')
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        pass
+    buf = assemble()
+    os.makedirs(directory, exist_ok=True)
+    # write and rename so concurrent jobs never see a partial file
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(buf)
+    os.replace(tmp, path)
+    return buf
@@ -12,5 +12,7 @@ setup(
     packages=find_namespace_packages(include=['examples', 'examples.*']),
     install_requires=[
         'peak @ git+https://github.com/cdonovick/peak#egg=peak',
+        # examples/asmgen.py builds ADTs through their private fields
+        'hwtypes~=1.4.7',
     ],
 )
@@ -0,0 +1,36 @@
+import os
+
+import pytest
+
+from examples.mapping import Corpus
+
+
+# vectors worth replaying which are committed with the tests, see
+# examples/mapping/corpus.py
+COMMITTED = Corpus(os.path.join(os.path.dirname(__file__), 'corpus'))
+
+
+@pytest.fixture(scope='session')
+def corpus(tmp_path_factory):
+    '''
+    Corpus the tests record the vectors they fail on in.  It lives in a
+    temporary directory of the session unless PEAK_EXAMPLES_CORPUS names a
+    directory to keep it in (e.g. tests/corpus to commit the vectors).
+    '''
+    directory = os.environ.get('PEAK_EXAMPLES_CORPUS')
+    if not directory:
+        directory = tmp_path_factory.mktemp('corpus')
+    return Corpus(directory)
+
+
+@pytest.fixture
+def replay(corpus):
+    '''
+    replay(isa, draw, n) yields the committed vectors of isa, the vectors
+    recorded in corpus and then n vectors from draw.
+    '''
+    def replay(isa: str, draw, n):
+        if os.path.abspath(corpus.directory) != os.path.abspath(COMMITTED.directory):
+            yield from COMMITTED.vectors(isa)
+        yield from corpus.replay(isa, draw, n)
+    return replay
@@ -0,0 +1,281 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from hwtypes import SMTBitVector
+from pysmt.shortcuts import BV, Symbol, TRUE
+from pysmt.typing import BOOL, BVType
+
+from peak import Peak, name_outputs, family_closure, family
+from peak.mapper import ArchMapper
+
+from examples.mapping import (
+    ArchSession, Corpus, MappingCache, check_fresh, dump_stats, edge_vectors,
+    isa_key, smt_stats, source_hash, synthesize, term_stats, variants,
+)
+from examples.mapping.corpus import rule_counterexample
+from examples.mips import sim as mips_sim, family as mips_family
+from examples.riscv import sim as riscv_sim, family as riscv_family
+from examples.riscv.slice import slice_family
+from examples.riscv_ext import sim as ext_sim
+
+
+@family_closure(family)
+def Add_fc(family):
+    Word = family.BitVector[32]
+
+    @family.assemble(locals(), globals())
+    class Add(Peak):
+        @name_outputs(out=Word)
+        def __call__(self, a: Word, b: Word) -> Word:
+            return a + b
+
+    return Add
+
+
+@family_closure(family)
+def Const_fc(family):
+    Word = family.BitVector[32]
+
+    @family.assemble(locals(), globals())
+    class Const(Peak):
+        @name_outputs(out=Word)
+        def __call__(self, a: Word) -> Word:
+            return Word(0x12345678)
+
+    return Const
+
+
+def __getattr__(name):
+    # the synthesize worker importing Crash_fc dies, see test_synthesize_crash
+    if name == 'Crash_fc':
+        os._exit(1)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+def test_source_hash():
+    h = source_hash(riscv_sim.R32I_mappable_fc)
+    # same package
+    assert h == source_hash(riscv_sim.R32I_fc)
+    assert h != source_hash(ext_sim.R32I_mappable_fc)
+    assert h != source_hash(mips_sim.MIPS32_mappable_fc)
+
+
+def test_source_hash_root(tmp_path):
+    # two copies of the examples at different roots hash the same
+    examples = os.path.dirname(os.path.dirname(os.path.abspath(riscv_sim.__file__)))
+    script = (
+        'import examples, examples.riscv.sim as sim\n'
+        'from examples.mapping import source_hash\n'
+        'print(examples.__file__)\n'
+        'print(source_hash(sim.R32I_mappable_fc))\n'
+    )
+    hashes = set()
+    for root in (tmp_path / 'a', tmp_path / 'b' / 'c'):
+        shutil.copytree(examples, root / 'examples', ignore=shutil.ignore_patterns('__pycache__'))
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join(filter(None, (str(root), env.get('PYTHONPATH'))))
+        out = subprocess.run([sys.executable, '-c', script], cwd=root, env=env,
+                             capture_output=True, text=True, check=True).stdout.split()
+        assert out[0].startswith(str(root))
+        hashes.add(out[1])
+    assert hashes == {source_hash(riscv_sim.R32I_mappable_fc)}
+
+
+def test_mapping_cache(tmp_path):
+    arch_fc = mips_sim.MIPS32_mappable_fc
+    # the rule is verified, it has no counterexample
+    corpus = Corpus(tmp_path / 'corpus')
+    cache = MappingCache(tmp_path, corpus=corpus)
+    rule = cache.map(arch_fc, Add_fc, mips_family)
+    assert rule is not None
+    assert (cache.hits, cache.misses) == (0, 1)
+    assert corpus.vectors('mips') == []
+
+    # e.g. the next CI run, the arch mapper is never built
+    cache = MappingCache(tmp_path)
+    cached = cache.map(arch_fc, Add_fc, mips_family)
+    assert (cache.hits, cache.misses) == (1, 0)
+    assert not cache._mappers
+    expected = json.loads(json.dumps(rule.serialize_bindings()))
+    assert cached.serialize_bindings() == expected
+
+
+def test_variants():
+    isa = riscv_sim.ISA_fc.Py
+    paths = variants(isa.Inst)
+    assert ('OP', 'tag', 'arith') in paths
+    assert ('OP', 'tag', 'shift') in paths
+    assert ('OP_IMM', 'shift') in paths
+    assert ('LUI',) in paths
+    assert len(paths) == len(set(paths)) == 11
+
+
+def test_load_rule():
+    # the loaded value is an input of the arch, so a load is not a constant
+    isa = riscv_sim.ISA_fc.Py
+    arch_mapper = ArchMapper(riscv_sim.R32I_mappable_fc, family=slice_family([isa.Load]))
+    assert arch_mapper.process_ir_instruction(Const_fc).solve() is None
+
+
+def test_slice_mappers():
+    # two slices in one process do not share their peaks
+    isa = riscv_sim.ISA_fc.Py
+    op = ArchMapper(riscv_sim.R32I_mappable_fc, family=slice_family([isa.OP]))
+    load = ArchMapper(riscv_sim.R32I_mappable_fc, family=slice_family([isa.Load]))
+    assert op.process_ir_instruction(Add_fc).solve() is not None
+    assert load.process_ir_instruction(Add_fc).solve() is None
+
+
+def test_synthesize():
+    arch_ref = 'examples.mips.sim:MIPS32_mappable_fc'
+    ir_ref = f'{__name__}:Add_fc'
+    missing_ref = f'{__name__}:Missing_fc'
+    results = synthesize(arch_ref, [missing_ref, ir_ref], max_workers=2)
+    result = results[ir_ref]
+    assert result.status == 'found'
+    assert result.rule is not None
+    # a failing query does not discard the results of the others
+    result = results[missing_ref]
+    assert result.status == 'error'
+    assert isinstance(result.error, AttributeError)
+
+
+def test_synthesize_timeout():
+    arch_ref = 'examples.mips.sim:MIPS32_mappable_fc'
+    ir_ref = f'{__name__}:Add_fc'
+    start = time.perf_counter()
+    results = synthesize(arch_ref, [ir_ref], max_workers=2, timeout=0)
+    assert results[ir_ref].status == 'timeout'
+    # the running queries are killed rather than waited on
+    assert time.perf_counter() - start < 5
+
+
+def test_synthesize_crash():
+    arch_ref = 'examples.mips.sim:MIPS32_mappable_fc'
+    ir_ref = f'{__name__}:Add_fc'
+    crash_ref = f'{__name__}:Crash_fc'
+    # a dead worker fails its queries rather than hanging synthesize, the
+    # other ops run on a new pool
+    results = synthesize(arch_ref, [crash_ref, ir_ref], max_workers=1)
+    assert results[crash_ref].status == 'error'
+    assert isinstance(results[crash_ref].error, BrokenProcessPool)
+    assert results[ir_ref].status == 'found'
+
+
+def test_session():
+    isa = riscv_sim.ISA_fc.Py
+    data = isa.R(rd=isa.Idx(3), rs1=isa.Idx(1), rs2=isa.Idx(2))
+    add = isa.Inst(isa.OP(data=data, tag=isa.AluInst(arith=isa.ArithInst.ADD)))
+    sub = isa.Inst(isa.OP(data=data, tag=isa.AluInst(arith=isa.ArithInst.SUB)))
+    expected = lambda inputs: {'rd': inputs['rs1'] + inputs['rs2']}
+
+    with ArchSession(riscv_sim.R32I_mappable_fc, riscv_family) as session:
+        assert session.check(expected(session.inputs), inst=add) is None
+        cex = session.check(expected(session.inputs), inst=sub)
+        assert cex is not None
+        assert cex['rs2'] != 0
+        # the session is unaffected by previous queries
+        assert session.check(expected(session.inputs), inst=add) is None
+        assert session.queries == 3
+
+    assert check_fresh(riscv_sim.R32I_mappable_fc, riscv_family, expected, inst=add) is None
+
+
+def test_corpus(tmp_path):
+    assert isa_key(riscv_sim.R32I_mappable_fc) == 'riscv'
+    assert isa_key(ext_sim.R32I_mappable_fc) == 'riscv_ext'
+    assert isa_key(mips_sim.MIPS32_mappable_fc) == 'mips'
+
+    corpus = Corpus(tmp_path)
+    assert corpus.vectors('riscv') == []
+    assert corpus.add('riscv', {'rs1': 1, 'rs2': 2}, {'rs2': 2, 'rs1': 1}, {'rs1': 3}) == 2
+    assert corpus.add('riscv', {'rs1': 3}) == 0
+    assert corpus.vectors('riscv') == [{'rs1': 1, 'rs2': 2}, {'rs1': 3}]
+    assert corpus.vectors('mips') == []
+    assert corpus.columns('riscv', ('rs1', 'rs2')) == {'rs1': [1], 'rs2': [2]}
+    assert list(corpus.replay('riscv', lambda: {'rs1': 0}, 2)) == [
+        {'rs1': 1, 'rs2': 2}, {'rs1': 3}, {'rs1': 0}, {'rs1': 0}]
+    corpus.clear()
+    assert corpus.vectors('riscv') == []
+
+    isa = riscv_sim.ISA_fc.Py
+    data = isa.R(rd=isa.Idx(3), rs1=isa.Idx(1), rs2=isa.Idx(2))
+    add = isa.Inst(isa.OP(data=data, tag=isa.AluInst(arith=isa.ArithInst.ADD)))
+    sub = isa.Inst(isa.OP(data=data, tag=isa.AluInst(arith=isa.ArithInst.SUB)))
+    with ArchSession(riscv_sim.R32I_mappable_fc, riscv_family, corpus=corpus) as session:
+        inputs = session.inputs
+        cex = session.check({'rd': inputs['rs1'] + inputs['rs2']}, inst=sub)
+        assert session.check({'rd': inputs['rs1'] + inputs['rs2']}, inst=add) is None
+        edges = edge_vectors(session, inst=add)
+    assert corpus.vectors('riscv') == [cex]
+    # rd = rs1 + rs2 and pc_next = pc + 4 hit 0, 1, -1, smin and smax, the
+    # store port of an add only 0
+    assert len(edges) == 10 + 3
+    assert any((v['rs1'] + v['rs2']) % (1 << 32) == 0 for v in edges)
+    assert any(v['pc'] == (1 << 32) - 4 for v in edges)
+    corpus.add('riscv', *edges)
+    stored = corpus.vectors('riscv')
+    assert all(v in stored for v in edges)
+
+
+def test_rule_counterexample():
+    class Rule:
+        def __init__(self, model):
+            self.model = model
+
+        def verify(self, solver_name):
+            return self.model
+
+    assert rule_counterexample(Rule(None)) is None
+    model = [(Symbol('a', BVType(8)), BV(3, 8)), (Symbol('b', BOOL), TRUE())]
+    assert rule_counterexample(Rule(model)) == {'a': 3, 'b': 1}
+
+
+def test_term_stats():
+    x = SMTBitVector[8](name='x')
+    y = x + x
+    z = y * y
+    # x, x + x, (x + x) * (x + x)
+    assert term_stats(z.value) == {'nodes': 3, 'depth': 3, 'tree': 7}
+    assert term_stats(z.value, y.value) == {'nodes': 3, 'depth': 3, 'tree': 10}
+
+
+def test_smt_stats(tmp_path):
+    stats = smt_stats(riscv_sim.R32I_mappable_fc, riscv_family)
+    assert set(stats['outputs']) == {'pc_next', 'rd', 'st_addr', 'st_data', 'st_size', 'st_en'}
+    for component in ('riscv', 'riscv.Decode', 'riscv.ALU', 'riscv.register_file', 'riscv.memory'):
+        assert stats['components'][component]['calls'] >= 1
+    assert stats['components']['riscv.ALU']['nodes'] <= stats['total']['nodes']
+    path = tmp_path / 'stats.json'
+    dump_stats(stats, path)
+    assert json.loads(path.read_text()) == json.loads(json.dumps(stats))
+
+
+def test_batch():
+    np = pytest.importorskip('numpy')
+    from examples.mapping.batch import BatchEvaluator
+
+    isa = riscv_sim.ISA_fc.Py
+    data = isa.R(rd=isa.Idx(3), rs1=isa.Idx(1), rs2=isa.Idx(2))
+    sra = isa.Inst(isa.OP(data=data, tag=isa.AluInst(shift=isa.ShiftInst.SRA)))
+    batch = BatchEvaluator(riscv_sim.R32I_mappable_fc, riscv_family, inst=sra)
+    assert batch.inputs == {'pc': 32, 'rs1': 32, 'rs2': 32, 'rd': 32, 'ld_data': 32}
+
+    rng = np.random.default_rng(0)
+    pc, rs1, rs2 = rng.integers(0, 1 << 32, size=(3, 1000), dtype=np.uint64)
+    out = batch(pc=pc, rs1=rs1, rs2=rs2, rd=0, ld_data=0)
+    assert out['rd'].dtype == np.uint32
+    assert out['rd'].shape == (1000,)
+    assert (out['pc_next'] == (pc + 4) % (1 << 32)).all()
+    assert (out['st_en'] == 0).all()
+
+    Word = isa.Word
+    for i in range(1000):
+        assert out['rd'][i] == int(Word(int(rs1[i])).bvashr(Word(int(rs2[i]))))
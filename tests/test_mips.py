@@ -5,11 +5,13 @@ import random
 
 import pytest
 
-from hwtypes import BitVector
+from hwtypes import BitVector, SMTBitVector
+from pysmt.shortcuts import is_sat
 from peak.mapper import ArchMapper, RewriteRule
 
-from examples.mips import sim, isa as isa_, family, asm
+from examples.mips import sim, isa as isa_, family, asm, textasm
 from examples.mips.util import clo, clz
+from examples.mapping import isa_key
 
 
 NTESTS = 16
@@ -30,22 +32,28 @@ R_ONLY = {'MUL', 'SUBU', }
 
 @pytest.mark.parametrize('op_name', GOLD.keys())
 @pytest.mark.parametrize('use_imm', (False, True))
-def test_mips(op_name, use_imm):
+def test_mips(op_name, use_imm, corpus, replay):
     if use_imm and op_name in R_ONLY:
         return
     MIPS_py = sim.MIPS32_fc.Py
     isa = isa_.ISA_fc.Py
+    key = isa_key(sim.MIPS32_fc)
+
+    def draw():
+        return {'rs1': random.randrange(0, 1 << isa.Word.size),
+                'rs2': random.randrange(0, 1 << isa.Word.size),
+                'acc': random.randrange(0, 1 << isa.Word.size*2)}
 
     asm_f = getattr(asm, f'asm_{op_name}')
 
     mips_py = MIPS_py()
-    for i in range(1, 32):
-        mips_py.register_file.store(isa.Idx(i), isa.Word(i))
-
-
-    for _ in range(NTESTS):
+    # stored vectors first, failing ones are kept for the next run
+    for v in replay(key, draw, NTESTS):
+        if not v.keys() >= {'rs1', 'rs2', 'acc'}:
+            continue
         rd = isa.Idx(random.randrange(1, 1 << isa.Idx.size))
         rs = isa.Idx(random.randrange(1, 1 << isa.Idx.size))
+        mips_py.register_file.store(rs, isa.Word(v['rs1']))
         if use_imm:
             im = random.randrange(0, 1 << 5)
             inst = asm_f(rd=rd, rs=rs, im=im)
@@ -53,14 +61,102 @@ def test_mips(op_name, use_imm):
             b = isa.Word(im)
         else:
             rt = isa.Idx(random.randrange(1, 1 << isa.Idx.size))
+            mips_py.register_file.store(rt, isa.Word(v['rs2']))
             inst = asm_f(rd=rd, rs=rs, rt=rt)
+            # rs and rt may be the same register
             a = mips_py.register_file.load1(rs)
             b = mips_py.register_file.load1(rt)
 
-        acc = isa.BitVector[64](random.randrange(0, 1 << isa.Word.size*2))
+        acc = isa.BitVector[64](v['acc'])
         acc_next = mips_py(inst, acc)
-        assert GOLD[op_name](a, b) == mips_py.register_file.load1(rd)
-        assert acc == acc_next
+        ok = GOLD[op_name](a, b) == mips_py.register_file.load1(rd) and acc == acc_next
+        if not ok:
+            corpus.add(key, v)
+        assert GOLD[op_name](a, b) == mips_py.register_file.load1(rd), v
+        assert acc == acc_next, v
+
+
+def assert_same_inst(fast, inst):
+    # the fast_ constructors set the private fields of the hwtypes ADTs (see
+    # examples/asmgen.py), their instructions must compare and hash equal
+    assert type(fast) is type(inst)
+    assert fast == inst
+    assert hash(fast) == hash(inst)
+
+
+def test_fast_asm():
+    isa = isa_.ISA_fc.Py
+    names = [name[len('asm_'):] for name in dir(asm) if name.startswith('asm_')]
+    for name in names:
+        asm_f = getattr(asm, f'asm_{name}')
+        fast_f = getattr(asm, f'fast_{name}')
+        for _ in range(NTESTS):
+            rd, rs, rt = (random.randrange(0, 1 << isa.Idx.size) for _ in range(3))
+            if name in ('CLO', 'CLZ'):
+                assert_same_inst(fast_f(rd=rd, rs=rs), asm_f(rd=rd, rs=rs))
+                continue
+            assert_same_inst(fast_f(rd=rd, rs=rs, rt=rt), asm_f(rd=rd, rs=rs, rt=rt))
+            if name in GOLD and name not in R_ONLY:
+                im = random.randrange(0, 1 << isa.Imm.size)
+                assert_same_inst(fast_f(rd=rd, rs=rs, im=im), asm_f(rd=rd, rs=rs, im=im))
+
+
+def test_textasm():
+    isa = isa_.ISA_fc.Py
+    insts = textasm.assemble('''
+        addiu $1, $zero, 5      # a = 5
+        addiu $2, $0, 7
+        addu  $3, $1, $2
+        addu  $3, $1, $2
+        clz   $5, $3
+        mult  $at, $v0
+        ext   $6, $3, 1, 2
+    ''')
+    assert insts[:5] == [
+        asm.asm_ADDU(rd=1, rs=0, im=5),
+        asm.asm_ADDU(rd=2, rs=0, im=7),
+        asm.asm_ADDU(rd=3, rs=1, rt=2),
+        asm.asm_ADDU(rd=3, rs=1, rt=2),
+        asm.asm_CLZ(rd=5, rs=3),
+    ]
+    # identical lines share the instruction
+    assert insts[2] is insts[3]
+    assert insts[5] == isa.Inst(isa.R2(isa.Idx(1), isa.Idx(2), isa.R2Inst.MULT))
+    assert insts[6] == isa.Inst(isa.Rlm(isa.Idx(6), isa.Idx(3), isa.Shift(1), isa.Shift(2), isa.RlmInst.EXT))
+
+    mips = sim.MIPS32_fc.Py()
+    for i in range(32):
+        mips.register_file.store(isa.Idx(i), isa.Word(0))
+    acc = isa.BitVector[64](0)
+    for inst in insts[:5]:
+        acc = mips(inst, acc)
+    assert mips.register_file.load1(isa.Idx(3)) == 12
+    assert mips.register_file.load1(isa.Idx(5)) == 28
+
+    for bad in ('addu $1, $2', 'addiu $1, $2, 70000', 'beq $1, $2, 8', 'addu $1, $2, $x'):
+        with pytest.raises(ValueError, match='line 2'):
+            textasm.assemble('addu $1, $2, $3\n' + bad)
+
+
+def test_array_register_file():
+    isa = isa_.ISA_fc.Py
+    mips = sim.MIPS32_fc(family.ArrayPyFamily())()
+    mips_gold = sim.MIPS32_fc.Py()
+    for i in range(1, 32):
+        mips.register_file.store(isa.Idx(i), isa.Word(i))
+        mips_gold.register_file.store(isa.Idx(i), isa.Word(i))
+
+    acc = isa.BitVector[64](0)
+    for _ in range(NTESTS):
+        rd = random.randrange(0, 1 << isa.Idx.size)
+        rs = random.randrange(0, 1 << isa.Idx.size)
+        rt = random.randrange(0, 1 << isa.Idx.size)
+        inst = asm.asm_SUBU(rd=rd, rs=rs, rt=rt)
+        assert mips(inst, acc) == mips_gold(inst, acc)
+
+    assert mips.register_file.load1(isa.Idx(0)) == 0
+    for i in range(1, 32):
+        assert mips.register_file.load1(isa.Idx(i)) == mips_gold.register_file.load1(isa.Idx(i))
 
 
 def test_mips_smt():
@@ -104,6 +200,16 @@ def test_cl(size):
         lzg = clz_gold(x)
         _test_eq(x, lon, lz, logn, lzg)
 
+@pytest.mark.parametrize('size', (1 << k for k in range(7)))
+def test_cl_smt(size):
+    x = SMTBitVector[size](name=f'x_{size}')
+    # leading ones, built from the lsb up so the msb decides last
+    gold = SMTBitVector[size](size)
+    for i in range(size):
+        gold = x[i].ite(gold, SMTBitVector[size](size - 1 - i))
+    assert not is_sat((clo(x) != gold).value)
+    assert not is_sat((clz(~x) != gold).value)
+
 GOLD_CL = {
     'CLO': clo_gold,
     'CLZ': clz_gold,
@@ -129,3 +235,35 @@ def test_mips_cl(op_name):
         acc_next = mips_py(inst, acc)
         assert GOLD_CL[op_name](a) == mips_py.register_file.load1(rd)
         assert acc == acc_next
+
+
+def test_run():
+    isa = isa_.ISA_fc.Py
+    mips = sim.MIPS32_fc.Py()
+    mips_gold = sim.MIPS32_fc.Py()
+    for i in range(1, 32):
+        mips.register_file.store(isa.Idx(i), isa.Word(i))
+        mips_gold.register_file.store(isa.Idx(i), isa.Word(i))
+
+    insts = [
+        asm.asm_SUBU(rd=1, rs=2, rt=3),
+        isa.Inst(isa.R2(isa.Idx(4), isa.Idx(5), isa.R2Inst.MADD)),
+        asm.asm_ADDU(rd=6, rs=1, rt=4),
+        isa.Inst(isa.R2(isa.Idx(6), isa.Idx(1), isa.R2Inst.MSUBU)),
+    ]
+    base = 0x400
+    program = {base + 4*i: inst for i, inst in enumerate(insts)}
+
+    acc = isa.BitVector[64](7)
+    result = mips.run(program, base, acc)
+    for inst in insts:
+        acc = mips_gold(inst, acc)
+
+    assert result.retired == len(insts)
+    assert result.pc == base + 4*len(insts)
+    assert result.acc == acc
+    for i in range(1, 32):
+        assert mips.register_file.load1(isa.Idx(i)) == mips_gold.register_file.load1(isa.Idx(i))
+
+    result = mips.run(program, base, acc, max_steps=2)
+    assert (result.pc, result.retired) == (base + 8, 2)
@@ -1,8 +1,26 @@
+import operator
+import random
+
+import pytest
+
+from examples.mapping import isa_key
 from examples.reg_overlap.sim import CPU_fc, CPU_mappable_fc
 from examples.reg_overlap.isa import ISA_fc
+from examples.reg_overlap import family
+
+
+NTESTS = 16
 
-def test_py():
-    CPU = CPU_fc.Py
+GOLD = {
+    'ADD': operator.add,
+    'SUB': operator.sub,
+    'AND': operator.and_,
+    'OR': operator.or_,
+}
+
+@pytest.mark.parametrize('fam', [family.PyFamily(), family.ArrayPyFamily()])
+def test_py(fam):
+    CPU = CPU_fc(fam)
     isa = ISA_fc.Py
 
     cpu = CPU()
@@ -66,6 +84,64 @@ def test_py():
     assert cpu.register_file.load1(isa.EBX.idx) == (1 << isa.Word.size)
 
 
+@pytest.mark.parametrize('fam', [family.PyFamily(), family.ArrayPyFamily()])
+@pytest.mark.parametrize('op_name', GOLD.keys())
+@pytest.mark.parametrize('wide', (False, True))
+def test_random(fam, op_name, wide, corpus, replay):
+    isa = ISA_fc.Py
+    cpu = CPU_fc(fam)()
+    key = isa_key(CPU_fc)
+    Reg, Layout = (isa.Reg32, isa.R32) if wide else (isa.Reg16, isa.R16)
+
+    def draw():
+        return {'pc': random.randrange(0, 1 << isa.DWord.size, 4),
+                'rs1_dw': random.randrange(0, 1 << isa.DWord.size),
+                'rs2_dw': random.randrange(0, 1 << isa.DWord.size)}
+
+    # stored vectors first, failing ones are kept for the next run
+    for v in replay(key, draw, NTESTS):
+        if not v.keys() >= {'pc', 'rs1_dw', 'rs2_dw'}:
+            continue
+        rd, rs1, rs2 = (isa.Idx(random.randrange(0, 1 << isa.Idx.size)) for _ in range(3))
+        cpu.register_file.store(rs1, isa.DWord(v['rs1_dw']))
+        cpu.register_file.store(rs2, isa.DWord(v['rs2_dw']))
+        # rs1 and rs2 may be the same register
+        a = cpu.register_file.load1(rs1)
+        b = cpu.register_file.load2(rs2)
+        inst = isa.Inst(
+            data=isa.Layout(Layout(rd=Reg(rd), rs1=Reg(rs1), rs2=Reg(rs2))),
+            tag=getattr(isa, op_name),
+        )
+        expected = GOLD[op_name](a, b)
+        if not wide:
+            # the 16 bit registers clear the upper half
+            expected = expected[:isa.Word.size].zext(isa.DWord.size - isa.Word.size)
+
+        pc = isa.DWord(v['pc'])
+        pc_next = cpu(inst, pc)
+        ok = pc_next == pc + 4 and cpu.register_file.load1(rd) == expected
+        if not ok:
+            corpus.add(key, v)
+        assert pc_next == pc + 4, v
+        assert cpu.register_file.load1(rd) == expected, v
+
+
+def test_array_register_file():
+    isa = ISA_fc.Py
+    rf = family.ArrayPyFamily().get_register_file()()
+    # registers which were never written read as 0
+    assert rf.load1(isa.EAX.idx) == 0
+    assert type(rf.load2(isa.EDX.idx)) is isa.DWord
+    # there is no zero register
+    rf.store(isa.Idx(0), isa.DWord(7))
+    rf.store(isa.Idx(3), isa.DWord(-1))
+    assert rf.load1(isa.Idx(0)) == 7
+    assert rf.load2(isa.Idx(3)) == isa.DWord(-1)
+
+    with pytest.raises(AttributeError):
+        rf.load3
+
+
 def test_smt():
     CPU = CPU_fc.SMT
     cpu = CPU()
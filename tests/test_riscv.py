@@ -1,15 +1,36 @@
 import functools
 import itertools
 import operator
+import os
 import random
+import struct
+import subprocess
+import sys
 
+import libcst as cst
 import pytest
+from pysmt.shortcuts import is_sat
 
 from examples.riscv import family as family_base
+from examples.riscv.util import cache_decode
+from examples.riscv.native import Lockstep, NativeR32I
 from examples.riscv import sim as sim_mod_base, isa as isa_mod_base, asm as asm_base
 from examples.riscv_ext import sim as sim_mod_ext, isa as isa_mod_ext, asm as asm_ext
 from examples.riscv_m import sim as sim_mod_m, isa as isa_mod_m, asm as asm_m
 from examples.riscv_f import sim as sim_mod_f, isa as isa_mod_f, asm as asm_f
+from examples.riscv import encoding as enc_base
+from examples.riscv_ext import encoding as enc_ext
+from examples.riscv_m import encoding as enc_m
+from examples.riscv_f import encoding as enc_f
+from examples.riscv.loader import Program, run
+from examples.riscv import textasm as text_base
+from examples.riscv_ext import textasm as text_ext
+from examples.riscv_m import textasm as text_m
+from examples.riscv_f import textasm as text_f
+from examples.riscv.translate import BlockTranslator
+from examples.riscv.slice import SlicedPyFamily, SlicedSMTFamily, fold_matches
+from examples import asmgen
+from examples.mapping import isa_key
 
 from peak.mapper.utils import rebind_type
 from peak.mapper import create_and_set_bb_outputs
@@ -41,33 +62,256 @@ GOLD = {
         ('ADD', 'SUB', 'SLT', 'SLTU', 'AND', 'OR', 'XOR', 'SLL', 'SRL', 'SRA',)
     )
 @pytest.mark.parametrize('use_imm', (False, True))
-def test_riscv(fcs, op_name, use_imm):
+def test_riscv(fcs, op_name, use_imm, corpus, replay):
     R32I = fcs[0].R32I_fc.Py
     isa = fcs[1].ISA_fc.Py
     asm = fcs[2]
     riscv = R32I()
-    for i in range(1, 32):
-        riscv.register_file.store(isa.Idx(i), isa.Word(i))
+    key = isa_key(fcs[0].R32I_fc)
+
+    def draw():
+        return {'pc': random.randrange(0, 1 << isa.Word.size, 4),
+                'rs1': random.randrange(0, 1 << isa.Word.size),
+                'rs2': random.randrange(0, 1 << isa.Word.size)}
 
     asm_f = getattr(asm, f'asm_{op_name}')
-    for _ in range(NTESTS):
+    # stored vectors first, failing ones are kept for the next run
+    for v in replay(key, draw, NTESTS):
+        if not v.keys() >= {'pc', 'rs1', 'rs2'}:
+            continue
         rs1 = isa.Idx(random.randrange(1, 1 << isa.Idx.size))
         rd = isa.Idx(random.randrange(1, 1 << isa.Idx.size))
+        riscv.register_file.store(rs1, isa.Word(v['rs1']))
+        a = riscv.register_file.load1(rs1)
         if use_imm:
             imm = random.randrange(0, 1 << 5)
             inst = asm_f(rs1=rs1, imm=imm, rd=rd)
-            a = riscv.register_file.load1(rs1)
             b = isa.Word(imm)
         else:
             rs2 = isa.Idx(random.randrange(1, 1 << isa.Idx.size))
-            inst = asm_f(rs1=rs1, rs2=rs2, rd=rd)
+            b = isa.Word(v['rs2'])
+            if op_name == 'SLL':
+                # bvshl builds an int as wide as the shift amount, keep it
+                # below 64 (test_riscv_wide_shift covers 32 and more)
+                b = b & 0x3f
+            riscv.register_file.store(rs2, b)
+            # rs1 and rs2 may be the same register
             a = riscv.register_file.load1(rs1)
             b = riscv.register_file.load1(rs2)
+            inst = asm_f(rs1=rs1, rs2=rs2, rd=rd)
 
-        pc = isa.Word(random.randrange(0, 1 << isa.Word.size, 4))
+        pc = isa.Word(v['pc'])
         pc_next = riscv(inst, pc)
-        assert pc_next == pc + 4
-        assert GOLD[op_name](a, b) == riscv.register_file.load1(rd)
+        ok = pc_next == pc + 4 and GOLD[op_name](a, b) == riscv.register_file.load1(rd)
+        if not ok:
+            corpus.add(key, v)
+        assert pc_next == pc + 4, v
+        assert GOLD[op_name](a, b) == riscv.register_file.load1(rd), v
+
+
+@pytest.mark.parametrize('op_name', tuple(GOLD))
+def test_riscv_aliased(op_name):
+    # rs1, rs2 and rd are the same register
+    isa = isa_mod_base.ISA_fc.Py
+    riscv = sim_mod_base.R32I_fc.Py()
+    asm_f = getattr(asm_base, f'asm_{op_name}')
+    for _ in range(NTESTS):
+        r = isa.Idx(random.randrange(1, 1 << isa.Idx.size))
+        if op_name == 'SLL':
+            a = isa.Word(random.randrange(0, 64))
+        else:
+            a = isa.Word(random.randrange(0, 1 << isa.Word.size))
+        riscv.register_file.store(r, a)
+        riscv(asm_f(rs1=r, rs2=r, rd=r), isa.Word(0))
+        assert riscv.register_file.load1(r) == GOLD[op_name](a, a), a
+
+
+@pytest.mark.parametrize('op_name', ('SLL', 'SRL', 'SRA'))
+def test_riscv_wide_shift(op_name):
+    # shift amounts of 32 and more shift every bit out.  SLL stays below 64,
+    # bvshl builds an int as wide as the shift amount.
+    isa = isa_mod_base.ISA_fc.Py
+    riscv = sim_mod_base.R32I_fc.Py()
+    asm_f = getattr(asm_base, f'asm_{op_name}')
+    amounts = [32, 33, 63]
+    if op_name != 'SLL':
+        amounts += [1 << 31, (1 << 32) - 1]
+    for a in (isa.Word(0x12345678), isa.Word(0x87654321), isa.Word(-1)):
+        for amount in amounts:
+            riscv.register_file.store(isa.Idx(1), a)
+            riscv.register_file.store(isa.Idx(2), isa.Word(amount))
+            riscv(asm_f(rs1=1, rs2=2, rd=3), isa.Word(0))
+            expected = GOLD[op_name](a, isa.Word(amount))
+            assert expected == (isa.Word(-1) if op_name == 'SRA' and a[-1] else 0)
+            assert riscv.register_file.load1(isa.Idx(3)) == expected, (a, amount)
+
+
+def test_ext_isolation():
+    # building riscv_ext must not change the (memoized) base riscv ISA, run
+    # in a fresh interpreter so nothing is built yet
+    code = '''
+from examples.riscv_ext import sim as sim_ext
+from examples.riscv import sim, isa as isa_mod
+sim_ext.R32I_fc.Py()
+isa = isa_mod.ISA_fc.Py
+assert 'bit_inst' not in isa._DecodeOut.field_dict
+assert len(isa.Inst.fields) == 9
+riscv = sim.R32I_fc.Py()
+for i in range(32):
+    riscv.register_file.store(isa.Idx(i), isa.Word(i))
+data = isa.R(rd=isa.Idx(5), rs1=isa.Idx(3), rs2=isa.Idx(4))
+inst = isa.Inst(isa.OP(data, isa.AluInst(arith=isa.ArithInst.ADD)))
+assert riscv(inst, isa.Word(0)) == 4
+assert riscv.register_file.load1(isa.Idx(5)) == 7
+'''
+    subprocess.run(
+        [sys.executable, '-c', code],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))), check=True)
+
+
+def assert_same_inst(fast, inst):
+    # the fast_ constructors set the private fields of the hwtypes ADTs (see
+    # examples/asmgen.py), their instructions must compare and hash equal
+    assert type(fast) is type(inst)
+    assert fast == inst
+    assert hash(fast) == hash(inst)
+
+
+@pytest.mark.parametrize('asm', [asm_base, asm_ext, asm_m, asm_f])
+def test_fast_asm(asm):
+    isa = asm.isa
+    names = [name[len('asm_'):] for name in dir(asm) if name.startswith('asm_')]
+    bit_insts = isa.BitInst._field_table_ if hasattr(isa, 'BitInst') else ()
+    for name in names:
+        asm_f = getattr(asm, f'asm_{name}')
+        fast_f = getattr(asm, f'fast_{name}')
+        for _ in range(NTESTS):
+            rs1, rs2, rd = (random.randrange(0, 1 << isa.Idx.size) for _ in range(3))
+            if name in bit_insts:
+                assert_same_inst(fast_f(rs1=rs1, rd=rd), asm_f(rs1=rs1, rd=rd))
+                continue
+            imm = random.randrange(0, 1 << 5)
+            assert_same_inst(fast_f(rs1=rs1, rs2=rs2, rd=rd), asm_f(rs1=rs1, rs2=rs2, rd=rd))
+            assert_same_inst(fast_f(rs1=rs1, imm=imm, rd=rd), asm_f(rs1=rs1, imm=imm, rd=rd))
+
+
+def test_asmgen(tmp_path, monkeypatch):
+    def load(source):
+        namespace = {'__name__': 'gen', '__file__': str(tmp_path / 'gen.py')}
+        asmgen.generate(namespace, source)
+        return namespace['f']()
+
+    assert load('def f():\n    return 1\n') == 1
+    cached = os.listdir(tmp_path / '__pycache__')
+    assert len(cached) == 1
+
+    def fail(*args):
+        raise AssertionError('compiled again')
+
+    monkeypatch.setattr(asmgen, 'compile', fail, raising=False)
+    assert load('def f():\n    return 1\n') == 1
+    monkeypatch.undo()
+
+    # a new version of the source replaces the old code
+    assert load('def f():\n    return 2\n') == 2
+    assert len(os.listdir(tmp_path / '__pycache__')) == 1
+    assert os.listdir(tmp_path / '__pycache__') != cached
+
+
+@pytest.mark.parametrize('fcs', [(sim_mod_base, isa_mod_base, asm_base),
+                                 (sim_mod_ext, isa_mod_ext, asm_ext),
+                                 (sim_mod_m, isa_mod_m, asm_m),
+                                 (sim_mod_f, isa_mod_f, asm_f),
+                                 ])
+@pytest.mark.parametrize('op_name', tuple(GOLD))
+def test_mappable_replay(fcs, op_name, corpus, replay):
+    pytest.importorskip('numpy')
+    from examples.mapping.batch import BatchEvaluator
+
+    arch_fc = fcs[0].R32I_mappable_fc
+    isa = fcs[1].ISA_fc.Py
+    inst = getattr(fcs[2], f'asm_{op_name}')(rs1=1, rs2=2, rd=3)
+    batch = BatchEvaluator(arch_fc, fcs[1].family, inst=inst)
+    key = isa_key(arch_fc)
+
+    def draw():
+        return {name: random.randrange(0, 1 << width) for name, width in batch.inputs.items()}
+
+    # stored vectors first, failing ones are kept for the next run
+    vectors = [v for v in replay(key, draw, NTESTS * 8) if batch.inputs.keys() <= v.keys()]
+    out = batch(**{name: [v[name] for v in vectors] for name in batch.inputs})
+    for i, v in enumerate(vectors):
+        rd = GOLD[op_name](isa.Word(v['rs1']), isa.Word(v['rs2']))
+        pc_next = isa.Word(v['pc']) + 4
+        if out['rd'][i] != rd.as_uint() or out['pc_next'][i] != pc_next.as_uint():
+            corpus.add(key, v)
+        assert out['rd'][i] == rd.as_uint(), v
+        assert out['pc_next'][i] == pc_next.as_uint(), v
+
+
+@pytest.mark.parametrize('fcs', [(sim_mod_base, isa_mod_base, asm_base),
+                                 (sim_mod_ext, isa_mod_ext, asm_ext),
+                                 (sim_mod_m, isa_mod_m, asm_m),
+                                 (sim_mod_f, isa_mod_f, asm_f),
+                                 ])
+def test_array_register_file(fcs):
+    isa = fcs[1].ISA_fc.Py
+    asm = fcs[2]
+    riscv = fcs[0].R32I_fc(fcs[1].family.ArrayPyFamily())()
+    riscv_gold = fcs[0].R32I_fc.Py()
+    for i in range(1, 32):
+        riscv.register_file.store(isa.Idx(i), isa.Word(i))
+        riscv_gold.register_file.store(isa.Idx(i), isa.Word(i))
+
+    pc = isa.Word(0)
+    for _ in range(NTESTS):
+        rs1 = random.randrange(0, 1 << isa.Idx.size)
+        rs2 = random.randrange(0, 1 << isa.Idx.size)
+        rd = random.randrange(0, 1 << isa.Idx.size)
+        inst = asm.asm_SUB(rs1=rs1, rs2=rs2, rd=rd)
+        pc_next = riscv(inst, pc)
+        assert pc_next == riscv_gold(inst, pc)
+        pc = pc_next
+
+    assert riscv.register_file.load1(isa.Idx(0)) == 0
+    for i in range(1, 32):
+        assert riscv.register_file.load1(isa.Idx(i)) == riscv_gold.register_file.load1(isa.Idx(i))
+
+
+@pytest.mark.parametrize('fcs', [(sim_mod_base, isa_mod_base, asm_base),
+                                 (sim_mod_ext, isa_mod_ext, asm_ext),
+                                 (sim_mod_m, isa_mod_m, asm_m),
+                                 (sim_mod_f, isa_mod_f, asm_f),
+                                 ])
+def test_decode_cache(fcs):
+    R32I = fcs[0].R32I_fc.Py
+    isa = fcs[1].ISA_fc.Py
+    asm = fcs[2]
+    riscv = R32I()
+    riscv_gold = R32I()
+    for i in range(1, 32):
+        riscv.register_file.store(isa.Idx(i), isa.Word(i))
+        riscv_gold.register_file.store(isa.Idx(i), isa.Word(i))
+
+    cache = cache_decode(riscv, maxsize=2)
+    insts = [
+        asm.asm_ADD(rs1=1, rs2=2, rd=3),
+        asm.asm_SUB(rs1=3, rs2=4, rd=5),
+        asm.asm_SRA(rs1=5, imm=3, rd=6),
+    ]
+
+    pc = isa.Word(0)
+    for inst in insts + insts[-1:] + insts:
+        pc_next = riscv(inst, pc)
+        assert pc_next == riscv_gold(inst, pc)
+        pc = pc_next
+
+    for i in range(1, 32):
+        assert riscv.register_file.load1(isa.Idx(i)) == riscv_gold.register_file.load1(isa.Idx(i))
+
+    # third instruction hits, then the first is evicted by the time it repeats
+    info = cache.cache_info()
+    assert (info.hits, info.misses, info.currsize) == (1, 6, 2)
 
 
 @pytest.mark.parametrize('fcs', [(sim_mod_base, isa_mod_base, asm_base),
@@ -104,7 +348,9 @@ def test_riscv_smt(fcs):
 
     asm_inst = AsmInst(inst)
 
-    pc_next, rd_next = riscv(asm_inst, pc, rs1_v, rs2_v, rd_init)
+    ld_data = fam.Word(name='ld_data')
+
+    pc_next, rd_next, *_ = riscv(asm_inst, pc, rs1_v, rs2_v, rd_init, ld_data)
 
     # Recall pysmt == is structural equiv
     assert pc_next.value == (pc.value + 4)
@@ -121,13 +367,104 @@ def test_riscv_smt(fcs):
 
     asm_inst = AsmInst(inst)
 
-    pc_next, rd_next = riscv(asm_inst, pc, rs1_v, rs2_v, rd_init)
+    pc_next, rd_next, *_ = riscv(asm_inst, pc, rs1_v, rs2_v, rd_init, ld_data)
 
     assert pc_next.value == (pc.value + 4)
     assert rd_next.value != (rs1_v.value - rs2_v.value)
     assert rd_next.value != (rs1_v - rs2_v).value
     assert rd_next.value == rd_init.value
 
+_DISPATCH = '''
+if inst[isa.OP].match:
+    x = 0
+elif inst[isa.LUI].match:
+    x = 1
+else:
+    assert inst[isa.Store].match
+    x = 2
+'''
+
+def test_slice():
+    names = 'OP', 'LUI', 'Store'
+    tree = cst.parse_module(_DISPATCH)
+    def fold(*reachable):
+        return fold_matches(names, reachable).rewrite(tree, None, {})[0].code
+
+    assert fold(*names) == _DISPATCH
+    assert fold('LUI') == '\nx = 1\n'
+    assert fold('Store') == '\nassert inst[isa.Store].match\nx = 2\n'
+    assert fold('OP', 'Store') == _DISPATCH.replace('''elif inst[isa.LUI].match:
+    x = 1
+''', '')
+    assert fold('OP', 'LUI') == '''
+if inst[isa.OP].match:
+    x = 0
+else:
+    x = 1
+'''
+
+    isa = isa_mod_base.ISA_fc.Py
+    fam = SlicedSMTFamily([isa.OP])
+    R32I = sim_mod_base.R32I_mappable_fc(fam)
+    AsmInst = fam.get_adt_t(fam.Inst)
+    riscv = R32I()
+
+    rs1_v = fam.Word(name='rs1')
+    rs2_v = fam.Word(name='rs2')
+    rd_init = fam.Word(name='rd_init')
+    pc = fam.Word(name='pc')
+
+    data  = isa.R(rd=isa.Idx(3), rs1=isa.Idx(1), rs2=isa.Idx(2))
+    tag = isa.AluInst(arith=isa.ArithInst.SUB)
+    inst = fam.Inst(isa.OP(data=data, tag=tag))
+
+    ld_data = fam.Word(name='ld_data')
+
+    pc_next, rd_next, st_addr, st_data, st_size, st_en = riscv(
+        AsmInst(inst), pc, rs1_v, rs2_v, rd_init, ld_data)
+    assert pc_next.value == (pc.value + 4)
+    assert rd_next.value == (rs1_v - rs2_v).value
+    assert not is_sat(st_en.value)
+
+    # loads return ld_data and stores drive the store port
+    fam = SlicedSMTFamily([isa.Load, isa.Store])
+    riscv = sim_mod_base.R32I_mappable_fc(fam)()
+    AsmInst = fam.get_adt_t(fam.Inst)
+    imm = isa.I.imm(8)
+    lw = fam.Inst(isa.Load(isa.I(rd=isa.Idx(3), rs1=isa.Idx(1), imm=imm), isa.LoadInst.LW))
+    pc_next, rd_next, st_addr, st_data, st_size, st_en = riscv(
+        AsmInst(lw), pc, rs1_v, rs2_v, rd_init, ld_data)
+    assert not is_sat((rd_next != ld_data).value)
+    assert not is_sat(st_en.value)
+
+    sw = fam.Inst(isa.Store(isa.S(rs1=isa.Idx(1), rs2=isa.Idx(2), imm=isa.S.imm(8)), isa.StoreInst.SW))
+    pc_next, rd_next, st_addr, st_data, st_size, st_en = riscv(
+        AsmInst(sw), pc, rs1_v, rs2_v, rd_init, ld_data)
+    assert not is_sat((~st_en).value)
+    assert not is_sat((st_addr != rs1_v + fam.Word(8)).value)
+    assert not is_sat((st_data != rs2_v).value)
+    assert not is_sat((rd_next != rd_init).value)
+
+
+def test_slice_family():
+    isa = isa_mod_base.ISA_fc.Py
+    # slices are memoized by their choices
+    assert SlicedSMTFamily([isa.OP]) != SlicedSMTFamily([isa.Load])
+    assert SlicedSMTFamily([isa.OP, isa.LUI]) == SlicedSMTFamily([isa.LUI, isa.OP])
+    assert hash(SlicedPyFamily([isa.OP, isa.LUI])) == hash(SlicedPyFamily([isa.LUI, isa.OP]))
+    assert SlicedPyFamily([isa.OP]) != SlicedSMTFamily([isa.OP])
+    with pytest.raises(ValueError):
+        SlicedPyFamily([isa.R])
+
+    # the Py peaks take the same narrowed instruction as the SMT peaks and
+    # widen it back
+    fam = SlicedPyFamily([isa.OP])
+    data = isa.R(rd=isa.Idx(3), rs1=isa.Idx(1), rs2=isa.Idx(2))
+    op = isa.OP(data=data, tag=isa.AluInst(arith=isa.ArithInst.SUB))
+    assert fam.Inst is SlicedSMTFamily([isa.OP]).Inst
+    assert fam.widen(fam.Inst(op)) == isa.Inst(op)
+
+
 def test_riscv_f_smt():
     sim_mod = sim_mod_f
     isa_mod = isa_mod_f
@@ -150,6 +487,7 @@ def test_riscv_f_smt():
     rs2_f_v = fam.Word(name='rs2_f')
     rs3_f_v = fam.Word(name='rs3_f')
     rd_f_init = fam.Word(name='rd_f_init')
+    ld_data = fam.Word(name='ld_data')
 
     r0 = isa.Idx(0)
     rs1 = isa.Idx(1)
@@ -163,7 +501,7 @@ def test_riscv_f_smt():
 
     asm_inst = AsmInst(inst)
 
-    pc_next, rd_next, rd_f_next = riscv(asm_inst, pc, rs1_v, rs2_v, rd_init, rs1_f_v, rs2_f_v, rs3_f_v, rd_f_init)
+    pc_next, rd_next, rd_f_next, *_ = riscv(asm_inst, pc, rs1_v, rs2_v, rd_init, rs1_f_v, rs2_f_v, rs3_f_v, rd_f_init, ld_data)
 
     # Recall pysmt == is structural equiv
     assert pc_next.value == (pc.value + 4)
@@ -180,7 +518,7 @@ def test_riscv_f_smt():
 
     asm_inst = AsmInst(inst)
 
-    pc_next, rd_next, rd_f_next = riscv(asm_inst, pc, rs1_v, rs2_v, rd_init, rs1_f_v, rs2_f_v, rs3_f_v, rd_f_init)
+    pc_next, rd_next, rd_f_next, *_ = riscv(asm_inst, pc, rs1_v, rs2_v, rd_init, rs1_f_v, rs2_f_v, rs3_f_v, rd_f_init, ld_data)
 
     assert pc_next.value == (pc.value + 4)
     assert rd_next.value != (rs1_v.value - rs2_v.value)
@@ -282,5 +620,590 @@ def test_ext(op_name):
         assert GOLD_EXT[op_name](a) == riscv.register_file.load1(rd)
 
 
+def test_bit_counter():
+    isa = isa_mod_ext.ISA_fc.Py
+    ref = sim_mod_ext.BitCounter_fc.Py()
+    tree = sim_mod_ext.BitCounterTree_fc.Py()
+    values = [0, 1, 0x80000000, 0xffffffff, 0x0000ffff, 0xffff0000]
+    values += [random.getrandbits(32) >> random.randrange(32) for _ in range(NTESTS)]
+    for inst in isa.BitInst.enumerate():
+        for v in values:
+            assert ref(inst, isa.Word(v)) == tree(inst, isa.Word(v))
+
+    fam = isa_mod_ext.family.SMTFamily()
+    ref = sim_mod_ext.BitCounter_fc(fam)()
+    tree = sim_mod_ext.BitCounterTree_fc(fam)()
+    BitInst = fam.get_adt_t(isa.BitInst)
+    val = fam.Word(name='val')
+    for inst in isa.BitInst.enumerate():
+        assert not is_sat((ref(BitInst(inst), val) != tree(BitInst(inst), val)).value)
+
+
+def test_bit_counter_family():
+    # the family picks the BitCounter of R32I
+    tree = isa_mod_ext.family.SMTFamily()
+    unrolled = isa_mod_ext.family.SMTFamily(bit_counter_tree=False)
+    assert tree != unrolled
+    assert type(sim_mod_ext.R32I_fc(tree)().bitcounter) is sim_mod_ext.BitCounterTree_fc(tree)
+    assert type(sim_mod_ext.R32I_fc(unrolled)().bitcounter) is sim_mod_ext.BitCounter_fc(unrolled)
+    assert type(sim_mod_ext.R32I_fc.Py().bitcounter) is sim_mod_ext.BitCounter_fc.Py
+
+
+def _random_bv(T):
+    return T(random.randrange(0, 1 << T.size))
+
+def _random_inst(isa, asm):
+    rs1 = random.randrange(0, 1 << isa.Idx.size)
+    rs2 = random.randrange(0, 1 << isa.Idx.size)
+    rd = random.randrange(0, 1 << isa.Idx.size)
+    kind = random.choice(('op', 'op_imm', 'lui', 'auipc', 'jal', 'jalr', 'branch', 'load', 'store', 'muldiv', 'ext'))
+    if kind == 'op':
+        op_name = random.choice(tuple(GOLD))
+        return getattr(asm, f'asm_{op_name}')(rs1=rs1, rs2=rs2, rd=rd)
+    elif kind == 'op_imm':
+        op_name = random.choice(tuple(GOLD))
+        return getattr(asm, f'asm_{op_name}')(rs1=rs1, imm=random.randrange(0, 1 << 5), rd=rd)
+    elif kind in ('lui', 'auipc', 'jal'):
+        T, data_T = {'lui': (isa.LUI, isa.U), 'auipc': (isa.AUIPC, isa.U), 'jal': (isa.JAL, isa.J)}[kind]
+        return isa.Inst(T(data_T(rd=isa.Idx(rd), imm=_random_bv(data_T.imm))))
+    elif kind == 'jalr':
+        return isa.Inst(isa.JALR(isa.I(rd=isa.Idx(rd), rs1=isa.Idx(rs1), imm=_random_bv(isa.I.imm))))
+    elif kind == 'branch':
+        data = isa.B(rs1=isa.Idx(rs1), rs2=isa.Idx(rs2), imm=_random_bv(isa.B.imm))
+        tag = random.choice(tuple(isa.BranchInst.enumerate()))
+        return isa.Inst(isa.Branch(data, tag))
+    elif kind == 'load':
+        data = isa.I(rd=isa.Idx(rd), rs1=isa.Idx(rs1), imm=_random_bv(isa.I.imm))
+        # LWU and LD are RV64 only
+        tag = random.choice([t for t in isa.LoadInst.enumerate() if t.name not in ('LWU', 'LD')])
+        return isa.Inst(isa.Load(data, tag))
+    elif kind == 'store':
+        data = isa.S(rs1=isa.Idx(rs1), rs2=isa.Idx(rs2), imm=_random_bv(isa.S.imm))
+        tag = random.choice([t for t in isa.StoreInst.enumerate() if t.name != 'SD'])
+        return isa.Inst(isa.Store(data, tag))
+    elif kind == 'muldiv' and hasattr(isa, 'MulDivInst'):
+        data = isa.R(rd=isa.Idx(rd), rs1=isa.Idx(rs1), rs2=isa.Idx(rs2))
+        tag = isa.AluInst(muldiv=random.choice(tuple(isa.MulDivInst.enumerate())))
+        return isa.Inst(isa.OP(data, tag))
+    elif kind == 'ext' and hasattr(isa, 'BitInst'):
+        op_name = random.choice(tuple(GOLD_EXT))
+        return getattr(asm, f'asm_{op_name}')(rs1=rs1, rd=rd)
+    else:
+        return asm.asm_ADD(rs1=rs1, rs2=rs2, rd=rd)
+
+
+@pytest.mark.parametrize('fcs', [(sim_mod_base, isa_mod_base, asm_base),
+                                 (sim_mod_ext, isa_mod_ext, asm_ext),
+                                 (sim_mod_m, isa_mod_m, asm_m),
+                                 ])
+def test_native_lockstep(fcs):
+    isa = fcs[1].ISA_fc.Py
+    asm = fcs[2]
+    cpu = Lockstep(fcs[0])
+    for i in range(1, 32):
+        cpu.regs[i] = random.randrange(0, 1 << isa.Word.size)
+
+    pc = 0
+    for _ in range(NTESTS * 8):
+        pc = cpu(_random_inst(isa, asm), pc)
+    assert cpu.checked == NTESTS * 8
+
 
+def test_encoding():
+    asm = asm_base
+    isa = isa_mod_base.ISA_fc.Py
+    # add x3, x1, x2
+    assert enc_base.encode(asm.asm_ADD(rs1=1, rs2=2, rd=3)) == 0x002081b3
+    # addi x1, x0, 5
+    assert enc_base.encode(asm.asm_ADD(rs1=0, imm=5, rd=1)) == 0x00500093
+    # srai x5, x6, 3
+    assert enc_base.encode(asm.asm_SRA(rs1=6, imm=3, rd=5)) == 0x40335293
+    # bne x0, x0, -4
+    inst = enc_base.decode(0xfe001ee3)
+    assert inst == isa.Inst(isa.Branch(isa.B(rs1=isa.Idx(0), rs2=isa.Idx(0), imm=isa.B.imm(-2)), isa.BranchInst.BNE))
+    # jal x0, -8
+    assert enc_base.decode(0xff9ff06f) == isa.Inst(isa.JAL(isa.J(rd=isa.Idx(0), imm=isa.J.imm(-4))))
+
+    with pytest.raises(ValueError):
+        # clz, not in the base ISA
+        enc_base.decode(0x60009093)
+
+    # cpop x1, x2
+    isa = isa_mod_ext.ISA_fc.Py
+    assert enc_ext.decode(0x60211093) == asm_ext.asm_POPCNT(rs1=2, rd=1)
+
+    # fadd.s f1, f2, f3, rne
+    isa = isa_mod_f.ISA_fc.Py
+    data = isa.R(rd=isa.Idx(1), rs1=isa.Idx(2), rs2=isa.Idx(3))
+    inst = isa.Inst(isa.OP_FP(compute=isa.FComputation(data=data, rm=isa.RM.RNE, tag=isa.FPComputeInst.FADD)))
+    assert enc_f.encode(inst) == 0x003100d3
+
+    # f1 = ±(f2*f3) ± f4, rne.  FNMA is -(a*b)+c (fnmsub) and FNMS is
+    # -(a*b)-c (fnmadd)
+    data = isa.R4(rd=isa.Idx(1), rs1=isa.Idx(2), rs2=isa.Idx(3), rs3=isa.Idx(4))
+    for word, tag in (
+            (0x203100c3, 'FMA'),   # fmadd.s
+            (0x203100c7, 'FMS'),   # fmsub.s
+            (0x203100cb, 'FNMA'),  # fnmsub.s
+            (0x203100cf, 'FNMS'),  # fnmadd.s
+        ):
+        inst = isa.Inst(isa.OP_FUSED(data=data, rm=isa.RM.RNE, tag=getattr(isa.FPFusedInst, tag)))
+        assert enc_f.decode(word) == inst
+        assert enc_f.encode(inst) == word
+
+    # ld / lwu / sd x1, 0(x2) are RV64 only
+    for word in (0x00013083, 0x00016083, 0x00113023):
+        for enc in (enc_base, enc_f):
+            with pytest.raises(ValueError):
+                enc.decode(word)
+    isa = isa_mod_base.ISA_fc.Py
+    data = isa.I(rd=isa.Idx(1), rs1=isa.Idx(2), imm=isa.I.imm(0))
+    with pytest.raises(ValueError):
+        enc_base.encode(isa.Inst(isa.Load(data, isa.LoadInst.LD)))
+
+
+@pytest.mark.parametrize('enc', [enc_base, enc_ext, enc_m, enc_f])
+def test_encoding_roundtrip(enc):
+    decoded = []
+    while len(decoded) < NTESTS * 8:
+        word = random.randrange(0, 1 << 32)
+        try:
+            inst = enc.decode(word)
+        except ValueError:
+            continue
+        assert enc.encode(inst) == word
+        decoded.append(inst)
+
+    buf = enc.encode_all(decoded)
+    assert len(buf) == 4 * len(decoded)
+    assert enc.decode_all(memoryview(buf)) == decoded
+
+
+def _elf(code, entry, data=None):
+    # data is (vaddr, contents, memsz) of a read / write segment
+    phnum = 1 if data is None else 2
+    offset = 52 + 32*phnum
+    ehdr = struct.pack('<16sHHIIIIIHHHHHH',
+            b'\x7fELF\x01\x01\x01' + bytes(9),
+            2, 243, 1, entry, 52, 0, 0, 52, 32, phnum, 0, 0, 0)
+    phdr = struct.pack('<IIIIIIII', 1, offset, entry, entry, len(code), len(code), 5, 4)
+    if data is None:
+        return ehdr + phdr + code
+    vaddr, contents, memsz = data
+    phdr += struct.pack('<IIIIIIII', 1, offset + len(code), vaddr, vaddr, len(contents), memsz, 6, 4)
+    return ehdr + phdr + code + contents
+
+
+@pytest.mark.parametrize('fmt', ['raw', 'elf'])
+def test_loader(fmt, tmp_path):
+    isa = isa_mod_base.ISA_fc.Py
+    asm = asm_base
+    code = enc_base.encode_all([
+        asm.asm_ADD(rs1=0, imm=5, rd=1),
+        asm.asm_ADD(rs1=0, imm=7, rd=2),
+        asm.asm_ADD(rs1=1, rs2=2, rd=3),
+        # j .
+        enc_base.decode(0x0000006f),
+    ])
+    base = 0x1000
+    path = tmp_path / 'prog.bin'
+    if fmt == 'raw':
+        path.write_bytes(code)
+    else:
+        path.write_bytes(_elf(code, base))
+
+    with Program.from_file(path, base=base) as program:
+        assert program.entry == base
+        assert base + 12 in program
+        assert base + 16 not in program
+        assert program[base + 8] == asm.asm_ADD(rs1=1, rs2=2, rd=3)
+        with pytest.raises(IndexError):
+            program[base + 16]
+
+        cpu = sim_mod_base.R32I_fc.Py()
+        result = run(cpu, program)
+        assert (result.pc, result.retired) == (base + 12, 4)
+        assert cpu.register_file.load1(isa.Idx(3)) == 12
+
+        cpu = NativeR32I(sim_mod_base)
+        result = run(cpu, program, max_steps=2)
+        assert (result.pc, result.retired) == (base + 8, 2)
+        assert cpu.regs[1:4] == [5, 7, 0]
+
+
+def test_loader_isa():
+    source = '''
+            li   x1, 6
+            li   x2, 7
+            mul  x3, x1, x2
+    done:   j .
+    '''
+    buf = text_m.assemble(source)
+    for cpu in (sim_mod_m.R32I_fc.Py(), NativeR32I(sim_mod_m)):
+        # decoded as base riscv by default
+        with pytest.raises(ValueError, match='codec'):
+            run(cpu, Program(buf))
+        result = run(cpu, Program(buf, codec=enc_m.codec))
+        assert result.pc == 12
+        if isinstance(cpu, NativeR32I):
+            assert cpu.regs[3] == 42
+        else:
+            assert cpu.register_file.load1(isa_mod_m.ISA_fc.Py.Idx(3)) == 42
+
+
+def test_loader_data(tmp_path):
+    code = text_base.assemble('''
+            lui  x1, 2
+            lw   x2, 0(x1)      # .data
+            lw   x3, 4(x1)      # .bss
+            sw   x2, 8(x1)
+    done:   j .
+    ''', base=0x1000)
+    path = tmp_path / 'prog.elf'
+    path.write_bytes(_elf(code, 0x1000, (0x2000, struct.pack('<I', 0xcafe), 12)))
+
+    with Program.from_file(path) as program:
+        # only the executable segment holds instructions
+        assert 0x1000 in program
+        assert 0x2000 not in program
+        for cpu in (sim_mod_base.R32I_fc.Py(), NativeR32I(sim_mod_base)):
+            if isinstance(cpu, NativeR32I):
+                reg = cpu.regs.__getitem__
+            else:
+                reg = lambda i: cpu.register_file.load1(isa_mod_base.ISA_fc.Py.Idx(i))
+
+            cpu.memory.write(0x2004, b'\xff' * 8)
+            result = run(cpu, program)
+            assert result.pc == 0x1010
+            assert (reg(2), reg(3)) == (0xcafe, 0)
+            assert cpu.memory.read(0x2000, 12) == struct.pack('<III', 0xcafe, 0, 0xcafe)
+
+            # continuing does not reload the program
+            cpu.memory.write(0x2000, bytes(4))
+            run(cpu, program, pc=0x1004, max_steps=1, load=False)
+            assert reg(2) == 0
+
+
+def test_textasm(tmp_path, monkeypatch):
+    isa = isa_mod_base.ISA_fc.Py
+    asm = asm_base
+    source = '''
+    start:  li   x1, 10         # counter
+            li   x2, 0x12345fff
+            beqz zero, skip
+            .word 0
+    skip:   mv   x2, zero
+    loop:   add  x2, x2, x1
+            addi x1, x1, -1
+            bnez x1, loop
+    done:   j .
+    '''
+    base = 0x1000
+    buf = text_base.assemble(source, base=base)
+    # li of a large value expands to lui + addi
+    assert len(buf) == 4 * 10
+    assert buf[:4] == enc_base.encode_all([asm.asm_ADD(rs1=0, imm=10, rd=1)])
+    assert buf[24:32] == enc_base.encode_all([
+        asm.asm_ADD(rs1=2, rs2=1, rd=2),
+        asm.asm_ADD(rs1=1, imm=0xfff, rd=1),
+    ])
+    assert text_base.assemble('sw x2, -8(sp)\nj 8') == enc_base.encode_all([
+        isa.Inst(isa.Store(isa.S(rs1=isa.Idx(2), rs2=isa.Idx(2), imm=isa.S.imm(-8 & 0xfff)), isa.StoreInst.SW)),
+        isa.Inst(isa.JAL(isa.J(rd=isa.Idx(0), imm=isa.J.imm(4)))),
+    ])
+
+    program = Program(buf, base=base)
+    cpu = sim_mod_base.R32I_fc.Py()
+    result = run(cpu, program)
+    assert (result.pc, result.retired) == (base + 36, 3 + 2 + 3*10 + 1)
+    assert cpu.register_file.load1(isa.Idx(2)) == 55
+
+    assert text_ext.assemble('cpop a0, a1') == enc_ext.encode_all([asm_ext.asm_POPCNT(rs1=11, rd=10)])
+    assert text_m.assemble('mul x3, x1, x2') == enc_m.encode_all([
+        isa_mod_m.ISA_fc.Py.Inst(isa_mod_m.ISA_fc.Py.OP(
+            isa_mod_m.ISA_fc.Py.R(rd=isa.Idx(3), rs1=isa.Idx(1), rs2=isa.Idx(2)),
+            isa_mod_m.ISA_fc.Py.AluInst(muldiv=isa_mod_m.ISA_fc.Py.MulDivInst.MUL)))
+    ])
+
+    for bad in ('addi x1, x2', 'addi x1, x2, 4096', 'beq x1, x2, nowhere',
+                'mul x1, x2, x3', 'add x1, x2, y3', 'beq x0, x0, 3'):
+        with pytest.raises(ValueError, match='line 2'):
+            text_base.assemble('nop\n' + bad)
+
+    cache = str(tmp_path)
+    assert text_base.assemble(source, base=base, cache=cache) == buf
+    def fail(*args):
+        raise AssertionError('assembled again')
+    monkeypatch.setattr(text_base.assembler, '_words', fail)
+    assert text_base.assemble(source, base=base, cache=cache) == buf
+    with pytest.raises(AssertionError):
+        text_base.assemble(source, base=base + 4, cache=cache)
+
+
+def test_textasm_f():
+    isa = isa_mod_f.ISA_fc.Py
+    idx = isa.Idx
+    r = isa.R(rd=idx(1), rs1=idx(2), rs2=idx(3))
+    r2 = isa.R2(rd=idx(10), rs1=idx(10))
+    cmp = isa.R(rd=idx(10), rs1=idx(10), rs2=idx(11))
+    r4 = isa.R4(rd=idx(1), rs1=idx(2), rs2=idx(3), rs3=idx(4))
+    source = '''
+        fadd.s   f1, f2, f3, rne
+        fdiv.s   f1, f2, f3
+        fsqrt.s  fa0, fa0, rtz
+        fmax.s   f1, f2, f3
+        feq.s    a0, fa0, fa1
+        fclass.s a0, fa0
+        fnmsub.s f1, f2, f3, f4, rne
+        fmadd.s  f1, f2, f3, f4
+    '''
+    insts = [
+        isa.OP_FP(compute=isa.FComputation(data=r, rm=isa.RM.RNE, tag=isa.FPComputeInst.FADD)),
+        isa.OP_FP(compute=isa.FComputation(data=r, rm=isa.RM.DYN, tag=isa.FPComputeInst.FDIV)),
+        isa.OP_FP(sqrt=isa.FSqrt(data=r2, rm=isa.RM.RTZ)),
+        isa.OP_FP(minmax=isa.FMinMax(data=r, tag=isa.FPMinMaxInst.MAX)),
+        isa.OP_FP(compare=isa.FCMP(data=cmp, tag=isa.FPCompareInst.EQ)),
+        isa.OP_FP(class_=isa.FCLASS(data=r2)),
+        isa.OP_FUSED(data=r4, rm=isa.RM.RNE, tag=isa.FPFusedInst.FNMA),
+        isa.OP_FUSED(data=r4, rm=isa.RM.DYN, tag=isa.FPFusedInst.FMA),
+    ]
+    buf = text_f.assemble(source)
+    assert buf == enc_f.encode_all([isa.Inst(inst) for inst in insts])
+    words = struct.unpack(f'<{len(insts)}I', buf)
+    # as encoded by binutils
+    assert words[0] == 0x003100d3
+    assert words[4] == 0xa0b52553
+    assert words[5] == 0xe0051553
+    assert words[6] == 0x203100cb
+
+    # integer instructions still assemble
+    assert text_f.assemble('add x3, x1, x2') == text_base.assemble('add x3, x1, x2')
+    for bad in ('fadd.s f1, f2, x3', 'fadd.s f1, f2, f3, up', 'fsqrt.s f1',
+                'feq.s f1, f2, f3', 'fmadd.s f1, f2, f3'):
+        with pytest.raises(ValueError, match='line 1'):
+            text_f.assemble(bad)
+    with pytest.raises(ValueError, match='unknown instruction'):
+        text_base.assemble('fadd.s f1, f2, f3')
+
+
+@pytest.mark.parametrize('fcs', [(sim_mod_base, isa_mod_base),
+                                 (sim_mod_ext, isa_mod_ext),
+                                 (sim_mod_m, isa_mod_m),
+                                 (sim_mod_f, isa_mod_f),
+                                 ])
+@pytest.mark.parametrize('array', (False, True))
+def test_memory(fcs, array):
+    # every RV32 variant runs loads and stores on the same memory
+    sim_mod, isa_mod = fcs
+    fam = isa_mod.family.ArrayPyFamily() if array else isa_mod.family.PyFamily()
+    isa = isa_mod.ISA_fc.Py
+    riscv = sim_mod.R32I_fc(fam)()
+
+    def load(tag, rd, rs1, imm):
+        data = isa.I(rd=isa.Idx(rd), rs1=isa.Idx(rs1), imm=isa.I.imm(imm))
+        return isa.Inst(isa.Load(data, getattr(isa.LoadInst, tag)))
+
+    def store(tag, rs2, rs1, imm):
+        data = isa.S(rs1=isa.Idx(rs1), rs2=isa.Idx(rs2), imm=isa.S.imm(imm))
+        return isa.Inst(isa.Store(data, getattr(isa.StoreInst, tag)))
+
+    riscv.register_file.store(isa.Idx(1), isa.Word(0xff8))
+    riscv.register_file.store(isa.Idx(2), isa.Word(0xdeadbeef))
+
+    pc = isa.Word(0)
+    # crosses from the first page in to the second
+    pc = riscv(store('SW', 2, 1, 6), pc)
+    assert riscv.memory.read(0xffe, 4) == bytes.fromhex('efbeadde')
+    assert set(riscv.memory.pages) == {0, 1}
+
+    for tag, imm, expected in (
+            ('LB', 6, 0xffffffef),
+            ('LBU', 6, 0xef),
+            ('LH', 6, 0xffffbeef),
+            ('LHU', 6, 0xbeef),
+            ('LW', 6, 0xdeadbeef),
+            ('LB', 9, 0xffffffde),
+            ('LW', 8, 0xdead),
+            ('LW', -8, 0),
+        ):
+        pc = riscv(load(tag, 3, 1, imm), pc)
+        assert riscv.register_file.load1(isa.Idx(3)) == expected
+
+    # loads to x0 are discarded and reads never allocate pages
+    pc = riscv(load('LW', 0, 1, 6), pc)
+    assert riscv.register_file.load1(isa.Idx(0)) == 0
+    assert set(riscv.memory.pages) == {0, 1}
+
+    pc = riscv(store('SB', 0, 1, 7), pc)
+    pc = riscv(store('SH', 2, 1, 0), pc)
+    assert riscv.memory.read(0xff8, 10) == bytes.fromhex('efbe00000000ef00adde')
+    assert pc == 4 * 12
+
+
+def test_native_memory():
+    program = Program(text_base.assemble('''
+            li   x1, 0xff8
+            li   x2, 0xdeadbeef
+            sw   x2, 6(x1)      # crosses a page
+            lb   x3, 6(x1)
+            lhu  x4, 6(x1)
+            lw   x5, 8(x1)
+            sb   zero, 7(x1)
+            lw   x6, 6(x1)
+    done:   j .
+    '''))
+    expected = {3: 0xffffffef, 4: 0xbeef, 5: 0xdead, 6: 0xdead00ef}
+
+    lockstep = Lockstep(sim_mod_base)
+    pc, pc_next = None, 0
+    while pc != pc_next:
+        pc, pc_next = pc_next, lockstep(program[pc_next], pc_next)
+    assert lockstep.checked == 11
+
+    native = NativeR32I(sim_mod_base)
+    native.run(program, 0)
+    translator = BlockTranslator(sim_mod_base, program)
+    translator.run(0)
+    for cpu in (lockstep, native, translator):
+        assert {i: cpu.regs[i] for i in expected} == expected
+    assert native.memory.read(0xffe, 4) == bytes.fromhex('ef00adde')
+    assert translator.memory.pages == native.memory.pages
+
+    # stores are checked against the model, make the native sw store a byte
+    native = lockstep.native
+    decode = native.decode
+    native.decode = lambda inst, pc: decode(inst, pc)[:-1] + (1,)
+    lockstep.regs[2] = 0x12345678
+    with pytest.raises(AssertionError, match='memory mismatch'):
+        lockstep(program[16], 16)
 
+
+@pytest.mark.parametrize('fcs', [(sim_mod_base, isa_mod_base, asm_base),
+                                 (sim_mod_ext, isa_mod_ext, asm_ext),
+                                 (sim_mod_m, isa_mod_m, asm_m),
+                                 (sim_mod_f, isa_mod_f, asm_f),
+                                 ])
+def test_run(fcs):
+    isa = fcs[1].ISA_fc.Py
+    asm = fcs[2]
+    bne = isa.Branch(isa.B(rs1=isa.Idx(1), rs2=isa.Idx(0), imm=isa.B.imm(-4)), isa.BranchInst.BNE)
+    insts = [
+        asm.asm_ADD(rs1=0, imm=10, rd=1),
+        # loop: x2 += x1; x1 -= 1
+        asm.asm_ADD(rs1=2, rs2=1, rd=2),
+        asm.asm_SUB(rs1=1, imm=1, rd=1),
+        isa.Inst(bne),
+        # j .
+        isa.Inst(isa.JAL(isa.J(rd=isa.Idx(0), imm=isa.J.imm(0)))),
+    ]
+    program = {4*i: inst for i, inst in enumerate(insts)}
+
+    def make():
+        riscv = fcs[0].R32I_fc.Py()
+        for i in range(1, 3):
+            riscv.register_file.store(isa.Idx(i), isa.Word(0))
+        return riscv
+
+    riscv = make()
+    result = riscv.run(program, isa.Word(0))
+    assert result.pc == 16
+    assert result.retired == 1 + 3*10 + 1
+    assert result.time >= 0
+    assert riscv.register_file.load1(isa.Idx(2)) == 55
+
+    riscv = make()
+    result = riscv.run(program, isa.Word(0), max_steps=5)
+    assert (result.pc, result.retired) == (8, 5)
+
+    # falls off the end of the program
+    del program[16]
+    riscv = make()
+    riscv.register_file.store(isa.Idx(1), isa.Word(1))
+    result = riscv.run(program, isa.Word(8))
+    assert (result.pc, result.retired) == (16, 2)
+
+
+@pytest.mark.parametrize('fcs', [(sim_mod_base, isa_mod_base, asm_base),
+                                 (sim_mod_ext, isa_mod_ext, asm_ext),
+                                 (sim_mod_m, isa_mod_m, asm_m),
+                                 ])
+def test_translate(fcs):
+    isa = fcs[1].ISA_fc.Py
+    asm = fcs[2]
+    # mostly straight line code with the odd branch / jump
+    program = {4*i: _random_inst(isa, asm) for i in range(NTESTS * 8)}
+    init = [0] + [random.randrange(0, 1 << isa.Word.size) for _ in range(31)]
+
+    for max_steps in (NTESTS * 8, 7):
+        translator = BlockTranslator(fcs[0], dict(program), max_blocks=8)
+        translator.regs[:] = init
+        native = NativeR32I(fcs[0])
+        native.regs[:] = init
+
+        result = translator.run(0, max_steps)
+        expected = native.run(program, 0, max_steps)
+        assert (result.pc, result.retired) == (expected.pc, expected.retired)
+        assert translator.regs == native.regs
+        assert translator.memory.pages == native.memory.pages
+        assert translator.cache_info().currsize <= 8
+
+
+def test_translate_invalidate():
+    isa = isa_mod_base.ISA_fc.Py
+    asm = asm_base
+    bne = isa.Branch(isa.B(rs1=isa.Idx(1), rs2=isa.Idx(0), imm=isa.B.imm(-4)), isa.BranchInst.BNE)
+    insts = [
+        asm.asm_ADD(rs1=0, imm=10, rd=1),
+        # loop: x2 += x1; x1 -= 1
+        asm.asm_ADD(rs1=2, rs2=1, rd=2),
+        asm.asm_SUB(rs1=1, imm=1, rd=1),
+        isa.Inst(bne),
+        # j .
+        isa.Inst(isa.JAL(isa.J(rd=isa.Idx(0), imm=isa.J.imm(0)))),
+    ]
+    translator = BlockTranslator(sim_mod_base, {4*i: inst for i, inst in enumerate(insts)})
+    result = translator.run(0)
+    assert (result.pc, result.retired) == (16, 1 + 3*10 + 1)
+    assert translator.regs[2] == 55
+    info = translator.cache_info()
+    # entry block (includes the first iteration), the loop body and the halt
+    assert (info.hits, info.misses, info.currsize) == (8, 3, 3)
+
+    # x2 -= x1 in the loop body
+    translator.write(4, asm.asm_SUB(rs1=2, rs2=1, rd=2))
+    assert translator.cache_info().currsize == 1
+    translator.regs[2] = 0
+    result = translator.run(0)
+    assert (result.pc, result.retired) == (16, 1 + 3*10 + 1)
+    assert translator.regs[2] == (-55) & 0xffffffff
+
+    # extending the program past a block cut short at its end
+    translator = BlockTranslator(sim_mod_base, {0: insts[0]})
+    result = translator.run(0)
+    assert (result.pc, result.retired) == (4, 1)
+    translator.write(4, asm.asm_ADD(rs1=1, imm=1, rd=1))
+    assert translator.cache_info().currsize == 0
+    translator.regs[1] = 0
+    result = translator.run(0)
+    assert (result.pc, result.retired) == (8, 2)
+    assert translator.regs[1] == 11
+    assert translator.lookup(0).length == 2
+
+
+def test_lazy_import():
+    # importing a simulator loads neither the assembler nor the other
+    # examples
+    code = (
+        'import sys, examples.riscv.sim;'
+        'print(sorted(m for m in sys.modules if m.startswith("examples")))'
+    )
+    loaded = subprocess.run(
+        [sys.executable, '-c', code], stdout=subprocess.PIPE, universal_newlines=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))), check=True).stdout
+    assert 'examples.riscv.sim' in loaded
+    for mod in ('examples.riscv.asm', 'examples.riscv_f', 'examples.condition_flags', 'examples.mapping'):
+        assert repr(mod) not in loaded
+
+    import examples.riscv
+    assert examples.riscv.asm is asm_base
+    assert 'asm' in dir(examples.riscv)
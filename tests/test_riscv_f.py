@@ -1,7 +1,130 @@
+import operator
+import random
+import struct
 
+import pytest
+
+from hwtypes import FPVector, RoundingMode
 from peak.mapper import ArchMapper, RewriteRule
 from examples.riscv_f import family as riscv_family
 from examples.riscv_f import sim as riscv_sim
+from examples.riscv_f import isa as riscv_isa
+from examples.riscv_f import asm as riscv_asm
+from examples.riscv_f import native_float
+from examples.mapping import isa_key
+
+
+NTESTS = 16
+
+FP32 = FPVector[8, 23, RoundingMode.RNE, False]
+
+GOLD = {
+    ('compute', 'FADD'): operator.add,
+    ('compute', 'FSUB'): operator.sub,
+    ('compute', 'FMUL'): operator.mul,
+    ('compute', 'FDIV'): operator.truediv,
+    ('compare', 'EQ'): operator.eq,
+    ('compare', 'LT'): operator.lt,
+    ('compare', 'LE'): operator.le,
+}
+
+
+def _random_float(isa):
+    # stay well clear of overflow / underflow and special values
+    x = random.uniform(-1e6, 1e6)
+    return isa.Word(struct.unpack('<I', struct.pack('<f', x))[0])
+
+
+@pytest.mark.parametrize('fam', [riscv_family.PyFamily(), riscv_family.PyFamily(native_float=True)])
+@pytest.mark.parametrize('kind, op_name', GOLD.keys())
+def test_fpu(kind, op_name, fam, corpus, replay):
+    isa = riscv_isa.ISA_fc.Py
+    riscv = riscv_sim.R32I_fc(fam)()
+    key = isa_key(riscv_sim.R32I_fc)
+
+    def draw():
+        return {'f_rs1': _random_float(isa).as_uint(),
+                'f_rs2': _random_float(isa).as_uint()}
+
+    data = isa.R(rd=isa.Idx(3), rs1=isa.Idx(1), rs2=isa.Idx(2))
+    if kind == 'compute':
+        op = isa.FComputation(data=data, rm=isa.RM.RNE, tag=getattr(isa.FPComputeInst, op_name))
+    else:
+        op = isa.FCMP(data=data, tag=getattr(isa.FPCompareInst, op_name))
+    inst = isa.Inst(isa.OP_FP(**{kind: op}))
+
+    # stored vectors first, failing ones are kept for the next run
+    for v in replay(key, draw, NTESTS):
+        if not v.keys() >= {'f_rs1', 'f_rs2'}:
+            continue
+        a = isa.Word(v['f_rs1'])
+        b = isa.Word(v['f_rs2'])
+        riscv.f_register_file.store(isa.Idx(1), a)
+        riscv.f_register_file.store(isa.Idx(2), b)
+        riscv(inst, isa.Word(0))
+        expected = GOLD[kind, op_name](FP32.reinterpret_from_bv(a), FP32.reinterpret_from_bv(b))
+        if kind == 'compute':
+            expected = expected.reinterpret_as_bv()
+        else:
+            expected = isa.Word(expected)
+        # FP results are written to the integer register file
+        if riscv.register_file.load1(isa.Idx(3)) != expected:
+            corpus.add(key, v)
+        assert riscv.register_file.load1(isa.Idx(3)) == expected, v
+
+
+def test_fpu_skipped():
+    isa = riscv_isa.ISA_fc.Py
+    riscv = riscv_sim.R32I_fc.Py()
+    # integer instructions must not touch the FPU
+    riscv.FPU = None
+    riscv.register_file.store(isa.Idx(1), isa.Word(5))
+    riscv(riscv_asm.asm_ADD(rs1=1, imm=2, rd=3), isa.Word(0))
+    assert riscv.register_file.load1(isa.Idx(3)) == 7
+
+
+@pytest.mark.parametrize('rm', ('RNE', 'RTZ'))
+def test_fpu_paths(rm, corpus, replay):
+    # python evaluates only the selected unit, SMT every unit muxed
+    isa = riscv_isa.ISA_fc.Py
+    key = isa_key(riscv_sim.R32I_fc)
+
+    def draw():
+        return {name: _random_float(isa).as_uint() for name in ('f_rs1', 'f_rs2', 'f_rs3')}
+    fam = riscv_family.SMTFamily()
+    py_fpu = riscv_sim.R32I_fc.Py().FPU
+    smt_fpu = riscv_sim.R32I_fc(fam)().FPU
+    FPUInst = fam.get_adt_t(isa.FPUInst)
+    RM = fam.get_adt_t(isa.RM)
+
+    rm = getattr(isa.RM, rm)
+    for field, T in isa.FPUInst.field_dict.items():
+        for tag in T.enumerate():
+            inst = isa.FPUInst(**{field: tag})
+            # stored vectors first, failing ones are kept for the next run
+            for v in replay(key, draw, NTESTS // 4):
+                if not v.keys() >= {'f_rs1', 'f_rs2', 'f_rs3'}:
+                    continue
+                a, b, c = (isa.Word(v[name]) for name in ('f_rs1', 'f_rs2', 'f_rs3'))
+                expected = py_fpu(inst, rm, a, b, c)
+                out = smt_fpu(FPUInst(inst), RM(rm), *(fam.Word(x.as_uint()) for x in (a, b, c)))
+                if out.value.simplify().constant_value() != expected.as_uint():
+                    corpus.add(key, v)
+                assert out.value.simplify().constant_value() == expected.as_uint(), (inst, v)
+
+
+def test_native_float_family():
+    # families which differ in native_float must not share their peaks
+    native_fam = riscv_family.PyFamily(native_float=True)
+    assert native_fam != riscv_family.PyFamily()
+    assert type(riscv_sim.R32I_fc(native_fam)().FPU) is riscv_sim.NativeFPU_fc(native_fam)
+    assert type(riscv_sim.R32I_fc.Py().FPU) is riscv_sim.FPU_fc.Py
+
+
+def test_native_float():
+    native_hits = native_float.differential_check(NTESTS * 8)
+    assert native_hits.keys() == native_float.OPS.keys()
+    assert all(native_hits.values())
 
 
 def test_smt():